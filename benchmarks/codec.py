@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for the frame codec, with the results written as JSON so
+that runs on different commits can be compared.
+
+Each benchmark reports the best time per operation, in nanoseconds, over a
+few repeats. zlib is left out where it can be, so the times are the codec's
+own: NV blocks are built and parsed with pass-through (de)compressors.
+
+Run it from the repository root, or with ``invoke bench``::
+
+    python -m benchmarks.codec --output results.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import timeit
+from spdypy.frame import (from_bytes, build_nv_block, parse_nv_block,
+                          SYNStreamFrame, SYNReplyFrame, RSTStreamFrame,
+                          SettingsFrame, PingFrame, GoAwayFrame, HeadersFrame,
+                          WindowUpdateFrame, DataFrame, Settings, FLAG_FIN,
+                          HAS_SPEEDUPS)
+from test.test_frame import NullCompressor, NullDecompressor
+
+
+def best(function, number, repeat=5):
+    """
+    Returns the best time, in nanoseconds, to call ``function`` once.
+    """
+    timer = timeit.Timer(function)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def make_headers(count):
+    return {('x-header-%d' % i).encode('ascii'): b'v' * 16
+            for i in range(count)}
+
+
+def frames():
+    """
+    Returns a serialized example of each type of frame. The header blocks
+    aren't compressed.
+    """
+    compressor = NullCompressor()
+    headers = {b':status': b'200 OK', b':version': b'HTTP/1.1',
+               b'content-type': b'text/html'}
+    examples = {}
+
+    syn = SYNStreamFrame()
+    syn.version = 3
+    syn.stream_id = 1
+    syn.priority = 0
+    syn.headers.update({b':method': b'GET', b':path': b'/'})
+    examples['SYN_STREAM'] = syn
+
+    reply = SYNReplyFrame()
+    reply.version = 3
+    reply.stream_id = 1
+    reply.headers.update(headers)
+    examples['SYN_REPLY'] = reply
+
+    rst = RSTStreamFrame()
+    rst.version = 3
+    rst.stream_id = 1
+    rst.status_code = 5
+    examples['RST_STREAM'] = rst
+
+    settings = SettingsFrame()
+    settings.version = 3
+    settings.settings = [Settings(4, 100, set())]
+    examples['SETTINGS'] = settings
+
+    ping = PingFrame()
+    ping.version = 3
+    ping.ping_id = 1
+    examples['PING'] = ping
+
+    goaway = GoAwayFrame()
+    goaway.version = 3
+    goaway.last_good_stream_id = 1
+    goaway.status_code = 0
+    examples['GOAWAY'] = goaway
+
+    more = HeadersFrame()
+    more.version = 3
+    more.stream_id = 1
+    more.headers.update(headers)
+    examples['HEADERS'] = more
+
+    update = WindowUpdateFrame()
+    update.version = 3
+    update.stream_id = 1
+    update.delta_window_size = 65536
+    examples['WINDOW_UPDATE'] = update
+
+    data = DataFrame()
+    data.stream_id = 1
+    data.data = b'x' * 1024
+    examples['DATA'] = data
+
+    return {name: frame.to_bytes(compressor) for name, frame in
+            examples.items()}
+
+
+def bench_from_bytes():
+    """
+    Parses one frame of each type.
+    """
+    results = {}
+    decompressor = NullDecompressor()
+
+    for name, data in frames().items():
+        results[name] = best(lambda: from_bytes(data, decompressor), 10000)
+
+    return results
+
+
+def bench_nv_block():
+    """
+    Builds and parses NV blocks of various sizes. Parsing reads every header,
+    as headers are otherwise only decoded as they're used.
+    """
+    results = {'build': {}, 'parse': {}}
+    compressor = NullCompressor()
+    decompressor = NullDecompressor()
+
+    for count in (1, 10, 100, 1000):
+        headers = make_headers(count)
+        block = build_nv_block(compressor, headers)
+        number = max(10, 20000 // count)
+
+        results['build'][count] = best(
+            lambda: build_nv_block(compressor, headers), number
+        )
+        results['parse'][count] = best(
+            lambda: dict(parse_nv_block(decompressor, block)), number
+        )
+
+    return results
+
+
+def bench_data_round_trip():
+    """
+    Serializes and parses a DATA frame with payloads of various sizes.
+    """
+    results = {}
+
+    for size in (0, 1024, 16384, 65536):
+        frame = DataFrame()
+        frame.stream_id = 1
+        frame.data = b'x' * size
+        frame.flags.add(FLAG_FIN)
+
+        results[size] = best(lambda: from_bytes(frame.to_bytes()), 10000)
+
+    return results
+
+
+def bench_settings():
+    """
+    Serializes and parses SETTINGS frames with many entries.
+    """
+    results = {'build': {}, 'parse': {}}
+
+    for count in (1, 10, 100, 1000):
+        frame = SettingsFrame()
+        frame.version = 3
+        frame.settings = [Settings(i, i, set()) for i in range(count)]
+        data = frame.to_bytes()
+        number = max(10, 20000 // count)
+
+        results['build'][count] = best(frame.to_bytes, number)
+        results['parse'][count] = best(lambda: from_bytes(data), number)
+
+    return results
+
+
+def commit():
+    """
+    The commit being benchmarked, if we're in a git checkout.
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run():
+    """
+    Runs every benchmark, returning the results.
+    """
+    return {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'speedups': HAS_SPEEDUPS,
+        'unit': 'ns',
+        'results': {
+            'from_bytes': bench_from_bytes(),
+            'nv_block': bench_nv_block(),
+            'data_round_trip': bench_data_round_trip(),
+            'settings': bench_settings(),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the frame codec, writing the results as JSON.'
+    )
+    parser.add_argument('--output', help='Write the results to this file, '
+                                         'rather than to stdout.')
+    args = parser.parse_args()
+
+    results = json.dumps(run(), indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(results + '\n')
+    else:
+        print(results)
+
+
+if __name__ == '__main__':
+    main()
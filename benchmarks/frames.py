@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the memory and speed of DATA frame objects.
+
+The current, slotted DataFrame is compared with a copy of the class as it was
+before frames grew ``__slots__``: an instance ``__dict__`` for its fields and
+a set of flag names. Memory is measured with tracemalloc over many live
+instances, and speed as the time to build a frame from its header fields and
+body, and to serialize it again.
+
+Run it from the repository root with ``python -m benchmarks.frames``.
+"""
+import struct
+import time
+import tracemalloc
+from spdypy.frame import DataFrame, FLAG_FIN
+
+
+class LegacyDataFrame(object):
+    """
+    The DATA frame as it was, with a ``__dict__`` and a set of flags.
+    """
+    def __init__(self):
+        self.control = None
+        self.version = None
+        self.flags = set()
+        self.data = None
+        self.stream_id = None
+
+    def build_flags(self, flag_byte):
+        if flag_byte & 0x01:
+            self.flags.add(FLAG_FIN)
+
+    def build_data(self, data_buffer, *args):
+        self.data = bytes(data_buffer)
+
+    def to_buffers(self, *args):
+        flags = 0
+        if FLAG_FIN in self.flags:
+            flags |= 0x01
+
+        data = struct.pack("!LL", self.stream_id,
+                           ((flags << 24) | len(self.data)))
+
+        return [data, self.data]
+
+
+def build(frame_class, stream_id, flag_byte, body):
+    frame = frame_class()
+    frame.control = False
+    frame.stream_id = stream_id
+    frame.build_flags(flag_byte)
+    frame.build_data(body)
+    return frame
+
+
+def memory(frame_class, count):
+    """
+    Returns the bytes allocated per live frame, not counting the body.
+    """
+    body = b'x' * 16
+    frames = []
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for stream_id in range(count):
+        frame = build(frame_class, stream_id, 0x01, body)
+        frame.data = body
+        frames.append(frame)
+
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / count
+
+
+def throughput(frame_class, count, body_size):
+    """
+    Returns the frames built and serialized per second.
+    """
+    body = memoryview(b'x' * body_size)
+
+    start = time.perf_counter()
+
+    for stream_id in range(count):
+        frame = build(frame_class, stream_id | 1, 0x01, body)
+        frame.to_buffers()
+
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = 200000
+
+    print('%10s %16s' % ('class', 'bytes/frame'))
+    for frame_class in (LegacyDataFrame, DataFrame):
+        print('%10s %16.1f' % (frame_class.__name__[:10],
+                               memory(frame_class, count)))
+
+    print()
+    print('%10s %10s %16s' % ('class', 'body', 'frames/s'))
+    for body_size in (0, 1024, 16384):
+        for frame_class in (LegacyDataFrame, DataFrame):
+            print('%10s %10d %16.0f' % (frame_class.__name__[:10], body_size,
+                                        throughput(frame_class, count,
+                                                   body_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the parsing of Name/Value header blocks.
+
+Parsing should scale linearly with both the number of headers in the block and
+the size of the header values, so the time taken per header (or per byte)
+should stay roughly flat as the block grows.
+
+Run it from the repository root with ``python -m benchmarks.nv_block``.
+"""
+import timeit
+from spdypy.frame import build_nv_block, parse_nv_block
+from test.test_frame import NullCompressor, NullDecompressor
+
+
+def make_block(count, value_size):
+    """
+    Build an uncompressed NV block with ``count`` headers, each with a value
+    ``value_size`` bytes long.
+    """
+    headers = {
+        ('x-header-%d' % i).encode('ascii'): b'v' * value_size
+        for i in range(count)
+    }
+    return build_nv_block(NullCompressor(), headers)
+
+
+def time_parse(block, repeat=5):
+    """
+    Returns the best time, in seconds, to parse the block once. Headers are
+    decoded lazily, so every one of them is read.
+    """
+    decompressor = NullDecompressor()
+    number = max(1, 20000 // (len(block) // 64 + 1))
+    timer = timeit.Timer(lambda: dict(parse_nv_block(decompressor, block)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    print('Scaling with header count (16 byte values):')
+    print('%10s %14s %16s' % ('headers', 'total (us)', 'per header (ns)'))
+    for count in (10, 100, 1000, 10000):
+        elapsed = time_parse(make_block(count, 16))
+        print('%10d %14.1f %16.1f' % (count, elapsed * 1e6,
+                                      elapsed * 1e9 / count))
+
+    print()
+    print('Scaling with value size (100 headers):')
+    print('%10s %14s %16s' % ('value size', 'total (us)', 'per byte (ns)'))
+    for size in (16, 256, 4096, 65536):
+        block = make_block(100, size)
+        elapsed = time_parse(block)
+        print('%10d %14.1f %16.3f' % (size, elapsed * 1e6,
+                                      elapsed * 1e9 / len(block)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks the SPDY protocol machinery on its own, without any network I/O.
+
+A SPDYProtocol client and a hand-rolled server side exchange requests and
+responses entirely in memory, so the times reported are the protocol's
+overhead per request: building and compressing headers, framing, parsing,
+and stream bookkeeping.
+
+Run it from the repository root with ``python -m benchmarks.protocol``.
+"""
+import time
+import zlib
+from spdypy.protocol import SPDYProtocol
+from spdypy.frame import (FrameParser, SYNStreamFrame, SYNReplyFrame,
+                          DataFrame, FLAG_FIN)
+from spdypy.data import SPDY_3_ZLIB_DICT
+
+
+class Server(object):
+    """
+    Just enough of a server to reply to every request with a fixed body.
+    """
+    def __init__(self, body):
+        self.body = body
+        self.parser = FrameParser(zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT))
+        self.compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+
+    def respond(self, data):
+        replies = []
+
+        for frame in self.parser.receive(data):
+            if not isinstance(frame, SYNStreamFrame):
+                continue
+
+            reply = SYNReplyFrame()
+            reply.version = 3
+            reply.stream_id = frame.stream_id
+            reply.headers = {b':status': b'200 OK', b':version': b'HTTP/1.1',
+                             b'content-type': b'text/plain'}
+
+            body = DataFrame()
+            body.stream_id = frame.stream_id
+            body.data = self.body
+            body.flags.add(FLAG_FIN)
+
+            replies.append(reply.to_bytes(self.compressor))
+            replies.append(body.to_bytes())
+
+        return b''.join(replies)
+
+
+def run(requests, concurrency, body_size):
+    """
+    Sends ``requests`` requests, ``concurrency`` at a time, reading every
+    response. Returns the time taken, in seconds.
+    """
+    client = SPDYProtocol('www.example.com')
+    server = Server(b'x' * body_size)
+    buffer = bytearray(body_size)
+
+    start = time.perf_counter()
+
+    for _ in range(requests // concurrency):
+        for _ in range(concurrency):
+            client.putrequest(b'GET', b'/')
+            client.putheader(b'accept', b'*/*')
+            client.endheaders()
+
+        sent = []
+        while True:
+            buffers = client.data_to_send()
+            if not buffers:
+                break
+            sent.append(b''.join(buffers))
+
+        client.receive_data(server.respond(b''.join(sent)))
+
+        for stream_id in list(client.streams):
+            client.streams[stream_id].read_into(buffer)
+            client.close_stream(stream_id)
+
+    return time.perf_counter() - start
+
+
+def main():
+    requests = 20000
+
+    print('%12s %10s %14s %12s' % ('concurrency', 'body', 'per req (us)',
+                                   'req/s'))
+    for concurrency in (1, 10, 100):
+        for body_size in (0, 1024, 16384):
+            elapsed = run(requests, concurrency, body_size)
+            print('%12d %10d %14.1f %12.0f' % (concurrency, body_size,
+                                              elapsed * 1e6 / requests,
+                                              requests / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -17,10 +17,7 @@ conn.putheader('accept', '*/*')
 conn.putheader('accept-encoding', 'gzip,deflate')
 conn.endheaders()
 
-# Debugging output for now.
-frame_list = conn._read_outstanding(timeout=0.5)
-while frame_list:
-    for frame in frame_list:
-        print(frame)
-
-    frame_list = conn._read_outstanding(timeout=0.5)
+resp = conn.getresponse()
+print(resp.status, resp.reason)
+print(resp.getheaders())
+print(resp.read())
@@ -25,4 +25,11 @@ version = sys.version_info
 if version[0] < 3 or version[1] < 3:
     raise ImportError("Minimum Python version is 3.3.")
 
+from .protocol import SPDYProtocol
 from .connection import SPDYConnection
+from .threaded import ThreadedSPDYConnection
+from .pool import SPDYConnectionPool, PoolManager
+
+# The asyncio connection needs async/await syntax.
+if version >= (3, 5):
+    from .aio import AsyncSPDYConnection
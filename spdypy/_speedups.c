@@ -0,0 +1,283 @@
+/*
+ * spdypy._speedups
+ * ~~~~~~~~~~~~~~~~
+ *
+ * Compiled versions of the inner loops of the frame codec in frame.py, which
+ * remains the reference implementation. Each function here must behave
+ * exactly as its pure-Python counterpart does, raising the same exceptions
+ * for the same input: test/test_speedups.py checks that they do.
+ *
+ * Build it in place with ``invoke build``.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+/* struct.error, which the Python versions raise for truncated data. */
+static PyObject *StructError;
+
+
+static uint32_t
+read_u32(const unsigned char *p)
+{
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) |
+           ((uint32_t)p[2] << 8) | (uint32_t)p[3];
+}
+
+
+static void
+write_u32(unsigned char *p, uint32_t value)
+{
+    p[0] = (unsigned char)(value >> 24);
+    p[1] = (unsigned char)(value >> 16);
+    p[2] = (unsigned char)(value >> 8);
+    p[3] = (unsigned char)value;
+}
+
+
+static PyObject *
+truncated(Py_ssize_t needed, Py_ssize_t offset)
+{
+    PyErr_Format(StructError,
+                 "unpack_from requires a buffer of at least %zd bytes for "
+                 "unpacking 4 bytes at offset %zd", needed, offset);
+    return NULL;
+}
+
+
+PyDoc_STRVAR(read_frame_header_doc,
+"read_frame_header(view, offset)\n\
+\n\
+Read the 8 byte header of the frame at offset. Returns the first 32 bits,\n\
+the flag byte, and the length.");
+
+static PyObject *
+read_frame_header(PyObject *self, PyObject *args)
+{
+    Py_buffer buffer;
+    Py_ssize_t offset;
+    const unsigned char *p;
+    uint32_t word, length;
+
+    if (!PyArg_ParseTuple(args, "y*n:read_frame_header", &buffer, &offset))
+        return NULL;
+
+    if (offset < 0 || buffer.len - offset < 8) {
+        PyBuffer_Release(&buffer);
+        return truncated(offset + 8, offset);
+    }
+
+    p = (const unsigned char *)buffer.buf + offset;
+    word = read_u32(p);
+    length = read_u32(p + 4);
+    PyBuffer_Release(&buffer);
+
+    return Py_BuildValue("(kkk)", (unsigned long)word,
+                         (unsigned long)(length >> 24),
+                         (unsigned long)(length & 0x00FFFFFF));
+}
+
+
+PyDoc_STRVAR(read_nv_offsets_doc,
+"read_nv_offsets(data)\n\
+\n\
+Read the names out of an uncompressed NV block. Returns the start and end\n\
+of each header's value, by lowercased name.");
+
+static PyObject *
+read_nv_offsets(PyObject *self, PyObject *args)
+{
+    Py_buffer buffer;
+    const unsigned char *data;
+    Py_ssize_t len, offset, i;
+    uint32_t num, name_len, value_len;
+    PyObject *offsets, *name, *span;
+    char *lowered;
+
+    if (!PyArg_ParseTuple(args, "y*:read_nv_offsets", &buffer))
+        return NULL;
+
+    offsets = PyDict_New();
+    if (offsets == NULL)
+        goto error;
+
+    data = (const unsigned char *)buffer.buf;
+    len = buffer.len;
+
+    if (len == 0) {
+        PyBuffer_Release(&buffer);
+        return offsets;
+    }
+
+    if (len < 4) {
+        truncated(4, 0);
+        goto error;
+    }
+
+    num = read_u32(data);
+    offset = 4;
+
+    for (i = 0; i < (Py_ssize_t)num; i++) {
+        if (len - offset < 4) {
+            truncated(offset + 4, offset);
+            goto error;
+        }
+        name_len = read_u32(data + offset);
+        offset += 4;
+
+        /* A name that runs off the end leaves no room for the value's
+         * length, which is where the Python version notices. */
+        if ((Py_ssize_t)name_len > len - offset) {
+            truncated(offset + name_len + 4, offset + name_len);
+            goto error;
+        }
+
+        name = PyBytes_FromStringAndSize(NULL, name_len);
+        if (name == NULL)
+            goto error;
+
+        lowered = PyBytes_AS_STRING(name);
+        memcpy(lowered, data + offset, name_len);
+        for (uint32_t j = 0; j < name_len; j++) {
+            if (lowered[j] >= 'A' && lowered[j] <= 'Z')
+                lowered[j] += 'a' - 'A';
+        }
+        offset += name_len;
+
+        if (len - offset < 4) {
+            Py_DECREF(name);
+            truncated(offset + 4, offset);
+            goto error;
+        }
+        value_len = read_u32(data + offset);
+        offset += 4;
+
+        span = Py_BuildValue("(nn)", offset, offset + (Py_ssize_t)value_len);
+        if (span == NULL || PyDict_SetItem(offsets, name, span) < 0) {
+            Py_XDECREF(span);
+            Py_DECREF(name);
+            goto error;
+        }
+        Py_DECREF(span);
+        Py_DECREF(name);
+
+        offset += value_len;
+    }
+
+    PyBuffer_Release(&buffer);
+    return offsets;
+
+error:
+    Py_XDECREF(offsets);
+    PyBuffer_Release(&buffer);
+    return NULL;
+}
+
+
+PyDoc_STRVAR(serialize_pairs_doc,
+"serialize_pairs(pairs)\n\
+\n\
+Write a list of name-value pairs into an uncompressed NV block.");
+
+static PyObject *
+serialize_pairs(PyObject *self, PyObject *args)
+{
+    PyObject *pairs, *seq, *result = NULL;
+    Py_buffer *buffers;
+    Py_ssize_t count, size = 4, i, filled = 0;
+    unsigned char *out;
+
+    if (!PyArg_ParseTuple(args, "O:serialize_pairs", &pairs))
+        return NULL;
+
+    seq = PySequence_Fast(pairs, "pairs must be a sequence");
+    if (seq == NULL)
+        return NULL;
+
+    count = PySequence_Fast_GET_SIZE(seq);
+    buffers = PyMem_New(Py_buffer, count * 2);
+    if (buffers == NULL) {
+        Py_DECREF(seq);
+        return PyErr_NoMemory();
+    }
+
+    /* Size everything up first, so the block is allocated once. */
+    for (i = 0; i < count; i++) {
+        PyObject *pair = PySequence_Fast_GET_ITEM(seq, i);
+        PyObject *name, *value;
+
+        if (!PyArg_ParseTuple(pair, "OO:serialize_pairs", &name, &value))
+            goto done;
+        if (PyObject_GetBuffer(name, &buffers[filled], PyBUF_SIMPLE) < 0)
+            goto done;
+        filled++;
+        if (PyObject_GetBuffer(value, &buffers[filled], PyBUF_SIMPLE) < 0)
+            goto done;
+        filled++;
+
+        size += 8 + buffers[filled - 2].len + buffers[filled - 1].len;
+    }
+
+    result = PyByteArray_FromStringAndSize(NULL, size);
+    if (result == NULL)
+        goto done;
+
+    out = (unsigned char *)PyByteArray_AS_STRING(result);
+    write_u32(out, (uint32_t)count);
+    out += 4;
+
+    for (i = 0; i < filled; i++) {
+        write_u32(out, (uint32_t)buffers[i].len);
+        out += 4;
+        memcpy(out, buffers[i].buf, buffers[i].len);
+        out += buffers[i].len;
+    }
+
+done:
+    for (i = 0; i < filled; i++)
+        PyBuffer_Release(&buffers[i]);
+    PyMem_Free(buffers);
+    Py_DECREF(seq);
+    return result;
+}
+
+
+static PyMethodDef speedups_methods[] = {
+    {"read_frame_header", read_frame_header, METH_VARARGS,
+     read_frame_header_doc},
+    {"read_nv_offsets", read_nv_offsets, METH_VARARGS, read_nv_offsets_doc},
+    {"serialize_pairs", serialize_pairs, METH_VARARGS, serialize_pairs_doc},
+    {NULL, NULL, 0, NULL}
+};
+
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    "spdypy._speedups",
+    "Compiled versions of the inner loops of the frame codec.",
+    -1,
+    speedups_methods
+};
+
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    PyObject *module, *struct_module;
+
+    struct_module = PyImport_ImportModule("struct");
+    if (struct_module == NULL)
+        return NULL;
+
+    StructError = PyObject_GetAttrString(struct_module, "error");
+    Py_DECREF(struct_module);
+    if (StructError == NULL)
+        return NULL;
+
+    module = PyModule_Create(&speedups_module);
+    if (module == NULL)
+        Py_CLEAR(StructError);
+
+    return module;
+}
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.aio
+~~~~~~~~~~
+
+A SPDY connection driven by an asyncio event loop.
+"""
+import asyncio
+from .connection import SPDYConnection
+from .protocol import DEFAULT_PRIORITY
+from .net import CONNECTION_ATTEMPT_DELAY
+from .events import ConnectionTerminated
+from .response import ResponseHeaders
+from .stream import StreamResetError
+from .tls import negotiated_protocol, SPDY_PROTOCOLS
+
+
+class AsyncSPDYConnection(SPDYConnection, asyncio.Protocol):
+    """
+    A SPDY connection that runs on an asyncio event loop. Frames are parsed
+    and handled as soon as the transport delivers them, so there's no polling:
+    a coroutine waiting on a stream wakes up as soon as its frames arrive.
+    This makes it cheap to have many streams in flight on many connections
+    from a single thread.
+
+    The interface matches ``SPDYConnection``, except that ``request()`` and
+    ``getresponse()`` are coroutines, and the response they give is read
+    with coroutines too. ``putrequest()``, ``putheader()`` and
+    ``endheaders()`` don't block, so they stay as they are, but may only be
+    used once ``connect()`` has finished.
+
+    There is no HTTP/1.1 fallback: if the server won't speak SPDY,
+    ``connect()`` raises ``ConnectionError``.
+
+    Takes the same arguments as ``SPDYConnection``.
+    """
+    def __init__(self, host, **kwargs):
+        super(AsyncSPDYConnection, self).__init__(host, **kwargs)
+        self._transport = None
+        self._connecting = None
+        self._connection_error = None
+
+        # Futures for coroutines waiting on frames for a stream, by stream ID.
+        self._waiters = {}
+
+    async def connect(self):
+        """
+        Opens the connection to the server, if it isn't already open. It is
+        safe to call this concurrently: every caller waits on the same
+        connection attempt.
+        """
+        if self._transport is not None:
+            return
+
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._open())
+
+        try:
+            await asyncio.shield(self._connecting)
+        except Exception:
+            # Let the next caller try again.
+            self._connecting = None
+            raise
+
+    async def request(self, method, path, body=None, headers={},
+                      priority=DEFAULT_PRIORITY):
+        """
+        Sends a request to the server, connecting first if need be. Takes the
+        same arguments as ``SPDYConnection.request()``, and returns the stream
+        id of the request.
+        """
+        await self.connect()
+
+        return super(AsyncSPDYConnection, self).request(
+            method, path, body=body, headers=headers, priority=priority
+        )
+
+    async def ping(self):
+        """
+        Pings the server and waits for the answer, returning the round trip
+        time in seconds. Raises ``asyncio.TimeoutError`` if the server
+        doesn't answer within the ping timeout.
+        """
+        await self.connect()
+
+        ping_id = self._core.ping()
+        self._send_outstanding()
+
+        await self._wait_until(
+            None, lambda: ping_id not in self._core.outstanding_pings,
+            timeout=self.ping_timeout
+        )
+
+        return self._core.rtt.latest
+
+    async def getresponse(self, stream_id=None):
+        """
+        Waits for the response headers on the given stream, and returns an
+        ``AsyncSPDYResponse`` from which the body can be read.
+
+        :param stream_id: (Optional) The stream to get the response for. If
+                          not provided, the last-created stream is chosen.
+        """
+        stream_id = stream_id if stream_id else self._core.last_stream_id
+        stream = self._streams[stream_id]
+
+        await self._wait_until(
+            stream_id, lambda: stream.response_headers or stream.remote_closed
+        )
+
+        return self._response_for(stream, AsyncSPDYResponse)
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        if self._transport is not None:
+            self._transport.close()
+
+    def connection_made(self, transport):
+        """
+        Called by the event loop once the TLS handshake is complete.
+
+        :param transport: The transport for the new connection.
+        """
+        self._transport = transport
+
+        ssl_object = transport.get_extra_info('ssl_object')
+        protocol = negotiated_protocol(ssl_object) if ssl_object else None
+
+        if ssl_object is not None and protocol not in SPDY_PROTOCOLS:
+            self._connection_error = ConnectionError(
+                "%s won't speak SPDY, only %s." % (self.host, protocol)
+            )
+            transport.close()
+            return
+
+        self._core.connection_established(protocol)
+
+        self._send_outstanding()
+
+    def data_received(self, data):
+        """
+        Called by the event loop with data from the server. The coroutines
+        waiting on the streams the data was for are woken.
+
+        :param data: The bytes received.
+        """
+        for event in self._core.receive_data(data):
+            # A GOAWAY can end any number of streams.
+            if isinstance(event, ConnectionTerminated):
+                self._wake_all()
+            else:
+                self._wake(event.stream_id)
+
+        self._send_outstanding()
+
+    def connection_lost(self, exc):
+        """
+        Called by the event loop when the connection closes. Everything still
+        waiting on the server fails.
+
+        :param exc: The exception that closed the connection, if any.
+        """
+        if exc is None:
+            exc = ConnectionResetError("The server closed the connection.")
+
+        # Keep the first error: it says why the connection was closed.
+        if self._connection_error is None:
+            self._connection_error = exc
+        self._wake_all()
+
+    def pause_writing(self):
+        """
+        Called by the event loop when the transport's write buffer is full.
+        Request bodies stop being read until ``resume_writing()``.
+        """
+        self._writing_paused = True
+
+    def resume_writing(self):
+        """
+        Called by the event loop when the transport can take more data.
+        """
+        self._writing_paused = False
+        self._send_outstanding()
+
+    async def _open(self):
+        """
+        Opens the TLS connection to the server, with this object as its
+        protocol. The event loop races the host's addresses itself, and does
+        its own resolution, so the DNS cache isn't used here.
+        """
+        loop = asyncio.get_event_loop()
+        connecting = loop.create_connection(
+            lambda: self, self.host, self.port,
+            ssl=self._context,
+            server_hostname=self.host,
+            happy_eyeballs_delay=CONNECTION_ATTEMPT_DELAY,
+            interleave=1,
+        )
+        await asyncio.wait_for(connecting, self.connect_timeout)
+
+        if self._connection_error is not None:
+            raise self._connection_error
+
+    async def _wait_until(self, stream_id, condition, timeout=None):
+        """
+        Waits until ``condition`` returns true, checking it each time a frame
+        arrives for the given stream. Raises ``asyncio.TimeoutError`` if the
+        server goes quiet for longer than the timeout.
+
+        :param stream_id: The stream whose frames might satisfy ``condition``.
+        :param condition: A callable taking no arguments.
+        :param timeout: (optional) The timeout, if not the connection's.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+
+        while not condition():
+            if self._connection_error is not None:
+                raise self._connection_error
+
+            waiter = self._waiters.get(stream_id)
+            if waiter is None:
+                waiter = asyncio.get_event_loop().create_future()
+                self._waiters[stream_id] = waiter
+
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+
+    def _wake(self, stream_id):
+        """
+        Wakes the coroutines waiting on a stream.
+
+        :param stream_id: The stream ID.
+        """
+        waiter = self._waiters.pop(stream_id, None)
+
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _wake_all(self):
+        """
+        Wakes every coroutine waiting on a stream.
+        """
+        for stream_id in list(self._waiters):
+            self._wake(stream_id)
+
+    def _check_alive(self):
+        """
+        Pinging takes a coroutine, so connections aren't checked before each
+        request: ``ping()`` may be awaited instead.
+        """
+
+    def _connect(self):
+        """
+        Connecting takes a coroutine, so the blocking entry points can only
+        check that it has already been done.
+        """
+        if self._connection_error is not None:
+            raise self._connection_error
+
+        if self._transport is None:
+            raise RuntimeError("Not connected: await connect() first.")
+
+    def _write(self, buffers):
+        """
+        Hands a list of buffers to the transport. They're joined first: the
+        transport may hold on to what it's given, and request body buffers
+        are reused once a batch is written.
+
+        :param buffers: The list of buffers to write, in order.
+        """
+        if self._connection_error is not None:
+            return
+
+        self._transport.write(b''.join(buffers))
+        self.write_calls += 1
+
+
+class AsyncSPDYResponse(ResponseHeaders):
+    """
+    The response to a single request on an ``AsyncSPDYConnection``. This has
+    the same attributes as ``SPDYResponse``, but the body is read with
+    coroutines: ``await response.read()``, or ``async for chunk in
+    response`` to get the body one DATA frame at a time.
+
+    :param stream: The Stream the response arrives on.
+    :param connection: The AsyncSPDYConnection the stream belongs to.
+    """
+    def __init__(self, stream, connection):
+        super(AsyncSPDYResponse, self).__init__(stream, connection)
+        self.closed = False
+
+    async def read(self, amt=None):
+        """
+        Reads and returns ``amt`` bytes of the response body, or fewer if the
+        body ends first. If ``amt`` is omitted, the whole of the rest of the
+        body is read.
+
+        :param amt: (optional) The most bytes to read.
+        """
+        if self.closed:
+            return b''
+
+        if amt is None or amt < 0:
+            chunks = []
+            async for chunk in self:
+                chunks.append(bytes(chunk))
+
+            return b''.join(chunks)
+
+        buffer = bytearray(amt)
+        view = memoryview(buffer)
+        total = 0
+
+        # Each read only gets what's arrived, so keep reading until we have
+        # enough or the body ends.
+        while total < amt:
+            read = await self.readinto(view[total:])
+            if not read:
+                break
+            total += read
+
+        view.release()
+        del buffer[total:]
+
+        return bytes(buffer)
+
+    async def readinto(self, b):
+        """
+        Reads response body data into the writable buffer ``b``, returning the
+        number of bytes read. Returns zero at the end of the body.
+
+        :param b: The buffer to read into.
+        """
+        if self.closed:
+            return 0
+
+        await self._wait_for_data()
+        read = self._connection._read_into(self._stream, b)
+
+        if not read and len(b):
+            self.close()
+
+        return read
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """
+        Returns the next chunk of the response body, as it arrived in a DATA
+        frame.
+        """
+        if self.closed:
+            raise StopAsyncIteration
+
+        await self._wait_for_data()
+        chunk = self._connection._next_chunk(self._stream)
+
+        if chunk is None:
+            self.close()
+            raise StopAsyncIteration
+
+        return chunk
+
+    def close(self):
+        """
+        Closes the response. If the body hasn't been entirely received, the
+        stream is cancelled.
+        """
+        if not self.closed:
+            self._connection._close_stream(self._stream)
+
+        self.closed = True
+
+    def isclosed(self):
+        """
+        Whether the response has been closed.
+        """
+        return self.closed
+
+    async def _wait_for_data(self):
+        """
+        Waits until there is body data to read, or the body is over.
+        """
+        stream = self._stream
+        await self._connection._wait_until(
+            stream.stream_id, lambda: stream.buffered or stream.remote_closed
+        )
+
+        if stream.reset_code is not None and not stream.buffered:
+            raise StreamResetError(stream.stream_id, stream.reset_code)
@@ -5,18 +5,34 @@ spdypy.connection
 
 Contains the code necessary for working with SPDY connections.
 """
+import collections
 import ssl
 import socket
 import select
-import zlib
-from .stream import Stream
-from .frame import from_bytes
-from .data import SPDY_3_ZLIB_DICT
+import time
+from .stream import StreamResetError, DEFAULT_CHUNK_SIZE
+from .response import SPDYResponse
+from .frame import CANCEL, PROTOCOL_ERROR
+from .flow import DEFAULT_WINDOW_SIZE, DEFAULT_MAX_WINDOW_SIZE
+from .protocol import SPDYProtocol, DEFAULT_PRIORITY
+from .push import DEFAULT_PUSH_CACHE_SIZE
+from .health import DEFAULT_PING_TIMEOUT
+from .net import create_connection, default_dns_cache
+from .tls import (get_context, negotiated_protocol, default_session_cache,
+                  SPDY_PROTOCOLS)
+from .http11 import HTTP11Connection
 
 
 # Define some states for SPDYConnections.
 NEW = 'NEW'
 
+# The port SPDY servers listen on, unless we're told otherwise.
+DEFAULT_PORT = 443
+
+# The most buffers we'll hand to a single sendmsg call. POSIX only guarantees
+# an IOV_MAX of 16, but every platform we care about allows at least 1024.
+MAX_IOVECS = 1024
+
 
 class SPDYConnection(object):
     """
@@ -26,24 +42,151 @@ class SPDYConnection(object):
     away into an interface that broadly looks like the standard library's
     HTTPSConnection class.
 
+    The protocol itself is handled by a ``SPDYProtocol``: this class only
+    adds a blocking socket.
+
+    The protocol is negotiated with ALPN, or NPN on servers too old for
+    ALPN. If the server chooses HTTP/1.1 instead of SPDY, the connection
+    speaks HTTP/1.1 over the same socket through an ``HTTP11Connection``,
+    and responses are ``http.client.HTTPResponse`` objects.
+
     :param host: The host to establish a connection to.
+    :param port: (optional) The port to connect to. Defaults to 443.
+    :param chunk_size: (optional) The largest DATA frame to split request
+                       bodies into.
+    :param initial_window_size: (optional) The receive window each stream
+                                starts with. Advertised to the server in a
+                                SETTINGS frame if it isn't the default.
+    :param max_window_size: (optional) The largest a receive window may be
+                            tuned up to. Set this to ``initial_window_size``
+                            to disable window tuning.
+    :param max_buffer_size: (optional) The most unread response data to
+                            buffer per stream before the server is made to
+                            wait. By default only the receive window limits
+                            this.
+    :param timeout: (optional) How long to wait for the server when reading a
+                    response, in seconds. By default, wait forever.
+    :param connect_timeout: (optional) How long to wait for the connection
+                            and TLS handshake, in seconds. By default, wait
+                            as long as the operating system does.
+    :param dns_cache: (optional) The ``DNSCache`` to resolve the host with.
+                      By default, one cache is shared by every connection.
+    :param ca_certs: (optional) The path to a file of CA certificates to
+                     trust. By default, the system's are used.
+    :param session_cache: (optional) The ``SessionCache`` to resume TLS
+                          sessions from. By default, one cache is shared by
+                          every connection.
+    :param push_cache_size: (optional) The most responses the server has
+                            pushed to keep until they're requested. Zero
+                            refuses server pushes.
+    :param ping_interval: (optional) How long the connection may go without
+                          hearing from the server, in seconds, before it's
+                          pinged to check it's still alive. By default it's
+                          never pinged.
+    :param ping_timeout: (optional) How long the server has to answer a
+                         ping, in seconds, before the connection is taken
+                         for dead.
     """
-    def __init__(self, host):
+    def __init__(self, host, port=DEFAULT_PORT, chunk_size=DEFAULT_CHUNK_SIZE,
+                 initial_window_size=DEFAULT_WINDOW_SIZE,
+                 max_window_size=DEFAULT_MAX_WINDOW_SIZE,
+                 max_buffer_size=None, timeout=None, connect_timeout=None,
+                 dns_cache=None, ca_certs=None, session_cache=None,
+                 push_cache_size=DEFAULT_PUSH_CACHE_SIZE,
+                 ping_interval=None, ping_timeout=DEFAULT_PING_TIMEOUT):
         self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self._dns_cache = dns_cache if dns_cache is not None else default_dns_cache
+        self._session_cache = (session_cache if session_cache is not None
+                               else default_session_cache)
         self._state = NEW
-        self._context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        self._ca_certs = ca_certs
+        self._context = get_context(ca_certs)
         self._sck = None
-        self._streams = {}
-        self._next_stream_id = 1
-        self._last_stream_id = None
-        self._compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
-        self._decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
 
-        # Set up the initial SSL context.
-        self._context.set_default_verify_paths()
-        self._context.set_npn_protocols(['http/1.1', 'spdy/3', 'spdy/3.1'])
+        # Set if the server chose HTTP/1.1 over SPDY.
+        self._fallback = None
+        self._core_options = {
+            'chunk_size': chunk_size,
+            'initial_window_size': initial_window_size,
+            'max_window_size': max_window_size,
+            'max_buffer_size': max_buffer_size,
+            'push_cache_size': push_cache_size,
+        }
+        self._core = SPDYProtocol(host, **self._core_options)
+        self._streams = self._core.streams
+
+        # Set while the transport can't take any more data.
+        self._writing_paused = False
+
+        # Streams whose responses were garbage collected without being
+        # closed. They're closed the next time anything is sent.
+        self._abandoned = collections.deque()
+
+        # Counts the socket writes, for monitoring how efficiently we write.
+        self.write_calls = 0
+
+    @property
+    def protocol(self):
+        """
+        The protocol negotiated with the server.
+        """
+        return self._core.negotiated_protocol
+
+    @property
+    def session_reused(self):
+        """
+        Whether the TLS handshake resumed an earlier session.
+        """
+        return getattr(self._sck, 'session_reused', False)
 
-    def request(self, method, path, body=None, headers={}):
+    @property
+    def rtt(self):
+        """
+        The ``RTTEstimator`` holding the round trip times that pings on this
+        connection have measured.
+        """
+        return self._core.rtt
+
+    @property
+    def remote_settings(self):
+        """
+        The settings the server has sent us, by setting ID.
+        """
+        return self._core.remote_settings
+
+    @property
+    def last_good_stream_id(self):
+        """
+        If the server has told us to go away, the last stream it will
+        process.
+        """
+        return self._core.last_good_stream_id
+
+    @property
+    def open_streams(self):
+        """
+        The number of streams on this connection that haven't been closed,
+        not counting pushed streams no request has claimed yet.
+        """
+        return len(self._streams) - len(self._core.push_cache)
+
+    @property
+    def requests_sent(self):
+        """
+        The number of requests sent on this connection.
+        """
+        if self._fallback is not None:
+            return self._fallback.requests_sent
+
+        return self._core.requests_sent
+
+    def request(self, method, path, body=None, headers={},
+                priority=DEFAULT_PRIORITY):
         """
         This will send a request to the server using the HTTP request method
         ``method`` and the selector ``path``. If the ``body`` argument is
@@ -52,12 +195,49 @@ class SPDYConnection(object):
         default charset for HTTP. To use other encodings, pass a bytes object.
         The Content-Length header is set to the length of the string.
 
+        The ``body`` may also be a file-like object or an iterable of bytes,
+        in which case it is streamed in DATA frames of at most ``chunk_size``
+        bytes without being read into memory.
+
         The ``headers`` object should be a mapping of extra HTTP headers to
         send with the request.
+
+        The ``priority`` runs from 0, the most urgent, to 7. Frames from
+        higher priority requests are always sent before those of lower
+        priority requests on the same connection.
+
+        This returns the stream id of the request.
         """
-        pass
+        self._check_alive()
+        self._connect()
+
+        if self._fallback is not None:
+            return self._fallback.request(method, path, body=body,
+                                          headers=headers)
+
+        stream_id = self.putrequest(method, path, priority=priority)
+
+        for header, argument in headers.items():
+            self.putheader(header, argument, stream_id=stream_id)
+
+        self.endheaders(message_body=body, stream_id=stream_id)
 
-    def putrequest(self, request, selector, **kwargs):
+        return stream_id
+
+    def request_template(self, headers={}):
+        """
+        Builds a ``RequestTemplate`` for this connection. The template holds
+        the headers that are identical on every request: the mandatory
+        ``:version``, ``:host`` and ``:scheme`` headers, plus any provided in
+        ``headers``. Passing the template to ``putrequest`` means only the
+        varying headers need to be serialized for each request.
+
+        :param headers: (Optional) A mapping of extra fixed headers.
+        """
+        return self._core.request_template(headers)
+
+    def putrequest(self, request, selector, template=None,
+                   priority=DEFAULT_PRIORITY, **kwargs):
         """
         This emulates the HTTPConnection ``putrequest()`` method, and allows
         for sending a SPDY request in stages. Due to the streamed nature of
@@ -68,37 +248,20 @@ class SPDYConnection(object):
 
         :param request: The request string, e.g. GET.
         :param selector: The path selector, beginning with a '/'.
+        :param template: (Optional) A ``RequestTemplate`` from
+                         ``request_template``, providing the fixed headers.
+        :param priority: (Optional) The priority of the request, from 0 (the
+                         highest) to 7 (the lowest, and the default).
         """
+        self._check_alive()
         self._connect()
 
-        # Convert the request string and selector to bytes, if they aren't
-        # already.
-        request = request if isinstance(request, bytes) else request.encode('utf-8')
-        selector = selector if isinstance(selector, bytes) else selector.encode('utf-8')
-
-        # Begin by allocating a new stream object and giving it the next stream
-        # ID.
-        stream_id = self._next_stream_id
-        stream = Stream(stream_id,
-                        version=3,
-                        compressor=self._compressor,
-                        decompressor=self._decompressor)
-        stream.open_stream(7)
-
-        # Give the stream the necessary headers.
-        stream.add_header(b':method', request)
-        stream.add_header(b':path', selector)
-        stream.add_header(b':version', b'HTTP/1.1')
-        stream.add_header(b':host', self.host.encode('utf-8'))
-        stream.add_header(b':scheme', b'https')
-
-        # Increase the next stream ID, keeping it odd.
-        self._next_stream_id += 2
-
-        # Store the stream object.
-        self._streams[stream_id] = stream
+        if self._fallback is not None:
+            return self._fallback.putrequest(request, selector,
+                                             template=template)
 
-        return stream_id
+        return self._core.putrequest(request, selector, template=template,
+                                     priority=priority)
 
     def putheader(self, header, argument, stream_id=None):
         """
@@ -111,14 +274,11 @@ class SPDYConnection(object):
         :param stream_id: (Optional) The stream to add headers to. If not
                           provided, the last-created stream is chosen.
         """
-        # Convert the header and argument to bytes if they aren't already.
-        header = header if isinstance(header, bytes) else header.encode('utf-8')
-        argument = argument if isinstance(argument, bytes) else argument.encode('utf-8')
+        if self._fallback is not None:
+            return self._fallback.putheader(header, argument,
+                                            stream_id=stream_id)
 
-        stream_id = stream_id if stream_id else max(self._streams.keys())
-        stream = self._streams[stream_id]
-        stream.add_header(header, argument)
-        return
+        self._core.putheader(header, argument, stream_id=stream_id)
 
     def endheaders(self, message_body=None, stream_id=None):
         """
@@ -129,41 +289,315 @@ class SPDYConnection(object):
         be sent as well. Otherwise, only the connection will be set up.
 
         :param message_body: (Optional) Body data to send. If provided, it is
-                             assumed that no more body data will be sent.
+                             assumed that no more body data will be sent. May
+                             be bytes, a string, a file-like object or an
+                             iterable of bytes.
         :param stream_id: (Optional) The stream to end the headers of. If not
                           provided, the last-created stream is chosen.
         """
-        stream_id = stream_id if stream_id else max(self._streams.keys())
+        if self._fallback is not None:
+            return self._fallback.endheaders(message_body=message_body,
+                                             stream_id=stream_id)
+
+        self._core.endheaders(message_body=message_body, stream_id=stream_id)
+        self._send_outstanding()
+
+    def getresponse(self, stream_id=None):
+        """
+        Emulates the HTTPConnection ``getresponse()`` method. Waits for the
+        response headers on the given stream, and returns a ``SPDYResponse``
+        from which the body can be read.
+
+        :param stream_id: (Optional) The stream to get the response for. If
+                          not provided, the last-created stream is chosen.
+        """
+        if self._fallback is not None:
+            return self._fallback.getresponse(stream_id)
+
+        stream_id = stream_id if stream_id else self._core.last_stream_id
         stream = self._streams[stream_id]
 
-        if message_body is not None:
-            length = len(message_body)
-            stream.add_header(b'content-length', str(length).encode('utf-8'))
-            stream.prepare_data(message_body, last=True)
+        self._receive_until(
+            lambda: stream.response_headers or stream.remote_closed,
+            stream_id
+        )
+
+        return self._response_for(stream, SPDYResponse)
+
+    def ping(self):
+        """
+        Pings the server and waits for the answer, returning the round trip
+        time in seconds. Raises ``socket.timeout`` if the server doesn't
+        answer within the ping timeout.
+
+        HTTP/1.1 has no pings, so on a connection that fell back to it this
+        sends nothing and returns ``None``.
+        """
+        self._connect()
+
+        if self._fallback is not None:
+            return None
+
+        ping_id = self._core.ping()
+        self._send_outstanding()
+
+        self._receive_until(
+            lambda: ping_id not in self._core.outstanding_pings,
+            timeout=self.ping_timeout
+        )
+
+        return self._core.rtt.latest
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        if self._fallback is not None:
+            self._fallback.close()
+        elif self._sck is not None:
+            self._save_session()
+            self._sck.close()
+
+    def _save_session(self):
+        """
+        Stores the connection's TLS session, so that the next connection to
+        the same origin can resume it. TLS 1.3 servers send their session
+        tickets after the handshake, so this is done again when the
+        connection closes.
+        """
+        session = getattr(self._sck, 'session', None)
+        self._session_cache.store(self._context, self.host, self.port,
+                                  session)
+
+    def _response_for(self, stream, response_class):
+        """
+        Builds the response object for a stream that has finished waiting for
+        its reply. A stream that closed without replying was either reset or
+        broken, and raises ``StreamResetError``. So does a reply without a
+        valid status, after the stream is reset with PROTOCOL_ERROR.
+
+        :param stream: The stream.
+        :param response_class: The class of response to build.
+        """
+        if not stream.response_headers:
+            self._close_stream(stream)
+            code = stream.reset_code
+            raise StreamResetError(stream.stream_id,
+                                   code if code is not None else PROTOCOL_ERROR)
+
+        try:
+            return response_class(stream, self)
+        except StreamResetError:
+            self._close_stream(stream, PROTOCOL_ERROR)
+            raise
+
+    @property
+    def syscalls_per_request(self):
+        """
+        The mean number of socket write calls made per request sent on this
+        connection.
+        """
+        if not self.requests_sent:
+            return 0.0
+
+        return self.write_calls / self.requests_sent
+
+    def _send_outstanding(self):
+        """
+        Writes everything the protocol has to send, a batch at a time.
+        Nothing is sent while writing is paused.
+        """
+        self._close_abandoned()
+
+        while not self._writing_paused:
+            buffers = self._core.data_to_send()
+
+            if not buffers:
+                break
+
+            self._write(buffers)
+
+    def _write(self, buffers):
+        """
+        Writes a list of buffers to the socket, handling partial writes. Plain
+        sockets get the buffers in a vectored ``sendmsg`` call. SSL sockets
+        don't support ``sendmsg``, so for those the buffers are joined and
+        written with ``sendall``.
+
+        :param buffers: The list of buffers to write, in order.
+        """
+        sck = self._sck
+
+        if (not isinstance(sck, socket.socket) or
+                isinstance(sck, ssl.SSLSocket)):
+            sck.sendall(b''.join(buffers))
+            self.write_calls += 1
+            return
+
+        index = 0
+        while index < len(buffers):
+            sent = sck.sendmsg(buffers[index:index + MAX_IOVECS])
+            self.write_calls += 1
+
+            # Skip past everything that was written, and keep whatever is
+            # left of a partially written buffer.
+            while index < len(buffers) and sent >= len(buffers[index]):
+                sent -= len(buffers[index])
+                index += 1
+
+            if sent:
+                buffers[index] = memoryview(buffers[index])[sent:]
+
+    def _receive_until(self, condition, stream_id=None, timeout=None):
+        """
+        Reads and handles frames until ``condition`` returns true. Raises
+        ``socket.timeout`` if the server goes quiet for longer than the
+        timeout.
+
+        :param condition: A callable taking no arguments.
+        :param stream_id: (optional) The stream whose frames might satisfy
+                          ``condition``.
+        :param timeout: (optional) The timeout, if not the connection's.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+
+        while not condition():
+            if self._read_outstanding(timeout) is None:
+                raise socket.timeout("Timed out waiting for the server.")
+
+    def _read_into(self, stream, buffer):
+        """
+        Reads buffered response data from a stream into ``buffer``, sending
+        any WINDOW_UPDATE that reading has made due. Returns the number of
+        bytes read.
+
+        :param stream: The stream to read from.
+        :param buffer: A writable buffer.
+        """
+        read = stream.read_into(buffer)
+        self._core.stream_consumed(stream.stream_id)
+        self._send_outstanding()
+
+        return read
+
+    def _next_chunk(self, stream):
+        """
+        Returns the next chunk of buffered response data from a stream, or
+        ``None``, sending any WINDOW_UPDATE that reading has made due.
+
+        :param stream: The stream to read from.
+        """
+        chunk = stream.next_chunk()
+        self._core.stream_consumed(stream.stream_id)
+        self._send_outstanding()
 
-        stream.send_outstanding(self._sck)
+        return chunk
+
+    def _close_stream(self, stream, status_code=CANCEL):
+        """
+        Forgets about a stream whose response is finished with. If the server
+        hasn't finished sending, the stream is reset: by default, it's
+        cancelled.
+
+        :param stream: The stream to close.
+        :param status_code: (optional) The RST_STREAM status code.
+        """
+        self._core.close_stream(stream.stream_id, status_code)
+        self._send_outstanding()
+
+    def _abandon_stream(self, stream):
+        """
+        Marks a stream whose response was garbage collected without being
+        closed, so that it's closed the next time anything is sent. This may
+        be called on any thread, at any time, so it only queues the stream.
+
+        :param stream: The abandoned stream.
+        """
+        self._abandoned.append(stream)
+
+    def _close_abandoned(self):
+        """
+        Closes the streams whose responses were garbage collected, returning
+        the IDs of those that were still open. Streams from before a
+        reconnection are skipped.
+        """
+        closed = []
+
+        while self._abandoned:
+            stream = self._abandoned.popleft()
+
+            if self._streams.get(stream.stream_id) is stream:
+                self._core.close_stream(stream.stream_id)
+                closed.append(stream.stream_id)
+
+        return closed
 
     def _read_outstanding(self, timeout):
         """
-        Reads outstanding data from the socket. For now, for debugging
-        purposes, it returns the data directly to the caller. Later it'll
-        farm out to stream objects.
+        Reads outstanding data from the socket and hands it to the protocol.
+        Anything that handling it has queued is then sent.
+
+        Returns the events the data caused, or ``None`` if nothing could be
+        read before the timeout.
+
+        :param timeout: The maximum amount of time to wait for data.
+        """
+        # SSL sockets may already hold decrypted data that select can't see.
+        pending = getattr(self._sck, 'pending', None)
+
+        if not (pending and pending()):
+            readable, _, _ = select.select([self._sck], [], [], timeout)
+            if not readable:
+                return None
+
+        data = self._sck.recv(65535)
+        if not data:
+            raise ConnectionResetError("The server closed the connection.")
+
+        events = self._core.receive_data(data)
 
-        :param timeout: The maximum amount of time to wait for another frame.
+        # Send anything that handling the data has freed up or queued.
+        self._send_outstanding()
+
+        return events
+
+    def _check_alive(self):
         """
-        readable, _, _ = select.select([self._sck], [], [], 0.5)
-        if not readable:
-            return []
+        Pings the server before a request is sent on a connection that has
+        been quiet for longer than ``ping_interval``. Servers and middleboxes
+        drop idle connections without telling us, and a request sent on one
+        would only time out. If the ping goes unanswered the connection is
+        thrown away, so that the request opens a new one.
+
+        Connections with streams open aren't checked, as throwing them away
+        would lose the streams.
+        """
+        if (self.ping_interval is None or self._sck is None or
+                self._fallback is not None or self.open_streams):
+            return
 
-        data = self._sck.read(65535)
-        frames = []
+        last = self._core.last_received
+        if last is not None and time.monotonic() - last < self.ping_interval:
+            return
+
+        try:
+            self.ping()
+        except OSError:
+            self._reset()
 
-        while data:
-            frame, cons = from_bytes(data, self._decompressor)
-            frames.append(frame)
-            data = data[cons:]
+    def _reset(self):
+        """
+        Throws away a dead connection and its protocol state, so that the
+        next request opens a new one.
+        """
+        try:
+            self._sck.close()
+        except OSError:
+            pass
 
-        return frames
+        self._sck = None
+        self._core = SPDYProtocol(self.host, **self._core_options)
+        self._streams = self._core.streams
 
     def _connect(self):
         """
@@ -172,18 +606,50 @@ class SPDYConnection(object):
         method is a no-op if there is already an open socket, so it should be
         safe to call in all circumstances.
         """
+        # A connection the server has sent a GOAWAY on is only kept until its
+        # last streams are done. Then it's replaced.
+        if (self._sck is not None and self._fallback is None and
+                self._core.last_good_stream_id is not None and
+                not self.open_streams):
+            self._reset()
+
         if self._sck is not None:
             return
 
-        # We have to look up the host. For now, assume port 443.
-        addrs = socket.getaddrinfo(self.host, 443)
+        # Race the host's addresses, so a dead one doesn't hold us up.
+        addrs = self._dns_cache.resolve(self.host, self.port)
+
+        try:
+            sck = create_connection(addrs, timeout=self.connect_timeout)
+        except OSError:
+            # The cached addresses may be out of date.
+            self._dns_cache.invalidate(self.host, self.port)
+            raise
+
+        session = self._session_cache.get(self._context, self.host,
+                                          self.port)
+
+        sck.settimeout(self.connect_timeout)
+        try:
+            sck = self._context.wrap_socket(sck, server_hostname=self.host,
+                                            session=session)
+        except ssl.SSLError:
+            # Don't offer a session the server may be choking on again.
+            self._session_cache.invalidate(self._context, self.host,
+                                           self.port)
+            sck.close()
+            raise
+        sck.settimeout(None)
 
-        # Later on we'll want to try a number of these, but for now just use
-        # the first.
-        address = addrs[0][4]
+        self._sck = sck
+        self._save_session()
 
-        sck = socket.socket()
-        sck = self._context.wrap_socket(sck, server_hostname=self.host)
-        sck.connect(address)
+        protocol = negotiated_protocol(sck)
+        self._core.connection_established(protocol)
 
-        self._sck = sck
+        # A server that chose HTTP/1.1, or didn't choose at all, gets
+        # HTTP/1.1 on the socket we already have.
+        if protocol not in SPDY_PROTOCOLS:
+            context = get_context(self._ca_certs, protocols=('http/1.1',))
+            self._fallback = HTTP11Connection(self.host, self.port, sck,
+                                              context, timeout=self.timeout)
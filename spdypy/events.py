@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.events
+~~~~~~~~~~~~~
+
+The events SPDYProtocol reports when it receives data from the server.
+"""
+
+
+class Event(object):
+    """
+    Base class for everything ``SPDYProtocol.receive_data()`` returns.
+    """
+    def __repr__(self):
+        fields = ', '.join('%s=%r' % item for item in sorted(vars(self).items()))
+        return '<%s %s>' % (type(self).__name__, fields)
+
+
+class ResponseReceived(Event):
+    """
+    The server has replied on a stream.
+
+    :param stream_id: The stream ID.
+    :param headers: The response headers.
+    """
+    def __init__(self, stream_id, headers):
+        self.stream_id = stream_id
+        self.headers = headers
+
+
+class PushReceived(Event):
+    """
+    The server has pushed a response, which is kept until a request for its
+    URL claims it.
+
+    :param stream_id: The pushed stream's ID.
+    :param associated_stream_id: The stream it was pushed alongside.
+    :param headers: The headers it was pushed with, including the
+                    ``:scheme``, ``:host`` and ``:path`` it was pushed for.
+    """
+    def __init__(self, stream_id, associated_stream_id, headers):
+        self.stream_id = stream_id
+        self.associated_stream_id = associated_stream_id
+        self.headers = headers
+
+
+class DataReceived(Event):
+    """
+    The server has sent response data on a stream. The data is also buffered
+    on the stream until it's read, and the stream's window only reopens as
+    it's read.
+
+    :param stream_id: The stream ID.
+    :param data: The data.
+    """
+    def __init__(self, stream_id, data):
+        self.stream_id = stream_id
+        self.data = data
+
+
+class StreamEnded(Event):
+    """
+    The server has finished sending on a stream.
+
+    :param stream_id: The stream ID.
+    """
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+
+
+class StreamReset(Event):
+    """
+    A stream has been reset, either by the server or by us because the
+    server broke the rules. Nothing more will arrive on it.
+
+    :param stream_id: The stream ID.
+    :param status_code: The RST_STREAM status code.
+    """
+    def __init__(self, stream_id, status_code):
+        self.stream_id = stream_id
+        self.status_code = status_code
+
+
+class SettingsReceived(Event):
+    """
+    The server has sent a SETTINGS frame.
+
+    :param settings: A dictionary of the settings' values, by setting ID.
+    """
+    def __init__(self, settings):
+        self.stream_id = None
+        self.settings = settings
+
+
+class PingReceived(Event):
+    """
+    The server has pinged us. The reply is sent automatically.
+
+    :param ping_id: The ping ID.
+    """
+    def __init__(self, ping_id):
+        self.stream_id = None
+        self.ping_id = ping_id
+
+
+class PingAcknowledged(Event):
+    """
+    The server has replied to one of our pings.
+
+    :param ping_id: The ping ID.
+    :param rtt: The round trip time in seconds, or ``None`` if the ping
+                wasn't one we sent.
+    """
+    def __init__(self, ping_id, rtt=None):
+        self.stream_id = None
+        self.ping_id = ping_id
+        self.rtt = rtt
+
+
+class ConnectionTerminated(Event):
+    """
+    The server has sent a GOAWAY frame. Streams above ``last_good_stream_id``
+    have been reset, and no new streams should be opened.
+
+    :param last_good_stream_id: The last stream the server will process.
+    :param status_code: The GOAWAY status code.
+    """
+    def __init__(self, last_good_stream_id, status_code):
+        self.stream_id = None
+        self.last_good_stream_id = last_good_stream_id
+        self.status_code = status_code
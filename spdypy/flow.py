@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.flow
+~~~~~~~~~~~
+
+Flow control bookkeeping for SPDY streams and connections.
+"""
+import time
+
+
+# The window size every stream starts with, unless SETTINGS say otherwise.
+DEFAULT_WINDOW_SIZE = 65536
+
+# The largest a flow control window may ever be.
+MAX_WINDOW_SIZE = 0x7FFFFFFF
+
+# The largest we'll let a receive window grow to by default.
+DEFAULT_MAX_WINDOW_SIZE = 16 * 1024 * 1024
+
+# If we owe the remote peer a WINDOW_UPDATE sooner than this many seconds
+# after the last one, the window is the bottleneck and should grow.
+DEFAULT_TUNING_INTERVAL = 0.1
+
+
+class ReceiveWindow(object):
+    """
+    Tracks a receive window: how much data the remote peer may still send us,
+    and when it's worth telling the peer it may send more.
+
+    Rather than sending a WINDOW_UPDATE for every DATA frame, data is released
+    back into the window in batches of half the window size. If those batches
+    come round faster than the tuning interval, the window is doubled (up to
+    ``max_size``), so that fast transfers don't stall waiting on us.
+
+    :param initial_size: The size of the window the peer starts with.
+    :param max_size: (optional) The largest the window may grow to. Defaults
+                     to ``initial_size``, which disables tuning.
+    :param interval: (optional) The tuning interval, in seconds.
+    """
+    def __init__(self, initial_size=DEFAULT_WINDOW_SIZE, max_size=None,
+                 interval=DEFAULT_TUNING_INTERVAL):
+        self.size = initial_size
+        self.max_size = max_size if max_size is not None else initial_size
+        self.interval = interval
+
+        #: The amount of data the peer may send before it must wait for us.
+        self.available = initial_size
+
+        self._released = 0
+        self._last_update = time.monotonic()
+
+    def consume(self, length):
+        """
+        Account for ``length`` bytes of DATA received from the peer.
+
+        :param length: The length of the DATA frame body.
+        """
+        if length > self.available:
+            raise ValueError("Flow control window exceeded.")
+
+        self.available -= length
+
+    def release(self, length):
+        """
+        Mark ``length`` bytes of received data as processed, so the peer may
+        send that much again.
+
+        :param length: The number of bytes processed.
+        """
+        self._released += length
+
+    def update(self):
+        """
+        Returns the delta to send in a WINDOW_UPDATE now, or zero if not
+        enough data has been released to be worth an update.
+        """
+        if self._released < self.size // 2:
+            return 0
+
+        now = time.monotonic()
+        delta = self._released
+        self._released = 0
+
+        if now - self._last_update < self.interval and self.size < self.max_size:
+            growth = min(self.size, self.max_size - self.size)
+            self.size += growth
+            delta += growth
+
+        self._last_update = now
+        self.available += delta
+
+        return delta
@@ -8,6 +8,7 @@ Defines SPDYPy's internal representation of a SPDY frame.
 import struct
 import zlib
 from collections import namedtuple
+from collections.abc import MutableMapping, MutableSet
 
 
 # Define our control frame types.
@@ -27,6 +28,12 @@ FLAG_CLEAR_SETTINGS         = 'FLAG_CLEAR_SETTINGS'
 FLAG_SETTINGS_PERSIST_VALUE = 'FLAG_SETTINGS_PERSIST_VALUE'
 FLAG_SETTINGS_PERSISTED     = 'FLAG_SETTINGS_PERSISTED'
 
+# The bits of the flag byte the frame flags are stored in. What a bit means
+# depends on the type of frame.
+FIN_BIT            = 0x01
+UNIDIRECTIONAL_BIT = 0x02
+CLEAR_SETTINGS_BIT = 0x01
+
 # Define the settings IDs.
 SETTINGS_UPLOAD_BANDWIDTH               = 1
 SETTINGS_DOWNLOAD_BANDWIDTH             = 2
@@ -53,6 +60,9 @@ FRAME_TOO_LARGE       = 11
 # Additional error code for GOAWAY.
 INTERNAL_ERROR = 2
 
+# The largest frame body the 24-bit length field can describe.
+MAX_FRAME_LENGTH = 0xFFFFFF
+
 
 # Define our NamedTuple for containing frame settings.
 Settings = namedtuple('Settings', ['id', 'value', 'flags'])
@@ -63,83 +73,403 @@ def from_bytes(buffer, decompressor=None):
     Build a Frame object from the buffer. Returns the correct Frame and the
     number of bytes consumed from the buffer.
 
-    :param buffer: The byte buffer that represents the frame.
+    :param buffer: The byte buffer that represents the frame. This may be any
+                   object supporting the buffer protocol: it is read through a
+                   ``memoryview``, so no copies of the frame are made.
     :param decompressor: Optionally provide a decompressor for the NV block.
     """
-    control = buffer[0] & 0x80
+    view = memoryview(buffer)
+    word, flag_byte, length = _read_frame_header(view, 0)
 
     # Build the fields from the first 4 bytes, then pass the remainder off to
     # the relevant class.
-    if control:
-        fields = struct.unpack("!HH", buffer[0:4])
-        version = fields[0] & 0x7FFF
-        frame_type = fields[1]
+    if word & 0x80000000:
+        version = (word >> 16) & 0x7FFF
+        frame_type = word & 0xFFFF
 
-        frame = frame_from_type.get(frame_type, Frame)()
+        frame_class = frame_from_type.get(frame_type)
+
+        if frame_class is None:
+            frame = UnknownFrame()
+            frame.frame_type = frame_type
+        else:
+            frame = frame_class()
 
         # Assign the fields we've already parsed.
         frame.control = True
         frame.version = version
     else:
-        stream_id = struct.unpack("!L", buffer[0:4])[0] & 0x7FFFFFFF
-
         frame = DataFrame()
-        frame.stream_id = stream_id
+        frame.stream_id = word & 0x7FFFFFFF
 
     # Let the frame build its flags up.
-    frame.build_flags(buffer[4])
-
-    # Get the length.
-    length = struct.unpack("!L", buffer[4:8])[0] & 0x00FFFFFF
+    frame.build_flags(flag_byte)
 
     # Then pass the remaining data to the data builder.
-    frame.build_data(buffer[8:8 + length], decompressor)
+    frame.build_data(view[8:8 + length], decompressor)
 
     return (frame, 8 + length)
 
 
+class FrameParser(object):
+    """
+    An incremental SPDY frame parser. Data read from the network is fed into
+    the parser in whatever sized chunks it arrives in, and the parser returns
+    every frame that has been completely received. Partial frames are kept
+    until the rest of their data arrives.
+
+    The parser keeps a single growable receive buffer, and walks through it
+    at a running offset. Consumed data is only discarded once per call to
+    ``receive``, so a large read containing many small frames is parsed in
+    linear time.
+
+    :param decompressor: The zlib decompression object for the connection.
+    """
+    def __init__(self, decompressor=None):
+        self._decompressor = decompressor
+        self._buffer = bytearray()
+
+        # Frames parsed before one that couldn't be, still to be returned.
+        self._parsed = []
+
+    def receive(self, data):
+        """
+        Add data to the receive buffer, and return a list of all the frames
+        that can now be completely parsed.
+
+        :param data: The bytes read from the network.
+        """
+        self._buffer += data
+
+        frames, self._parsed = self._parsed, []
+        offset = 0
+        available = len(self._buffer)
+        view = memoryview(self._buffer)
+
+        try:
+            while available - offset >= 8:
+                length = _read_frame_header(view, offset)[2]
+                end = offset + 8 + length
+
+                # Wait for the rest of this frame to arrive.
+                if end > available:
+                    break
+
+                # A frame whose body can't be decoded is still dropped from
+                # the buffer, so that it's only ever complained about once.
+                # The frames before it are returned by the next call.
+                start, offset = offset, end
+                frame, _ = from_bytes(view[start:end], self._decompressor)
+                frames.append(frame)
+        except Exception:
+            # The failed frame's views may outlive this call in the
+            # traceback, so the buffer can't be resized: keep a copy of
+            # what's left instead.
+            self._parsed = frames
+            self._buffer = self._buffer[offset:]
+            raise
+        finally:
+            view.release()
+
+        # Throw away everything we've parsed in one go.
+        del self._buffer[:offset]
+
+        return frames
+
+    def __len__(self):
+        """
+        The number of bytes of incomplete frame data currently buffered.
+        """
+        return len(self._buffer)
+
+
 def parse_nv_block(decompressor, nv_bytes):
     """
-    This function parses the compressed name-value header block.
+    This function parses the compressed name-value header block. The block
+    is decompressed straight away, as the zlib stream must be inflated in
+    order, but the headers are only decoded as they're used: see
+    ``HeaderBlock``.
 
     :param decompressor: A ``zlib`` decompression object from the stream.
     :param nv_bytes: The bytes comprising the name-value header block.
     """
-    headers = {}
-
     if not nv_bytes:
-        return headers
+        return HeaderBlock()
 
-    data = decompressor.decompress(nv_bytes)
+    return HeaderBlock(decompressor.decompress(nv_bytes))
 
-    # Get the number of NV pairs.
-    num = struct.unpack("!L", data[0:4])[0]
 
-    data = data[4:]
+class HeaderMap(MutableMapping):
+    """
+    The headers of a frame. Names are case-insensitive: they're lowercased
+    once, when they're set, as SPDY requires. The headers keep the order
+    they were set in.
+
+    Every header is stored as a list of its values. Looking a header up
+    gives its value, or a list of its values if it has several, as in a
+    name-value block; ``get_all()`` always gives the list.
+
+    The serialized name-value block is cached until the headers change, so
+    headers that are sent again, or passed on unchanged, aren't re-encoded.
+
+    :param headers: (optional) A mapping of headers to start with.
+    """
+    __slots__ = ('_values', '_nv_block')
+
+    def __init__(self, headers=None):
+        self._values = {}
+        self._nv_block = None
+
+        if headers is not None:
+            self.update(headers)
+
+    def __getitem__(self, name):
+        vals = self._lookup(name.lower())
+        return vals[0] if len(vals) == 1 else list(vals)
+
+    def __setitem__(self, name, value):
+        vals = list(value) if isinstance(value, list) else [value]
+        self._entries()[name.lower()] = vals
+        self._nv_block = None
+
+    def __delitem__(self, name):
+        del self._entries()[name.lower()]
+        self._nv_block = None
+
+    def __contains__(self, name):
+        return name.lower() in self._entries()
+
+    def __iter__(self):
+        return iter(self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, dict(self))
+
+    def get_all(self, name):
+        """
+        Returns a list of every value of a header, which is empty if the
+        header isn't set.
+
+        :param name: The header name.
+        """
+        try:
+            return list(self._lookup(name.lower()))
+        except KeyError:
+            return []
+
+    def add(self, name, value):
+        """
+        Adds a value to a header, keeping any it already has.
+
+        :param name: The header name.
+        :param value: The value to add.
+        """
+        name = name.lower()
+
+        if name in self._entries():
+            self._entries()[name] = self._lookup(name) + [value]
+        else:
+            self._entries()[name] = [value]
+
+        self._nv_block = None
+
+    @property
+    def nv_block(self):
+        """
+        The headers as an uncompressed name-value block.
+        """
+        if self._nv_block is None:
+            pairs = [(name, b'\0'.join(self._lookup(name)))
+                     for name in self._entries()]
+            self._nv_block = bytes(_serialize_pairs(pairs))
+
+        return self._nv_block
+
+    def _entries(self):
+        """
+        Returns the dictionary of values, by lowercased name.
+        """
+        return self._values
+
+    def _lookup(self, name):
+        """
+        Returns the list of values of a header. Raises ``KeyError`` if it
+        isn't set.
+
+        :param name: The lowercased header name.
+        """
+        return self._values[name]
+
+
+class HeaderBlock(HeaderMap):
+    """
+    The headers from a received name-value block, decoded lazily. The
+    decompressed block is kept as it is. The first time the headers are
+    used, the names are read out of it; each value is copied out and split
+    on null bytes the first time it's looked up.
+
+    The block is the cached ``nv_block`` until the headers change, so
+    received headers can be passed on without re-encoding them.
+
+    :param data: (optional) The decompressed name-value block.
+    """
+    __slots__ = ('_data', '_offsets')
+
+    def __init__(self, data=b''):
+        super(HeaderBlock, self).__init__()
+
+        self._data = bytes(data)
+        self._nv_block = self._data or None
+
+        # The start and end of each value in the block, by name, once the
+        # names have been read.
+        self._offsets = None
+
+    def _entries(self):
+        """
+        Returns the dictionary of values, by lowercased name, reading the
+        names out of the block the first time it's called. Values that
+        haven't been decoded yet are ``None``.
+        """
+        if self._offsets is not None:
+            return self._values
+
+        self._offsets = _read_nv_offsets(self._data)
+        self._values = dict.fromkeys(self._offsets)
+
+        return self._values
+
+    def _lookup(self, name):
+        """
+        Returns the list of values of a header, decoding them if they haven't
+        been yet. Raises ``KeyError`` if it isn't set.
+
+        :param name: The lowercased header name.
+        """
+        if self._offsets is None:
+            self._entries()
+
+        vals = self._values[name]
+
+        if vals is None:
+            # You can get multiple values in a header, they're separated by
+            # null bytes.
+            start, end = self._offsets[name]
+            vals = self._values[name] = self._data[start:end].split(b'\0')
+
+        return vals
+
+
+def serialize_nv_block(nv_headers):
+    """
+    Serialize a Name-Value header block, without compressing it. The size of
+    the block is computed up front, and the block is written into a single
+    preallocated buffer.
+
+    :param nv_headers: The dictionary representing the NV header block.
+    """
+    # A HeaderMap caches its own block.
+    if isinstance(nv_headers, HeaderMap):
+        return nv_headers.nv_block
+
+    # Join any multi-valued headers first, so we know how big everything is.
+    pairs = []
+
+    for name, value in nv_headers.items():
+        if isinstance(value, list):
+            value = b'\0'.join(value)
+
+        pairs.append((name, value))
+
+    return _serialize_pairs(pairs)
+
+
+def _serialize_pairs(pairs):
+    """
+    Write a list of name-value pairs into an uncompressed NV block.
+
+    :param pairs: The list of header names and their joined values.
+    """
+    size = 4
+    for name, value in pairs:
+        size += 8 + len(name) + len(value)
+
+    data = bytearray(size)
+    struct.pack_into("!L", data, 0, len(pairs))
+    offset = 4
+
+    for name, value in pairs:
+        name_len = len(name)
+        struct.pack_into("!L", data, offset, name_len)
+        offset += 4
+        data[offset:offset + name_len] = name
+        offset += name_len
+
+        value_len = len(value)
+        struct.pack_into("!L", data, offset, value_len)
+        offset += 4
+        data[offset:offset + value_len] = value
+        offset += value_len
+
+    return data
+
+
+def _read_frame_header(view, offset):
+    """
+    Read the 8 byte header of the frame at ``offset``. Returns the first 32
+    bits, which hold the control bit and either the version and type or the
+    stream ID, the flag byte, and the length.
+
+    :param view: The buffer holding the frame.
+    :param offset: Where the frame starts in the buffer.
+    """
+    word, length = struct.unpack_from("!LL", view, offset)
+    return (word, length >> 24, length & 0x00FFFFFF)
 
-    # Remaining data.
-    for i in range(0, num):
-        # Get the length of the name, in octets.
-        name_len = struct.unpack("!L", data[0:4])[0]
-        name = data[4:4+name_len]
 
-        data = data[4+name_len:]
+def _read_nv_offsets(data):
+    """
+    Read the names out of an uncompressed NV block. Returns the start and
+    end of each header's value, by lowercased name.
 
-        # Now the length of the value.
-        value_len = struct.unpack("!L", data[0:4])[0]
-        value = data[4:4+value_len]
+    :param data: The uncompressed NV block.
+    """
+    offsets = {}
 
-        data = data[4+value_len:]
+    if not data:
+        return offsets
 
-        # You can get multiple values in a header, they're separated by
-        # null bytes. Use a list to store the multiple values.
-        vals = value.split(b'\0')
-        if len(vals) == 1:
-            vals = vals[0]
+    # Get the number of NV pairs.
+    num = struct.unpack_from("!L", data, 0)[0]
+    offset = 4
+
+    for i in range(0, num):
+        name_len = struct.unpack_from("!L", data, offset)[0]
+        offset += 4
+        name = data[offset:offset + name_len].lower()
+        offset += name_len
 
-        headers[name] = vals
+        value_len = struct.unpack_from("!L", data, offset)[0]
+        offset += 4
+        offsets[name] = (offset, offset + value_len)
+        offset += value_len
 
-    return headers
+    return offsets
+
+
+def compress_nv_block(compressor, data):
+    """
+    Compress a serialized Name-Value header block, flushing the compressor so
+    that the block can be sent on its own.
+
+    :param compressor: The zlib compressor object for the stream.
+    :param data: The serialized NV header block.
+    """
+    return b''.join((compressor.compress(data),
+                     compressor.flush(zlib.Z_SYNC_FLUSH)))
 
 
 def build_nv_block(compressor, nv_headers):
@@ -149,40 +479,87 @@ def build_nv_block(compressor, nv_headers):
     :param compressor: The zlib compressor object for the stream.
     :param nv_headers: The dictionary representing the NV header block.
     """
-    # First, stringify!
-    data = struct.pack("!L", len(nv_headers))
+    return compress_nv_block(compressor, serialize_nv_block(nv_headers))
 
-    for name, value in nv_headers.items():
-        data += struct.pack("!L", len(name))
-        data += name
 
-        if isinstance(value, list):
-            joined = b'\0'.join(value)
-            data += struct.pack("!L", len(joined))
-            data += joined
-        else:
-            data += struct.pack("!L", len(value))
-            data += value
+class FlagSet(MutableSet):
+    """
+    A set-like view of a frame's flag byte, so that flags can be worked with
+    by name: ``FLAG_FIN in frame.flags``, ``frame.flags.add(FLAG_FIN)``.
+    Changing the view changes the frame. Only the flags the frame's type
+    defines may be added.
+
+    :param frame: The frame.
+    """
+    __slots__ = ('_frame',)
+
+    def __init__(self, frame):
+        self._frame = frame
 
-    # Now compress like a champ.
-    compressed = compressor.compress(data)
-    compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+    def __contains__(self, flag):
+        bit = self._frame._flag_bits.get(flag, 0)
+        return bool(self._frame.flag_byte & bit)
 
-    return compressed
+    def __iter__(self):
+        for flag, bit in self._frame._flag_bits.items():
+            if self._frame.flag_byte & bit:
+                yield flag
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return 'FlagSet(%r)' % set(self)
+
+    def add(self, flag):
+        try:
+            bit = self._frame._flag_bits[flag]
+        except KeyError:
+            raise ValueError("%s doesn't define %s." %
+                             (type(self._frame).__name__, flag))
+
+        self._frame.flag_byte |= bit
+
+    def discard(self, flag):
+        self._frame.flag_byte &= ~self._frame._flag_bits.get(flag, 0)
 
 
 class Frame(object):
     """
     A single SPDY frame. This is effectively an abstract base class for the
     various SPDY frame classes.
+
+    Frames are created in great numbers, so they have no ``__dict__``. Their
+    flags are kept as the flag byte from the wire, in ``flag_byte``, and
+    ``flags`` gives a set-like view of them by name.
     """
+    __slots__ = ('control', 'version', 'flag_byte', 'data', 'stream_id')
+
+    # The flags this type of frame defines, and their bits.
+    _flag_bits = {}
+
     def __init__(self):
         self.control = None
         self.version = None
-        self.flags = set()
+        self.flag_byte = 0
         self.data = None
         self.stream_id = None
 
+    @property
+    def flags(self):
+        """
+        The frame's flags, as a set-like view of ``flag_byte``.
+        """
+        return FlagSet(self)
+
+    @flags.setter
+    def flags(self, flags):
+        self.flag_byte = 0
+        view = FlagSet(self)
+
+        for flag in flags:
+            view.add(flag)
+
     def build_flags(self, flag_byte):
         """
         This method should take a flag byte, and then populate the flags set
@@ -204,6 +581,15 @@ class Frame(object):
         """
         raise NotImplementedError("This is an abstract base class.")
 
+    def to_buffers(self, *args):
+        """
+        This method re-serialises the frame into a list of buffers that, when
+        concatenated, make up the frame on the wire. The list is suitable for
+        passing directly to ``socket.sendmsg``. Frames whose bodies may be
+        large override this to avoid copying the body.
+        """
+        return [self.to_bytes(*args)]
+
 
 class SYNMixin(object):
     """
@@ -211,10 +597,14 @@ class SYNMixin(object):
     classes. These classes reflect frames that have identical structures, and
     so will have identical implementations for a number of their methods.
     """
+    __slots__ = ()
+
+    _flag_bits = {FLAG_FIN: FIN_BIT, FLAG_UNIDIRECTIONAL: UNIDIRECTIONAL_BIT}
+
     def __init__(self):
         super(SYNMixin, self).__init__()
 
-        self.headers = {}
+        self.headers = HeaderMap()
 
     def build_flags(self, flag_byte):
         """
@@ -222,10 +612,7 @@ class SYNMixin(object):
 
         :param flag_byte: The byte containing the flags.
         """
-        if flag_byte & 0x01:
-            self.flags.add(FLAG_FIN)
-        if flag_byte & 0x02:
-            self.flags.add(FLAG_UNIDIRECTIONAL)
+        self.flag_byte = flag_byte & (FIN_BIT | UNIDIRECTIONAL_BIT)
 
     def build_data(self, data_buffer, decompressor, stream):
         """
@@ -233,16 +620,18 @@ class SYNMixin(object):
         SYN_STREAM frame, otherwise set to False.
         """
         if stream:
-            fields = struct.unpack("!LLL", data_buffer[0:12])
+            fields = struct.unpack("!LLH", data_buffer[0:10])
         else:
             fields = struct.unpack("!L", data_buffer[0:4])
 
         self.stream_id = fields[0] & 0x7FFFFFFF
 
         if stream:
+            # The priority is the top three bits of a 16-bit field, the rest
+            # of which is unused or the credential slot.
             self.assoc_stream_id = fields[1] & 0x7FFFFFFF
-            self.priority = (fields[2] & 0xE0000000) >> 29
-            self.headers = parse_nv_block(decompressor, data_buffer[12:])
+            self.priority = (fields[2] & 0xE000) >> 13
+            self.headers = parse_nv_block(decompressor, data_buffer[10:])
         else:
             self.headers = parse_nv_block(decompressor, data_buffer[4:])
 
@@ -251,11 +640,14 @@ class SYNStreamFrame(SYNMixin, Frame):
     """
     A single SYN_STREAM frame.
     """
+    __slots__ = ('headers', 'assoc_stream_id', 'priority', 'template')
+
     def __init__(self):
         super(SYNStreamFrame, self).__init__()
 
         self.assoc_stream_id = None
         self.priority = None
+        self.template = None
 
     def build_data(self, data_buffer, decompressor):
         super(SYNStreamFrame, self).build_data(data_buffer, decompressor, True)
@@ -264,18 +656,24 @@ class SYNStreamFrame(SYNMixin, Frame):
         """
         Serialise the SYN_STREAM frame to a bytestream.
         """
+        return b''.join(self.to_buffers(compressor))
+
+    def to_buffers(self, compressor):
+        """
+        Serialise the SYN_STREAM frame to a list containing the frame header
+        and the compressed NV block.
+        """
         version = 0x8000 | self.version
-        flags = 0
+        flags = self.flag_byte
         assoc_id = (self.assoc_stream_id if self.assoc_stream_id is not None
                     else 0)
 
-        if FLAG_FIN in self.flags:
-            flags = flags | 0x01
-        if FLAG_UNIDIRECTIONAL in self.flags:
-            flags = flags | 0x02
-
-        # We need the compressed NV block.
-        nv_block = build_nv_block(compressor, self.headers)
+        # We need the compressed NV block. If we were built from a request
+        # template, our headers are only the ones that vary.
+        if self.template is not None:
+            nv_block = self.template.build_nv_block(compressor, self.headers)
+        else:
+            nv_block = build_nv_block(compressor, self.headers)
 
         length = 10 + len(nv_block)
 
@@ -287,15 +685,15 @@ class SYNStreamFrame(SYNMixin, Frame):
                            assoc_id,
                            (self.priority << 13))
 
-        data += nv_block
-
-        return data
+        return [data, nv_block]
 
 
 class SYNReplyFrame(SYNMixin, Frame):
     """
     A single SYN_REPLY frame.
     """
+    __slots__ = ('headers',)
+
     def build_data(self, data_buffer, decompressor):
         super(SYNReplyFrame, self).build_data(data_buffer, decompressor, False)
 
@@ -303,11 +701,15 @@ class SYNReplyFrame(SYNMixin, Frame):
         """
         Serialise the SYN_REPLY frame to a bytestream.
         """
-        version = 0x8000 | self.version
-        flags = 0
+        return b''.join(self.to_buffers(compressor))
 
-        if FLAG_FIN in self.flags:
-            flags = flags | 0x01
+    def to_buffers(self, compressor):
+        """
+        Serialise the SYN_REPLY frame to a list containing the frame header and
+        the compressed NV block.
+        """
+        version = 0x8000 | self.version
+        flags = self.flag_byte
 
         # We need the compressed NV block.
         nv_block = build_nv_block(compressor, self.headers)
@@ -320,15 +722,15 @@ class SYNReplyFrame(SYNMixin, Frame):
                            ((flags << 24) | length),
                            self.stream_id)
 
-        data += nv_block
-
-        return data
+        return [data, nv_block]
 
 
 class RSTStreamFrame(Frame):
     """
     A single RST_STREAM frame.
     """
+    __slots__ = ('status_code',)
+
     def __init__(self):
         super(RSTStreamFrame, self).__init__()
 
@@ -378,6 +780,10 @@ class SettingsFrame(Frame):
     """
     A single SETTINGS frame.
     """
+    __slots__ = ('settings',)
+
+    _flag_bits = {FLAG_CLEAR_SETTINGS: CLEAR_SETTINGS_BIT}
+
     def __init__(self):
         super(SettingsFrame, self).__init__()
 
@@ -387,8 +793,7 @@ class SettingsFrame(Frame):
         """
         Build the flags for this frame from the given byte.
         """
-        if flag_byte & 0x01:
-            self.flags.add(FLAG_CLEAR_SETTINGS)
+        self.flag_byte = flag_byte & CLEAR_SETTINGS_BIT
 
     def build_data(self, data_buffer, *args):
         """
@@ -426,10 +831,7 @@ class SettingsFrame(Frame):
         Serialise the SETTINGS frame to a bytestream.
         """
         version = 0x8000 | self.version
-        flags = 0
-
-        if FLAG_CLEAR_SETTINGS in self.flags:
-            flags = flags | 0x01
+        flags = self.flag_byte
 
         # Build the array of settings data.
         body_data = b''
@@ -448,7 +850,8 @@ class SettingsFrame(Frame):
 
             body_data += sdata
 
-        length = 8 + len(body_data)
+        # The body is the count of settings, followed by the settings.
+        length = 4 + len(body_data)
 
         data = struct.pack("!HHLL",
                            version,
@@ -465,6 +868,8 @@ class PingFrame(Frame):
     """
     A single PING frame.
     """
+    __slots__ = ('ping_id',)
+
     def __init__(self):
         super(PingFrame, self).__init__()
 
@@ -506,6 +911,8 @@ class GoAwayFrame(Frame):
     """
     A single GOAWAY frame.
     """
+    __slots__ = ('last_good_stream_id', 'status_code')
+
     def __init__(self):
         super(GoAwayFrame, self).__init__()
 
@@ -551,17 +958,20 @@ class HeadersFrame(Frame):
     """
     A single HEADERS frame.
     """
+    __slots__ = ('headers',)
+
+    _flag_bits = {FLAG_FIN: FIN_BIT}
+
     def __init__(self):
         super(HeadersFrame, self).__init__()
 
-        self.headers = {}
+        self.headers = HeaderMap()
 
     def build_flags(self, flag_byte):
         """
         Build the flags for this frame from the given byte.
         """
-        if flag_byte & 0x01:
-            self.flags.add(FLAG_FIN)
+        self.flag_byte = flag_byte & FIN_BIT
 
     def build_data(self, data_buffer, decompressor):
         """
@@ -577,11 +987,15 @@ class HeadersFrame(Frame):
         """
         Serialise the HEADERS frame to a bytestream.
         """
-        version = 0x8000 | self.version
-        flags = 0
+        return b''.join(self.to_buffers(compressor))
 
-        if FLAG_FIN in self.flags:
-            flags = flags | 0x01
+    def to_buffers(self, compressor):
+        """
+        Serialise the HEADERS frame to a list containing the frame header and
+        the compressed NV block.
+        """
+        version = 0x8000 | self.version
+        flags = self.flag_byte
 
         # We need the compressed NV block.
         nv_block = build_nv_block(compressor, self.headers)
@@ -594,15 +1008,15 @@ class HeadersFrame(Frame):
                            ((flags << 24) | length),
                            self.stream_id)
 
-        data += nv_block
-
-        return data
+        return [data, nv_block]
 
 
 class WindowUpdateFrame(Frame):
     """
     A single WINDOW_UPDATE frame.
     """
+    __slots__ = ('delta_window_size',)
+
     def __init__(self):
         super(WindowUpdateFrame, self).__init__()
 
@@ -642,36 +1056,73 @@ class WindowUpdateFrame(Frame):
         return data
 
 
+class UnknownFrame(Frame):
+    """
+    A control frame of a type we don't know. SPDY says these must be
+    ignored, so only the type is kept.
+    """
+    __slots__ = ('frame_type',)
+
+    def __init__(self):
+        super(UnknownFrame, self).__init__()
+
+        self.frame_type = None
+
+    def build_flags(self, flag_byte):
+        """
+        Keep the flags, whatever they mean.
+        """
+        self.flag_byte = flag_byte
+
+    def build_data(self, data_buffer, *args):
+        """
+        The body means nothing to us, so it's skipped.
+        """
+        return
+
+
 class DataFrame(Frame):
+    """
+    A single DATA frame.
+    """
+    __slots__ = ()
+
+    _flag_bits = {FLAG_FIN: FIN_BIT}
+
     def build_flags(self, flag_byte):
         """
         Build the flags for this data frame.
         """
-        if flag_byte & 0x01:
-            self.flags.add(FLAG_FIN)
+        self.flag_byte = flag_byte & FIN_BIT
 
     def build_data(self, data_buffer, *args):
         """
         Build the data frame body fields.
         """
-        self.data = data_buffer
+        # Take our own copy: the buffer may be a view into a receive buffer
+        # that is about to be reused.
+        self.data = bytes(data_buffer)
 
     def to_bytes(self, *args):
         """
         Serialize the DATA frame to a bytestream.
         """
-        flags = 0
-
-        if FLAG_FIN in self.flags:
-            flags |= 0x01
+        return b''.join(self.to_buffers())
 
+    def to_buffers(self, *args):
+        """
+        Serialize the DATA frame to a list containing the frame header and the
+        frame body, so the body is never copied.
+        """
+        flags = self.flag_byte
         length = len(self.data)
 
-        data = struct.pack("!LL", self.stream_id, ((flags << 24) | length))
+        if length > MAX_FRAME_LENGTH:
+            raise ValueError("DATA frame body too long: %d bytes." % length)
 
-        data += self.data
+        data = struct.pack("!LL", self.stream_id, ((flags << 24) | length))
 
-        return data
+        return [data, self.data]
 
 
 # Map frame indicator bytes to frame objects.
@@ -685,3 +1136,20 @@ frame_from_type = {
     HEADERS: HeadersFrame,
     WINDOW_UPDATE: WindowUpdateFrame,
 }
+
+
+# The pure-Python codec above is the reference implementation. Its inner
+# loops are replaced by compiled ones if the optional extension has been
+# built, with ``invoke build``.
+_py_read_frame_header = _read_frame_header
+_py_read_nv_offsets = _read_nv_offsets
+_py_serialize_pairs = _serialize_pairs
+
+try:
+    from ._speedups import (read_frame_header as _read_frame_header,
+                            read_nv_offsets as _read_nv_offsets,
+                            serialize_pairs as _serialize_pairs)
+except ImportError:
+    HAS_SPEEDUPS = False
+else:
+    HAS_SPEEDUPS = True
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.health
+~~~~~~~~~~~~~
+
+Measuring round trip times, for telling live connections from dead ones.
+"""
+
+
+# How long the server has to answer a PING before the connection is taken
+# for dead, in seconds.
+DEFAULT_PING_TIMEOUT = 5.0
+
+# The gains RFC 6298 uses for the smoothed RTT and its variance.
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+
+
+class RTTEstimator(object):
+    """
+    Keeps a smoothed round trip time and its variance from PING samples, in
+    the same way TCP does (RFC 6298). All times are in seconds, and are
+    ``None`` until the first sample.
+    """
+    def __init__(self):
+        #: The most recent sample.
+        self.latest = None
+
+        #: The smoothed round trip time.
+        self.smoothed = None
+
+        #: The smoothed mean deviation of the samples.
+        self.variance = None
+
+        #: The number of samples taken.
+        self.samples = 0
+
+    def sample(self, rtt):
+        """
+        Adds a round trip time measurement.
+
+        :param rtt: The round trip time, in seconds.
+        """
+        if self.smoothed is None:
+            self.smoothed = rtt
+            self.variance = rtt / 2
+        else:
+            self.variance = ((1 - RTT_BETA) * self.variance +
+                             RTT_BETA * abs(self.smoothed - rtt))
+            self.smoothed = (1 - RTT_ALPHA) * self.smoothed + RTT_ALPHA * rtt
+
+        self.latest = rtt
+        self.samples += 1
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.http11
+~~~~~~~~~~~~~
+
+Falling back to HTTP/1.1 for servers that don't speak SPDY.
+"""
+import http.client
+import threading
+from .protocol import _body_length
+
+
+# The most requests that may be in flight at once. Past this, the oldest
+# request is abandoned and its connection closed, so that requests whose
+# responses are never fetched don't hold connections open forever.
+MAX_IN_FLIGHT = 100
+
+
+class HTTP11Connection(object):
+    """
+    Speaks HTTP/1.1 to a server that chose it over SPDY during the TLS
+    handshake, behind the same interface as ``SPDYConnection``. Requests are
+    still identified by stream IDs, and responses are
+    ``http.client.HTTPResponse`` objects, which read like ``SPDYResponse``.
+
+    HTTP/1.1 carries one request at a time, so each request in flight gets a
+    keep-alive connection of its own: the one the handshake was made on
+    first, and new ones as they're needed. A connection takes another
+    request once the response it carried has been read or closed. A request
+    that fails has its connection closed, as does the oldest request when
+    more than ``MAX_IN_FLIGHT`` are in flight. Request priorities are
+    ignored.
+
+    Requests may be made from many threads at once.
+
+    :param host: The host connected to.
+    :param port: The port connected to.
+    :param sck: The socket the handshake was made on.
+    :param context: The ``SSLContext`` to open new connections with.
+    :param timeout: (optional) How long to wait for the server, in seconds.
+    """
+    def __init__(self, host, port, sck, context, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.last_stream_id = None
+        self.requests_sent = 0
+        self._context = context
+        self._next_stream_id = 1
+        self._lock = threading.Lock()
+
+        # Connections with nothing in flight, and the connection and response
+        # of each request in flight, by stream ID.
+        self._idle = [self._new_connection(sck)]
+        self._in_flight = {}
+
+    def request(self, method, path, body=None, headers={}, priority=None):
+        """
+        Sends a request, returning its stream ID. Takes the same arguments as
+        ``SPDYConnection.request()``.
+        """
+        stream_id = self.putrequest(method, path)
+
+        for header, argument in headers.items():
+            self.putheader(header, argument, stream_id=stream_id)
+
+        self.endheaders(message_body=body, stream_id=stream_id)
+
+        return stream_id
+
+    def putrequest(self, request, selector, template=None, priority=None):
+        """
+        Begins a request on an idle connection, returning its stream ID. The
+        template's headers, other than SPDY's special ones, are sent too.
+
+        :param request: The request string, e.g. GET.
+        :param selector: The path selector, beginning with a '/'.
+        :param template: (Optional) A ``RequestTemplate``.
+        :param priority: (Optional) Ignored.
+        """
+        with self._lock:
+            conn = self._checkout()
+
+            stream_id = self._next_stream_id
+            self._next_stream_id += 2
+            self._in_flight[stream_id] = [conn, None]
+            self.last_stream_id = stream_id
+
+            evicted = []
+            while len(self._in_flight) > MAX_IN_FLIGHT:
+                oldest = next(iter(self._in_flight))
+                evicted.append(self._in_flight.pop(oldest)[0])
+
+        for old_conn in evicted:
+            old_conn.close()
+
+        try:
+            conn.putrequest(_str(request), _str(selector))
+
+            if template is not None:
+                for header, argument in template.headers.items():
+                    if not header.startswith(b':'):
+                        self.putheader(header, argument, stream_id=stream_id)
+        except Exception:
+            self._discard(stream_id)
+            raise
+
+        return stream_id
+
+    def putheader(self, header, argument, stream_id=None):
+        """
+        Adds a header to a request that hasn't been sent yet.
+
+        :param header: The header key.
+        :param argument: The header value. May be a list of values.
+        :param stream_id: (Optional) The stream to add headers to.
+        """
+        stream_id = stream_id if stream_id else self.last_stream_id
+        conn = self._connection_for(stream_id)
+        values = argument if isinstance(argument, list) else [argument]
+
+        try:
+            for value in values:
+                conn.putheader(header, value)
+        except Exception:
+            self._discard(stream_id)
+            raise
+
+    def endheaders(self, message_body=None, stream_id=None):
+        """
+        Finishes the headers of a request and sends it, along with its body
+        if there is one. Bodies of unknown length are sent chunked.
+
+        :param message_body: (Optional) Body data to send.
+        :param stream_id: (Optional) The stream to end the headers of.
+        """
+        stream_id = stream_id if stream_id else self.last_stream_id
+        conn = self._connection_for(stream_id)
+        chunked = False
+
+        if isinstance(message_body, str):
+            message_body = message_body.encode('iso-8859-1')
+
+        try:
+            if message_body is not None:
+                length = _body_length(message_body)
+
+                if length is None:
+                    conn.putheader('Transfer-Encoding', 'chunked')
+                    chunked = True
+                else:
+                    conn.putheader('Content-Length', str(length))
+
+            conn.endheaders(message_body, encode_chunked=chunked)
+        except Exception:
+            self._discard(stream_id)
+            raise
+
+        self.requests_sent += 1
+
+    def getresponse(self, stream_id=None):
+        """
+        Waits for the response to a request, and returns it.
+
+        :param stream_id: (Optional) The stream to get the response for.
+        """
+        stream_id = stream_id if stream_id else self.last_stream_id
+        entry = self._in_flight[stream_id]
+
+        try:
+            entry[1] = entry[0].getresponse()
+        except Exception:
+            self._discard(stream_id)
+            raise
+
+        return entry[1]
+
+    def close(self):
+        """
+        Closes every connection.
+        """
+        with self._lock:
+            conns = self._idle + [entry[0] for entry in
+                                  self._in_flight.values()]
+            self._idle = []
+            self._in_flight = {}
+
+        for conn in conns:
+            conn.close()
+
+    def _checkout(self):
+        """
+        Returns a connection with nothing in flight, opening a new one if
+        need be. Must be called with the lock held.
+        """
+        for stream_id, (conn, response) in list(self._in_flight.items()):
+            if response is not None and response.isclosed():
+                del self._in_flight[stream_id]
+                self._idle.append(conn)
+
+        if self._idle:
+            return self._idle.pop()
+
+        return self._new_connection()
+
+    def _connection_for(self, stream_id):
+        """
+        Returns the connection a request is being made on.
+
+        :param stream_id: The stream ID.
+        """
+        return self._in_flight[stream_id][0]
+
+    def _discard(self, stream_id):
+        """
+        Forgets a request that failed, closing its connection: whatever state
+        the connection was left in, it can't carry another request.
+
+        :param stream_id: The stream ID.
+        """
+        with self._lock:
+            entry = self._in_flight.pop(stream_id, None)
+
+        if entry is not None:
+            entry[0].close()
+
+    def _new_connection(self, sck=None):
+        """
+        Builds an ``HTTPSConnection``. It connects when it's first used, or
+        uses ``sck`` if it's given.
+
+        :param sck: (optional) An already connected socket.
+        """
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+
+        conn = http.client.HTTPSConnection(self.host, self.port,
+                                           context=self._context, **kwargs)
+
+        if sck is not None:
+            sck.settimeout(self.timeout)
+            conn.sock = sck
+
+        return conn
+
+
+def _str(value):
+    """
+    HTTP/1.1 request lines and headers are built from strings.
+
+    :param value: A string or bytes.
+    """
+    return value.decode('latin-1') if isinstance(value, bytes) else value
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.net
+~~~~~~~~~~
+
+Resolving hosts and opening TCP connections to them.
+"""
+import errno
+import select
+import socket
+import threading
+import time
+
+
+# How long to give one address before also trying the next, in seconds.
+# RFC 8305 recommends 250ms.
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+# How long resolved addresses are cached, in seconds. getaddrinfo doesn't
+# tell us the records' real TTLs, so this is a fixed, conservative guess.
+DEFAULT_DNS_TTL = 60.0
+
+# The errors connect() gives for a connection that's on its way.
+_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+class DNSCache(object):
+    """
+    A cache of ``getaddrinfo`` results, so that connecting to the same host
+    again doesn't wait on the resolver. Entries expire after ``ttl``
+    seconds, and may be dropped early with ``invalidate()`` if none of the
+    addresses work.
+
+    :param ttl: (optional) How long to keep results, in seconds.
+    """
+    def __init__(self, ttl=DEFAULT_DNS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def resolve(self, host, port):
+        """
+        Returns the ``getaddrinfo`` results for TCP connections to
+        ``host`` and ``port``.
+
+        :param host: The host name.
+        :param port: The port.
+        """
+        key = (host, port)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        addrs = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addrs)
+
+        return addrs
+
+    def invalidate(self, host, port):
+        """
+        Forgets the results for ``host`` and ``port``.
+
+        :param host: The host name.
+        :param port: The port.
+        """
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+# The cache connections share unless they're given their own.
+default_dns_cache = DNSCache()
+
+
+def interleave_families(addrs):
+    """
+    Reorders ``getaddrinfo`` results so that address families alternate,
+    starting with the family of the first result, as RFC 8305 recommends.
+    Within each family the resolver's order is kept.
+
+    :param addrs: A list of ``getaddrinfo`` results.
+    """
+    families = []
+    by_family = {}
+
+    for addr in addrs:
+        if addr[0] not in by_family:
+            families.append(addr[0])
+            by_family[addr[0]] = []
+
+        by_family[addr[0]].append(addr)
+
+    ordered = []
+    while any(by_family.values()):
+        for family in families:
+            if by_family[family]:
+                ordered.append(by_family[family].pop(0))
+
+    return ordered
+
+
+def create_connection(addrs, timeout=None, delay=CONNECTION_ATTEMPT_DELAY):
+    """
+    Connects to the first of ``addrs`` that answers, RFC 8305 style. The
+    addresses are tried in turn, each getting ``delay`` seconds to itself
+    before the next is tried alongside it, and the next is tried straight
+    away if one fails. The first connection made wins, and the rest are
+    abandoned. A dead address therefore only costs ``delay``, not a whole
+    connect timeout.
+
+    Returns the connected, blocking socket. Raises ``socket.timeout`` if
+    nothing connects within ``timeout`` seconds, or the last error if every
+    address fails.
+
+    :param addrs: A list of ``getaddrinfo`` results.
+    :param timeout: (optional) How long to try for, in seconds.
+    :param delay: (optional) How long to give each address to itself.
+    """
+    addrs = interleave_families(addrs)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = {}
+    error = None
+    next_attempt = time.monotonic()
+
+    try:
+        while addrs or pending:
+            now = time.monotonic()
+
+            if deadline is not None and now >= deadline:
+                raise socket.timeout("Timed out connecting.")
+
+            # Start the next attempt if it's due, or if nothing else is
+            # running.
+            if addrs and (now >= next_attempt or not pending):
+                family, type_, proto, _, address = addrs.pop(0)
+
+                # An address may not even get a socket, for example an IPv6
+                # one on a host without IPv6. Move on to the next.
+                try:
+                    sck = socket.socket(family, type_, proto)
+                except OSError as e:
+                    error = e
+                    continue
+
+                try:
+                    sck.setblocking(False)
+                    result = sck.connect_ex(address)
+                except OSError as e:
+                    error = e
+                    sck.close()
+                    continue
+
+                if result not in _IN_PROGRESS:
+                    error = OSError(result, "Could not connect to %r." %
+                                    (address,))
+                    sck.close()
+                    continue
+
+                pending[sck] = address
+                next_attempt = now + delay
+                continue
+
+            waits = []
+            if addrs:
+                waits.append(next_attempt - now)
+            if deadline is not None:
+                waits.append(deadline - now)
+            wait = max(min(waits), 0) if waits else None
+
+            _, writable, _ = select.select([], list(pending), [], wait)
+
+            for sck in writable:
+                result = sck.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+                if not result:
+                    del pending[sck]
+                    sck.setblocking(True)
+                    return sck
+
+                error = OSError(result, "Could not connect to %r." %
+                                (pending.pop(sck),))
+                sck.close()
+
+                # Don't wait to try the next address.
+                next_attempt = now
+    finally:
+        for sck in pending:
+            sck.close()
+
+    raise error or OSError("No addresses to connect to.")
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.pool
+~~~~~~~~~~~
+
+Pools of SPDY connections, shared between requests to the same origin.
+"""
+import collections
+import threading
+import time
+from urllib.parse import urlsplit
+from .connection import DEFAULT_PORT
+from .threaded import ThreadedSPDYConnection
+from .protocol import DEFAULT_PRIORITY, ConnectionTerminatedError
+from .stream import StreamResetError
+from .frame import SETTINGS_MAX_CONCURRENT_STREAMS, REFUSED_STREAM
+
+
+# The most streams we'll open on one connection, whatever the server allows.
+DEFAULT_MAX_STREAMS = 100
+
+# How long a connection with no open streams is kept, in seconds.
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+# The most times a request the server didn't process is made again.
+MAX_REPLAYS = 3
+
+# The methods whose requests may be replayed, because making them twice does
+# no more than making them once.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT',
+                                'DELETE'])
+
+
+class SPDYConnectionPool(object):
+    """
+    A pool of connections to a single origin. Because SPDY multiplexes
+    streams, a pool only needs one connection until that connection is
+    carrying as many streams as the server allows (or ``max_streams``, if
+    that's lower). Only then does it open another.
+
+    Connections the server has sent a GOAWAY on, or that have failed, take
+    no new streams, and are closed once their open streams are done.
+    Idempotent requests the server didn't process, because of a GOAWAY or
+    because it refused the stream, are made again on another connection.
+    Connections with no open streams for longer than ``idle_timeout`` are
+    closed too.
+
+    Requests may be made from many threads at once.
+
+    :param host: The host to connect to.
+    :param port: (optional) The port to connect to.
+    :param max_streams: (optional) The most streams to open on a single
+                        connection.
+    :param idle_timeout: (optional) How long to keep an idle connection, in
+                         seconds.
+    :param connection_class: (optional) The class of connection to pool.
+                             Defaults to ``ThreadedSPDYConnection``.
+    :param connection_kwargs: Any other arguments are passed to each new
+                              connection.
+    """
+    def __init__(self, host, port=DEFAULT_PORT,
+                 max_streams=DEFAULT_MAX_STREAMS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 connection_class=ThreadedSPDYConnection,
+                 **connection_kwargs):
+        self.host = host
+        self.port = port
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.connection_class = connection_class
+        self.connection_kwargs = connection_kwargs
+
+        self._lock = threading.Lock()
+        self._connections = []
+
+        # Streams promised to a connection that haven't been opened yet, and
+        # when each connection was last handed a stream.
+        self._reserved = collections.Counter()
+        self._last_used = {}
+
+    @property
+    def num_connections(self):
+        """
+        The number of connections in the pool.
+        """
+        return len(self._connections)
+
+    def request(self, method, path, body=None, headers={},
+                priority=DEFAULT_PRIORITY):
+        """
+        Sends a request on a pooled connection, and returns the response
+        once its headers have arrived. Takes the same arguments as
+        ``SPDYConnection.request()``.
+
+        If the server didn't process the request, it's made again on another
+        connection, as long as it's idempotent and its body, if any, is bytes
+        or a string that can be sent again.
+        """
+        replays = 0
+
+        while True:
+            conn = self._get_connection()
+
+            try:
+                stream_id = conn.request(method, path, body=body,
+                                         headers=headers, priority=priority)
+            except ConnectionTerminatedError:
+                # Nothing was sent, so any request may go elsewhere.
+                if replays >= MAX_REPLAYS:
+                    raise
+                replays += 1
+                continue
+            finally:
+                with self._lock:
+                    self._reserved[conn] -= 1
+
+            try:
+                return conn.getresponse(stream_id)
+            except StreamResetError as e:
+                if (e.status_code != REFUSED_STREAM or
+                        replays >= MAX_REPLAYS or
+                        not _replayable(method, body)):
+                    raise
+                replays += 1
+
+    def close(self):
+        """
+        Closes every connection in the pool.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._reserved.clear()
+            self._last_used.clear()
+
+        for conn in connections:
+            conn.close()
+
+    def _get_connection(self):
+        """
+        Returns a connection with room for another stream, opening a new one
+        if need be, and reserves a stream on it. The reservation must be
+        released once the stream is open.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            self._prune(now)
+
+            for conn in self._connections:
+                if (not _retired(conn) and
+                        self._load(conn) < self._capacity(conn)):
+                    break
+            else:
+                conn = self.connection_class(self.host, port=self.port,
+                                             **self.connection_kwargs)
+                self._connections.append(conn)
+
+            self._reserved[conn] += 1
+            self._last_used[conn] = now
+
+        return conn
+
+    def _prune(self, now):
+        """
+        Removes and closes the connections that are done with: retired ones
+        with no open streams, and ones that have been idle too long. Must be
+        called with the lock held.
+
+        :param now: The current time.
+        """
+        keep = []
+
+        for conn in self._connections:
+            idle = self._load(conn) == 0
+            expired = now - self._last_used.get(conn, now) > self.idle_timeout
+
+            if idle and (_retired(conn) or expired):
+                del self._reserved[conn]
+                self._last_used.pop(conn, None)
+                conn.close()
+            else:
+                keep.append(conn)
+
+        self._connections = keep
+
+    def _load(self, conn):
+        """
+        The number of streams open or about to be opened on a connection.
+
+        :param conn: The connection.
+        """
+        return conn.open_streams + self._reserved[conn]
+
+    def _capacity(self, conn):
+        """
+        The number of streams a connection may carry at once.
+
+        :param conn: The connection.
+        """
+        allowed = conn.remote_settings.get(SETTINGS_MAX_CONCURRENT_STREAMS,
+                                           self.max_streams)
+        return min(allowed, self.max_streams)
+
+
+class PoolManager(object):
+    """
+    Keeps a ``SPDYConnectionPool`` for each origin requests are made to, so
+    that requests may be made by URL.
+
+    :param pool_kwargs: Arguments passed to each new pool.
+    """
+    def __init__(self, **pool_kwargs):
+        self.pool_kwargs = pool_kwargs
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def connection_from_host(self, host, port=DEFAULT_PORT):
+        """
+        Returns the pool for the given origin, creating it if need be.
+
+        :param host: The host.
+        :param port: (optional) The port.
+        """
+        key = (host.lower(), port)
+
+        with self._lock:
+            pool = self._pools.get(key)
+
+            if pool is None:
+                pool = SPDYConnectionPool(host, port=port, **self.pool_kwargs)
+                self._pools[key] = pool
+
+        return pool
+
+    def request(self, method, url, body=None, headers={},
+                priority=DEFAULT_PRIORITY):
+        """
+        Sends a request to an ``https`` URL on a pooled connection, and
+        returns the response once its headers have arrived.
+
+        :param method: The request method, e.g. GET.
+        :param url: The URL.
+        :param body: (optional) The request body.
+        :param headers: (optional) A mapping of extra request headers.
+        :param priority: (optional) The priority of the request.
+        """
+        parts = urlsplit(url)
+
+        if parts.scheme != 'https':
+            raise ValueError("SPDY is only spoken over https, not %r." %
+                             parts.scheme)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        pool = self.connection_from_host(parts.hostname,
+                                         parts.port or DEFAULT_PORT)
+
+        return pool.request(method, path, body=body, headers=headers,
+                            priority=priority)
+
+    def clear(self):
+        """
+        Closes every pool.
+        """
+        with self._lock:
+            pools, self._pools = self._pools, {}
+
+        for pool in pools.values():
+            pool.close()
+
+
+def _replayable(method, body):
+    """
+    Whether a request may safely be made again.
+
+    :param method: The request method.
+    :param body: The request body.
+    """
+    if isinstance(method, bytes):
+        method = method.decode('latin-1')
+
+    return (method.upper() in IDEMPOTENT_METHODS and
+            (body is None or isinstance(body, (bytes, str))))
+
+
+def _retired(conn):
+    """
+    Whether a connection should be given no new streams, because the server
+    has told it to go away or it has failed.
+
+    :param conn: The connection.
+    """
+    return (conn.last_good_stream_id is not None or
+            getattr(conn, '_connection_error', None) is not None)
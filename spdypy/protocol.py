@@ -0,0 +1,797 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.protocol
+~~~~~~~~~~~~~~~
+
+The SPDY protocol state machine, free of any I/O.
+"""
+import collections
+import os
+import time
+import zlib
+from .stream import Stream, DEFAULT_CHUNK_SIZE
+from .frame import (FrameParser, SYNStreamFrame, RSTStreamFrame,
+                    DataFrame, SettingsFrame, PingFrame, GoAwayFrame,
+                    WindowUpdateFrame, Settings, UnknownFrame,
+                    SETTINGS_INITIAL_WINDOW_SIZE, INVALID_STREAM,
+                    REFUSED_STREAM, CANCEL, PROTOCOL_ERROR,
+                    FLOW_CONTROL_ERROR, FIN_BIT, UNIDIRECTIONAL_BIT)
+from .events import (ResponseReceived, PushReceived, DataReceived,
+                     StreamEnded, StreamReset, SettingsReceived,
+                     PingReceived, PingAcknowledged, ConnectionTerminated)
+from .flow import ReceiveWindow, DEFAULT_WINDOW_SIZE, DEFAULT_MAX_WINDOW_SIZE
+from .scheduler import PriorityScheduler
+from .push import PushCache, DEFAULT_PUSH_CACHE_SIZE
+from .health import RTTEstimator
+from .template import RequestTemplate
+from .data import SPDY_3_ZLIB_DICT
+
+
+# The default priority for requests: the lowest there is.
+DEFAULT_PRIORITY = 7
+
+# The most data we'll gather into one batch of writes. Keeping batches small
+# lets higher priority frames jump ahead of a big upload.
+MAX_BATCH_SIZE = 65536
+
+
+class ConnectionTerminatedError(ConnectionError):
+    """
+    Raised when a request is made on a connection the server has sent a
+    GOAWAY on. The request was never sent, so it's safe to make it again on
+    another connection.
+
+    :param last_good_stream_id: The last stream the server will process.
+    """
+    def __init__(self, last_good_stream_id):
+        super(ConnectionTerminatedError, self).__init__(
+            "The server has gone away: no new streams may be opened."
+        )
+        self.last_good_stream_id = last_good_stream_id
+
+
+class SPDYProtocol(object):
+    """
+    The state of a single SPDY connection, with no I/O of its own. Requests
+    are built up with ``putrequest()``, ``putheader()`` and ``endheaders()``,
+    data from the server goes in through ``receive_data()``, which returns
+    the events it caused, and data for the server comes out of
+    ``data_to_send()``. Everything else, from sockets to timeouts, is up to
+    the caller.
+
+    ``SPDYConnection`` and ``AsyncSPDYConnection`` are both built on this.
+
+    :param host: The host the connection is to.
+    :param chunk_size: (optional) The largest DATA frame to split request
+                       bodies into.
+    :param initial_window_size: (optional) The receive window each stream
+                                starts with. Advertised to the server in a
+                                SETTINGS frame if it isn't the default.
+    :param max_window_size: (optional) The largest a receive window may be
+                            tuned up to.
+    :param max_buffer_size: (optional) The most unread response data to
+                            buffer per stream before the server is made to
+                            wait.
+    :param push_cache_size: (optional) The most pushed responses to keep
+                            until they're requested. Zero refuses pushes.
+    """
+    def __init__(self, host, chunk_size=DEFAULT_CHUNK_SIZE,
+                 initial_window_size=DEFAULT_WINDOW_SIZE,
+                 max_window_size=DEFAULT_MAX_WINDOW_SIZE,
+                 max_buffer_size=None,
+                 push_cache_size=DEFAULT_PUSH_CACHE_SIZE):
+        self.host = host
+        self.chunk_size = chunk_size
+        self.max_buffer_size = max_buffer_size
+        self.initial_window_size = initial_window_size
+        self.max_window_size = max(initial_window_size, max_window_size)
+        self.streams = {}
+        self.last_stream_id = None
+        self._next_stream_id = 1
+        self._last_push_id = 0
+        self._compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+        self._decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        self._parser = FrameParser(self._decompressor)
+        self.requests_sent = 0
+
+        # Pushed streams no request has claimed yet.
+        self.push_cache = PushCache(push_cache_size)
+
+        # The round trip times our PINGs have measured, the PINGs the server
+        # hasn't answered yet with the times they were sent, and when we
+        # last heard from the server.
+        self.rtt = RTTEstimator()
+        self.outstanding_pings = {}
+        self.last_received = None
+        self._next_ping_id = 1
+
+        # The negotiated protocol, the settings the server has sent us, and
+        # the last stream it will process if it has told us to go away.
+        self.negotiated_protocol = None
+        self.remote_settings = {}
+        self.last_good_stream_id = None
+
+        # Connection-level frames waiting to be sent, the scheduler that
+        # picks which stream sends next, and the streams that sent in the
+        # last batch handed out.
+        self._control_frames = collections.deque()
+        self._scheduler = PriorityScheduler()
+        self._written = set()
+
+        # Events caused by the data being received.
+        self._events = []
+
+        # Flow control state. The connection-level windows only exist in
+        # SPDY/3.1, and are set up once we know that's what we're speaking.
+        self._remote_initial_window = DEFAULT_WINDOW_SIZE
+        self._send_window = None
+        self._receive_window = None
+
+        if initial_window_size != DEFAULT_WINDOW_SIZE:
+            settings = SettingsFrame()
+            settings.version = 3
+            settings.settings.append(Settings(SETTINGS_INITIAL_WINDOW_SIZE,
+                                              initial_window_size,
+                                              set()))
+            self._control_frames.append(settings)
+
+    def connection_established(self, negotiated_protocol):
+        """
+        Sets up the connection once the TLS handshake has told us which
+        protocol we're speaking.
+
+        :param negotiated_protocol: The negotiated protocol.
+        """
+        self.negotiated_protocol = negotiated_protocol
+        self.last_received = time.monotonic()
+
+        # SPDY/3.1 adds connection-level flow control. The connection's
+        # receive window starts at the protocol default, and can only be
+        # grown, so grow it to match the streams' if we need to.
+        if negotiated_protocol == 'spdy/3.1':
+            initial_size = max(self.initial_window_size, DEFAULT_WINDOW_SIZE)
+
+            self._send_window = DEFAULT_WINDOW_SIZE
+            self._receive_window = ReceiveWindow(
+                initial_size, max(initial_size, self.max_window_size)
+            )
+
+            if initial_size > DEFAULT_WINDOW_SIZE:
+                self._queue_window_update(0,
+                                          initial_size - DEFAULT_WINDOW_SIZE)
+
+    def request_template(self, headers={}):
+        """
+        Builds a ``RequestTemplate`` for this connection. The template holds
+        the headers that are identical on every request: the mandatory
+        ``:version``, ``:host`` and ``:scheme`` headers, plus any provided in
+        ``headers``.
+
+        :param headers: (Optional) A mapping of extra fixed headers.
+        """
+        fixed = {
+            b':version': b'HTTP/1.1',
+            b':host': self.host.encode('utf-8'),
+            b':scheme': b'https',
+        }
+
+        for header, argument in headers.items():
+            header = header if isinstance(header, bytes) else header.encode('utf-8')
+            argument = argument if isinstance(argument, bytes) else argument.encode('utf-8')
+            fixed[header] = argument
+
+        return RequestTemplate(fixed)
+
+    def putrequest(self, request, selector, template=None,
+                   priority=DEFAULT_PRIORITY):
+        """
+        Begins a new request, returning its stream ID. Nothing is sent until
+        ``endheaders()`` is called for it.
+
+        If the server has already pushed the response to a GET for
+        ``selector``, the pushed stream's ID is returned instead, and nothing
+        is sent at all: its headers and body are ignored.
+
+        Raises ``ConnectionTerminatedError`` once the server has sent a
+        GOAWAY, as it won't process new streams.
+
+        :param request: The request string, e.g. GET.
+        :param selector: The path selector, beginning with a '/'.
+        :param template: (Optional) A ``RequestTemplate`` from
+                         ``request_template``, providing the fixed headers.
+        :param priority: (Optional) The priority of the request, from 0 (the
+                         highest) to 7 (the lowest, and the default).
+        """
+        request = request if isinstance(request, bytes) else request.encode('utf-8')
+        selector = selector if isinstance(selector, bytes) else selector.encode('utf-8')
+
+        if request == b'GET':
+            pushed = self._claim_push(selector)
+            if pushed is not None:
+                self.last_stream_id = pushed.stream_id
+                return pushed.stream_id
+
+        if self.last_good_stream_id is not None:
+            raise ConnectionTerminatedError(self.last_good_stream_id)
+
+        stream_id = self._next_stream_id
+        stream = Stream(stream_id,
+                        version=3,
+                        compressor=self._compressor,
+                        decompressor=self._decompressor,
+                        chunk_size=self.chunk_size,
+                        send_window=self._remote_initial_window,
+                        receive_window=ReceiveWindow(self.initial_window_size,
+                                                     self.max_window_size),
+                        high_water=self.max_buffer_size)
+        stream.open_stream(priority, template=template)
+
+        # Give the stream the necessary headers. A template already carries
+        # the ones that never change.
+        stream.add_header(b':method', request)
+        stream.add_header(b':path', selector)
+
+        if template is None:
+            stream.add_header(b':version', b'HTTP/1.1')
+            stream.add_header(b':host', self.host.encode('utf-8'))
+            stream.add_header(b':scheme', b'https')
+
+        # Increase the next stream ID, keeping it odd.
+        self._next_stream_id += 2
+
+        self.streams[stream_id] = stream
+        self.last_stream_id = stream_id
+
+        return stream_id
+
+    def putheader(self, header, argument, stream_id=None):
+        """
+        Adds a header to a request that hasn't been sent yet.
+
+        :param header: The header key.
+        :param argument: The header value. May be a list of values.
+        :param stream_id: (Optional) The stream to add headers to. If not
+                          provided, the last-created stream is chosen.
+        """
+        header = header if isinstance(header, bytes) else header.encode('utf-8')
+        argument = argument if isinstance(argument, bytes) else argument.encode('utf-8')
+
+        stream_id = stream_id if stream_id else self.last_stream_id
+        stream = self.streams[stream_id]
+
+        if stream.associated_stream_id is None:
+            stream.add_header(header, argument)
+
+    def endheaders(self, message_body=None, stream_id=None):
+        """
+        Finishes the headers of a request, so that it may be sent, along with
+        its body if there is one.
+
+        :param message_body: (Optional) Body data to send. May be bytes, a
+                             string, a file-like object or an iterable of
+                             bytes.
+        :param stream_id: (Optional) The stream to end the headers of. If not
+                          provided, the last-created stream is chosen.
+        """
+        stream_id = stream_id if stream_id else self.last_stream_id
+        stream = self.streams[stream_id]
+
+        # Pushed responses need no request.
+        if stream.associated_stream_id is not None:
+            return
+
+        if message_body is not None:
+            if isinstance(message_body, str):
+                message_body = message_body.encode('iso-8859-1')
+
+            length = _body_length(message_body)
+            if length is not None:
+                stream.add_header(b'content-length',
+                                  str(length).encode('utf-8'))
+
+            if isinstance(message_body, (bytes, bytearray, memoryview)):
+                stream.prepare_data(message_body, last=True)
+            else:
+                stream.prepare_body(message_body)
+
+        stream.ready = True
+        self.requests_sent += 1
+        self._scheduler.schedule(stream)
+
+    def receive_data(self, data):
+        """
+        Handles data received from the server, returning a list of the events
+        it caused. Anything that handling it queues for the server is
+        returned from ``data_to_send()``.
+
+        :param data: The bytes received.
+        """
+        self.last_received = time.monotonic()
+
+        for frame in self._parser.receive(data):
+            self._handle_frame(frame)
+
+        events, self._events = self._events, []
+        return events
+
+    def data_to_send(self):
+        """
+        Returns the next batch of data to send to the server, as a list of
+        buffers to be written in order, or an empty list if there is nothing
+        to send. Connection-level frames go first, then the scheduler picks
+        stream frames in priority order, up to ``MAX_BATCH_SIZE``.
+
+        The buffers are only valid until the next call: request body buffers
+        are reused once a batch has been handed out.
+        """
+        # Streams that sent in the last batch may have more to send now.
+        for stream in self._written:
+            stream.batch_written()
+            self._scheduler.schedule(stream)
+
+        self._written = set()
+        buffers = []
+        size = 0
+
+        while self._control_frames:
+            frame = self._control_frames.popleft()
+            buffers.extend(frame.to_buffers(self._compressor))
+
+        while size < MAX_BATCH_SIZE:
+            stream, frame = self._scheduler.next_frame(self._send_window)
+
+            if frame is None:
+                break
+
+            if self._send_window is not None and isinstance(frame, DataFrame):
+                self._send_window -= len(frame.data)
+
+            frame_buffers = frame.to_buffers(self._compressor)
+            buffers.extend(frame_buffers)
+            size += sum(len(b) for b in frame_buffers)
+            self._written.add(stream)
+
+        return buffers
+
+    def ping(self):
+        """
+        Queues a PING for the server, returning its ID. When the server
+        answers, the round trip time is added to ``rtt``. Until then, the
+        PING is in ``outstanding_pings``.
+        """
+        ping_id = self._next_ping_id
+
+        # Our PING IDs are odd, and wrap around before they run out of bits.
+        self._next_ping_id = (self._next_ping_id + 2) & 0xFFFFFFFF
+
+        ping = PingFrame()
+        ping.version = 3
+        ping.ping_id = ping_id
+        self._control_frames.append(ping)
+        self.outstanding_pings[ping_id] = time.monotonic()
+
+        return ping_id
+
+    def stream_consumed(self, stream_id):
+        """
+        Called after response data is read from a stream, so that any
+        WINDOW_UPDATE that reading has made due is sent.
+
+        :param stream_id: The stream that was read from.
+        """
+        stream = self.streams.get(stream_id)
+
+        if stream is not None and stream.has_control_frames:
+            self._scheduler.schedule(stream)
+
+    def close_stream(self, stream_id, status_code=CANCEL):
+        """
+        Forgets about a stream whose response is finished with. If the server
+        hasn't finished sending, the stream is reset: by default, it's
+        cancelled.
+
+        :param stream_id: The stream to close.
+        :param status_code: (optional) The RST_STREAM status code to reset
+                            the stream with.
+        """
+        stream = self.streams.pop(stream_id, None)
+
+        if stream is not None and not stream.remote_closed:
+            stream.reset(status_code)
+            self._scheduler.schedule(stream)
+
+    def _handle_frame(self, frame):
+        """
+        Handles a single frame received from the server, by looking up its
+        handler by frame type.
+
+        :param frame: The received frame.
+        """
+        handler = self._frame_handlers.get(type(frame),
+                                           SPDYProtocol._process_stream_frame)
+        handler(self, frame)
+
+    def _process_stream_frame(self, frame):
+        """
+        Delivers a frame to the stream it belongs to. Frames for streams that
+        have been closed or reset may have been in flight when they were, so
+        they're ignored. Frames for streams that were never opened get a
+        RST_STREAM in reply, unless they're RST_STREAM frames themselves.
+
+        :param frame: The received frame.
+        """
+        stream = self.streams.get(frame.stream_id)
+
+        if stream is None:
+            if (not isinstance(frame, RSTStreamFrame) and
+                    not self._stream_was_opened(frame.stream_id)):
+                self._queue_rst_stream(frame.stream_id, INVALID_STREAM)
+            return
+
+        was_closed = stream.remote_closed
+        had_headers = bool(stream.response_headers)
+        stream.process_frame(frame)
+        self._scheduler.schedule(stream)
+
+        if was_closed:
+            return
+
+        # Pushed streams may get their response headers in a HEADERS frame.
+        if not had_headers and stream.response_headers:
+            self._events.append(ResponseReceived(stream.stream_id,
+                                                 stream.response_headers))
+        elif (isinstance(frame, DataFrame) and frame.data and
+                stream.reset_code is None):
+            self._events.append(DataReceived(stream.stream_id, frame.data))
+
+        self._stream_closed(stream)
+
+    def _stream_was_opened(self, stream_id):
+        """
+        Whether a stream was ever opened on this connection, by us or by the
+        server pushing it. Stream IDs only go up, so any ID at or below the
+        last one opened on its side was opened.
+
+        :param stream_id: The stream ID.
+        """
+        if stream_id % 2:
+            return stream_id < self._next_stream_id
+
+        return 0 < stream_id <= self._last_push_id
+
+    def _stream_closed(self, stream):
+        """
+        Records the event for a stream the server is done with, if it is.
+
+        :param stream: The stream.
+        """
+        if not stream.remote_closed:
+            return
+
+        if stream.reset_code is not None:
+            self._events.append(StreamReset(stream.stream_id,
+                                            stream.reset_code))
+        else:
+            self._events.append(StreamEnded(stream.stream_id))
+
+    def _process_syn_stream(self, frame):
+        """
+        Handles a SYN_STREAM frame, which is the server pushing a response
+        alongside one of our streams. The pushed stream is kept in the push
+        cache until a request claims it, evicting older pushes if the cache
+        is full.
+
+        Pushes must be unidirectional, even-numbered, and say what they were
+        pushed for, or they're refused with PROTOCOL_ERROR. Pushes for
+        another host, on a stream we're done with, or when the push cache is
+        disabled are refused with REFUSED_STREAM.
+
+        :param frame: The SYNStreamFrame.
+        """
+        key = _push_key(frame.headers)
+
+        if not frame.stream_id % 2:
+            self._last_push_id = max(self._last_push_id, frame.stream_id)
+
+        if (frame.stream_id % 2 or key is None or
+                not frame.flag_byte & UNIDIRECTIONAL_BIT):
+            self._queue_rst_stream(frame.stream_id, PROTOCOL_ERROR)
+            return
+
+        if (not self.push_cache.max_size or
+                frame.assoc_stream_id not in self.streams or
+                key[1] != self.host.encode('utf-8').lower()):
+            self._queue_rst_stream(frame.stream_id, REFUSED_STREAM)
+            return
+
+        stream = Stream(frame.stream_id,
+                        version=3,
+                        compressor=self._compressor,
+                        decompressor=self._decompressor,
+                        chunk_size=self.chunk_size,
+                        send_window=self._remote_initial_window,
+                        receive_window=ReceiveWindow(self.initial_window_size,
+                                                     self.max_window_size),
+                        high_water=self.max_buffer_size)
+        stream.associated_stream_id = frame.assoc_stream_id
+        stream.priority = frame.priority
+        stream.local_closed = True
+        stream.remote_closed = bool(frame.flag_byte & FIN_BIT)
+        stream.fin_received = stream.remote_closed
+
+        # The response headers may come now or in a later HEADERS frame.
+        if b':status' in frame.headers:
+            stream.response_headers.update(frame.headers)
+
+        self.streams[stream.stream_id] = stream
+
+        for evicted in self.push_cache.add(key, stream):
+            self.close_stream(evicted.stream_id)
+
+        self._events.append(PushReceived(stream.stream_id,
+                                         frame.assoc_stream_id,
+                                         frame.headers))
+
+        if stream.response_headers:
+            self._events.append(ResponseReceived(stream.stream_id,
+                                                 stream.response_headers))
+
+        self._stream_closed(stream)
+
+    def _process_data(self, frame):
+        """
+        Handles a DATA frame, accounting for it in the connection-level
+        window before delivering it to its stream.
+
+        :param frame: The DataFrame.
+        """
+        if (self._receive_window is not None and
+                not self._process_connection_data(frame)):
+            return
+
+        self._process_stream_frame(frame)
+
+    def _process_window_update(self, frame):
+        """
+        Handles a WINDOW_UPDATE frame, which is either for the whole
+        connection or for one stream.
+
+        :param frame: The WindowUpdateFrame.
+        """
+        if frame.stream_id:
+            self._process_stream_frame(frame)
+            return
+
+        # Before SPDY/3.1 there's no connection-level flow control to update.
+        if self._send_window is None:
+            return
+
+        self._send_window += frame.delta_window_size
+        self._schedule_all()
+
+    def _process_settings(self, frame):
+        """
+        Handles a SETTINGS frame. A new initial window size applies to every
+        open stream, as well as to new ones.
+
+        :param frame: The SettingsFrame.
+        """
+        received = {}
+
+        for setting in frame.settings:
+            self.remote_settings[setting.id] = setting.value
+            received[setting.id] = setting.value
+
+            if setting.id == SETTINGS_INITIAL_WINDOW_SIZE:
+                delta = setting.value - self._remote_initial_window
+                self._remote_initial_window = setting.value
+
+                for stream in self.streams.values():
+                    stream.send_window += delta
+
+        self._schedule_all()
+        self._events.append(SettingsReceived(received))
+
+    def _process_ping(self, frame):
+        """
+        Handles a PING frame. Server-initiated pings have even IDs, and are
+        echoed straight back. Odd IDs are answers to ours, and give us a
+        round trip time.
+
+        :param frame: The PingFrame.
+        """
+        if frame.ping_id % 2:
+            sent = self.outstanding_pings.pop(frame.ping_id, None)
+            rtt = None
+
+            if sent is not None:
+                rtt = time.monotonic() - sent
+                self.rtt.sample(rtt)
+
+            self._events.append(PingAcknowledged(frame.ping_id, rtt))
+            return
+
+        ping = PingFrame()
+        ping.version = 3
+        ping.ping_id = frame.ping_id
+        self._control_frames.append(ping)
+        self._events.append(PingReceived(frame.ping_id))
+
+    def _process_goaway(self, frame):
+        """
+        Handles a GOAWAY frame. The server won't process any stream above the
+        last good stream ID, so those streams are over: they're ended as
+        though the server had refused them, which tells the caller they may
+        safely be retried elsewhere. Streams up to the last good stream ID
+        carry on until they finish, but no new streams may be opened.
+
+        :param frame: The GoAwayFrame.
+        """
+        self.last_good_stream_id = frame.last_good_stream_id
+        self._events.append(ConnectionTerminated(frame.last_good_stream_id,
+                                                 frame.status_code))
+
+        # Only our own, odd-numbered, streams are covered by the GOAWAY.
+        for stream_id, stream in self.streams.items():
+            if (stream_id % 2 and stream_id > frame.last_good_stream_id and
+                    not stream.remote_closed):
+                stream.abandon(REFUSED_STREAM)
+                self._stream_closed(stream)
+
+    def _schedule_all(self):
+        """
+        Schedules every stream, for when something connection-wide may have
+        let blocked streams send again.
+        """
+        for stream in self.streams.values():
+            self._scheduler.schedule(stream)
+
+    def _ignore_frame(self, frame):
+        """
+        Drops a frame we have no use for, such as a control frame of a type
+        we don't know.
+
+        :param frame: The received frame.
+        """
+        return
+
+    # Map the frames we receive to the methods that handle them. Frames that
+    # aren't listed belong to a single stream.
+    _frame_handlers = {
+        SYNStreamFrame: _process_syn_stream,
+        DataFrame: _process_data,
+        WindowUpdateFrame: _process_window_update,
+        SettingsFrame: _process_settings,
+        PingFrame: _process_ping,
+        GoAwayFrame: _process_goaway,
+        UnknownFrame: _ignore_frame,
+    }
+
+    def _claim_push(self, selector):
+        """
+        Takes the stream pushed for a path on this host out of the push
+        cache, if there is one the server hasn't reset.
+
+        :param selector: The path selector, as bytes.
+        """
+        key = (b'https', self.host.encode('utf-8').lower(), selector)
+        stream = self.push_cache.pop(key)
+
+        if stream is None:
+            return None
+
+        if stream.reset_code is not None:
+            self.streams.pop(stream.stream_id, None)
+            return None
+
+        return stream
+
+    def _process_connection_data(self, frame):
+        """
+        Accounts for a DATA frame in the connection-level receive window,
+        queuing a WINDOW_UPDATE when one is due. Returns whether the frame
+        fitted in the window. If it didn't, the server has broken flow
+        control, and the connection is ended with a GOAWAY.
+
+        :param frame: The DataFrame.
+        """
+        length = len(frame.data)
+
+        try:
+            self._receive_window.consume(length)
+        except ValueError:
+            self._go_away(PROTOCOL_ERROR, FLOW_CONTROL_ERROR)
+            return False
+
+        self._receive_window.release(length)
+        self._queue_window_update(0, self._receive_window.update())
+        return True
+
+    def _go_away(self, status_code, reset_code):
+        """
+        Ends the connection from our side: queues a GOAWAY, and ends every
+        open stream as though the server had reset it. No new streams may be
+        opened.
+
+        :param status_code: The GOAWAY status code.
+        :param reset_code: The RST_STREAM status code the open streams end
+                           with.
+        """
+        frame = GoAwayFrame()
+        frame.version = 3
+        frame.last_good_stream_id = max(
+            [stream_id for stream_id in self.streams if not stream_id % 2],
+            default=0
+        )
+        frame.status_code = status_code
+        self._control_frames.append(frame)
+
+        if self.last_good_stream_id is None:
+            self.last_good_stream_id = 0
+
+        for stream in self.streams.values():
+            if not stream.remote_closed:
+                stream.abandon(reset_code)
+                self._stream_closed(stream)
+
+    def _queue_rst_stream(self, stream_id, status_code):
+        """
+        Queues a RST_STREAM for a stream we have no Stream object for.
+
+        :param stream_id: The stream to reset.
+        :param status_code: The RST_STREAM status code.
+        """
+        frame = RSTStreamFrame()
+        frame.version = 3
+        frame.stream_id = stream_id
+        frame.status_code = status_code
+        self._control_frames.append(frame)
+
+    def _queue_window_update(self, stream_id, delta):
+        """
+        Queues a WINDOW_UPDATE to go out ahead of any stream's frames, if
+        ``delta`` is nonzero.
+
+        :param stream_id: The stream the update is for. Zero means the whole
+                          connection.
+        :param delta: The amount to grow the window by.
+        """
+        if not delta:
+            return
+
+        frame = WindowUpdateFrame()
+        frame.version = 3
+        frame.stream_id = stream_id
+        frame.delta_window_size = delta
+        self._control_frames.append(frame)
+
+
+def _push_key(headers):
+    """
+    Returns the ``(scheme, host, path)`` a push was made for, or ``None`` if
+    it doesn't say.
+
+    :param headers: The headers of the pushed SYN_STREAM.
+    """
+    key = tuple(headers.get(name) for name in (b':scheme', b':host', b':path'))
+
+    if not all(isinstance(value, bytes) for value in key):
+        return None
+
+    return (key[0], key[1].lower(), key[2])
+
+
+def _body_length(body):
+    """
+    Work out the length of a request body, if that can be done without
+    reading it. Returns ``None`` for bodies of unknown length.
+
+    :param body: The request body.
+    """
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+
+    try:
+        return os.fstat(body.fileno()).st_size - body.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
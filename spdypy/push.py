@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.push
+~~~~~~~~~~~
+
+Keeping the responses a server pushes until they're asked for.
+"""
+import collections
+
+
+# The most pushed responses a connection keeps by default.
+DEFAULT_PUSH_CACHE_SIZE = 100
+
+
+class PushCache(object):
+    """
+    The streams a server has pushed and no request has claimed yet, by the
+    ``(scheme, host, path)`` they were pushed for. Once ``max_size`` pushes
+    are held, the least recently pushed are evicted, and must be closed by
+    whoever added them.
+
+    :param max_size: (optional) The most pushed streams to keep. Zero means
+                     pushes aren't kept at all.
+    """
+    def __init__(self, max_size=DEFAULT_PUSH_CACHE_SIZE):
+        self.max_size = max_size
+        self._streams = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._streams)
+
+    def add(self, key, stream):
+        """
+        Adds a pushed stream, returning a list of the streams evicted to make
+        room for it. A stream already pushed for the same key is evicted too.
+
+        :param key: The ``(scheme, host, path)`` the stream was pushed for.
+        :param stream: The pushed stream.
+        """
+        evicted = []
+
+        old = self._streams.pop(key, None)
+        if old is not None:
+            evicted.append(old)
+
+        self._streams[key] = stream
+
+        while len(self._streams) > self.max_size:
+            evicted.append(self._streams.popitem(last=False)[1])
+
+        return evicted
+
+    def pop(self, key):
+        """
+        Removes and returns the stream pushed for a key, or ``None``.
+
+        :param key: The ``(scheme, host, path)`` requested.
+        """
+        return self._streams.pop(key, None)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.response
+~~~~~~~~~~~~~~~
+
+The response objects returned by getresponse().
+"""
+import io
+from http.client import HTTPMessage
+from .frame import PROTOCOL_ERROR
+from .stream import StreamResetError
+
+
+class ResponseHeaders(object):
+    """
+    The parts of a response shared by the blocking and asyncio response
+    objects: the status line and the headers, parsed from the reply.
+
+    :param stream: The Stream the response arrives on.
+    :param connection: The connection the stream belongs to.
+    """
+    def __init__(self, stream, connection):
+        self._stream = stream
+        self._connection = connection
+        self.stream_id = stream.stream_id
+
+        headers = stream.response_headers
+
+        status = headers.get(b':status', b'').decode('latin-1')
+        code, _, reason = status.partition(' ')
+
+        # A reply must have a status, starting with a three digit code.
+        if not (len(code) == 3 and code.isascii() and code.isdigit()):
+            raise StreamResetError(self.stream_id, PROTOCOL_ERROR)
+
+        self.status = int(code)
+        self.reason = reason
+
+        version = headers.get(b':version', b'HTTP/1.1')
+        self.version = 10 if version == b'HTTP/1.0' else 11
+
+        self.headers = self.msg = HTTPMessage()
+
+        for name, value in headers.items():
+            # The special headers have already been dealt with.
+            if name.startswith(b':'):
+                continue
+
+            values = value if isinstance(value, list) else [value]
+            for value in values:
+                self.headers[name.decode('latin-1')] = value.decode('latin-1')
+
+    def getheader(self, name, default=None):
+        """
+        Returns the value of the header ``name``, or ``default`` if there is
+        no such header. Multiple values are joined with commas.
+
+        :param name: The header name.
+        :param default: (optional) The value to return if the header is
+                        missing.
+        """
+        values = self.headers.get_all(name)
+
+        if not values:
+            return default
+
+        return ', '.join(values)
+
+    def getheaders(self):
+        """
+        Returns a list of ``(header, value)`` tuples.
+        """
+        return list(self.headers.items())
+
+
+class SPDYResponse(ResponseHeaders, io.BufferedIOBase):
+    """
+    The response to a single SPDY request. This broadly matches the standard
+    library's ``http.client.HTTPResponse``: it has ``status``, ``reason``,
+    ``version`` and ``headers`` attributes, and is read like a file.
+
+    The body is never held in memory all at once unless ``read()`` is called
+    without a size. Iterating over the response yields the body in the chunks
+    it arrived in, one DATA frame at a time.
+
+    :param stream: The Stream the response arrives on.
+    :param connection: The SPDYConnection the stream belongs to.
+    """
+    def readable(self):
+        return True
+
+    def read(self, amt=None):
+        """
+        Reads and returns ``amt`` bytes of the response body, or fewer if the
+        body ends first. If ``amt`` is omitted, the whole of the rest of the
+        body is read.
+
+        :param amt: (optional) The most bytes to read.
+        """
+        if self.closed:
+            return b''
+
+        if amt is None or amt < 0:
+            return b''.join(bytes(chunk) for chunk in self)
+
+        buffer = bytearray(amt)
+        view = memoryview(buffer)
+        total = 0
+
+        # Each read only gets what's arrived, so keep reading until we have
+        # enough or the body ends.
+        while total < amt:
+            read = self.readinto(view[total:])
+            if not read:
+                break
+            total += read
+
+        view.release()
+        del buffer[total:]
+
+        return bytes(buffer)
+
+    def readinto(self, b):
+        """
+        Reads response body data into the writable buffer ``b``, returning the
+        number of bytes read. Returns zero at the end of the body.
+
+        :param b: The buffer to read into.
+        """
+        if self.closed:
+            return 0
+
+        self._wait_for_data()
+        read = self._connection._read_into(self._stream, b)
+
+        # Like HTTPResponse, close at the end of the body.
+        if not read and len(b):
+            self.close()
+
+        return read
+
+    def read1(self, amt=-1):
+        """
+        Reads up to ``amt`` bytes, waiting for more data at most once.
+
+        :param amt: (optional) The most bytes to read.
+        """
+        if self.closed:
+            return b''
+
+        if amt is None or amt < 0:
+            amt = max(self._stream.buffered, 1)
+
+        buffer = bytearray(amt)
+        read = self.readinto(buffer)
+        del buffer[read:]
+
+        return bytes(buffer)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Returns the next chunk of the response body, as it arrived in a DATA
+        frame.
+        """
+        if self.closed:
+            raise StopIteration
+
+        self._wait_for_data()
+        chunk = self._connection._next_chunk(self._stream)
+
+        if chunk is None:
+            self.close()
+            raise StopIteration
+
+        return chunk
+
+    def close(self):
+        """
+        Closes the response. If the body hasn't been entirely received, the
+        stream is cancelled.
+        """
+        if not self.closed:
+            self._connection._close_stream(self._stream)
+
+        super(SPDYResponse, self).close()
+
+    def __del__(self):
+        # The garbage collector may get here on any thread, at any time, even
+        # as the interpreter shuts down. So rather than closing the response,
+        # which may write a RST_STREAM, leave the stream for the connection to
+        # close the next time it sends.
+        if not self.closed:
+            self._connection._abandon_stream(self._stream)
+
+    def isclosed(self):
+        """
+        Whether the response has been closed.
+        """
+        return self.closed
+
+    def _wait_for_data(self):
+        """
+        Blocks until there is body data to read, or the body is over.
+        """
+        stream = self._stream
+        self._connection._receive_until(
+            lambda: stream.buffered or stream.remote_closed, stream.stream_id
+        )
+
+        if stream.reset_code is not None and not stream.buffered:
+            raise StreamResetError(stream.stream_id, stream.reset_code)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.scheduler
+~~~~~~~~~~~~~~~~
+
+Decides which stream gets to send next on a SPDY connection.
+"""
+import collections
+
+
+# SPDY/3 priorities run from 0 (highest) to 7 (lowest).
+PRIORITY_LEVELS = 8
+
+
+class PriorityScheduler(object):
+    """
+    Picks the next frame to send from the streams on a connection. Streams
+    with a higher priority (a lower priority number) always go first. Streams
+    that share a priority take turns, one frame at a time.
+
+    Streams are only kept in the scheduler while they have something to
+    send. A stream that comes up empty is dropped, and must be scheduled
+    again once it has more to send.
+    """
+    def __init__(self):
+        self._levels = [collections.deque() for _ in range(PRIORITY_LEVELS)]
+        self._scheduled = set()
+
+    def schedule(self, stream):
+        """
+        Adds a stream to the scheduler, if it isn't already there.
+
+        :param stream: The Stream to schedule.
+        """
+        if stream.stream_id in self._scheduled:
+            return
+
+        self._scheduled.add(stream.stream_id)
+        self._levels[stream.priority].append(stream)
+
+    def next_frame(self, max_data=None):
+        """
+        Returns a tuple of the next stream to send on and the frame it should
+        send, or ``(None, None)`` if no stream can send anything.
+
+        :param max_data: (optional) The most DATA the connection will allow us
+                         to send.
+        """
+        for level in self._levels:
+            for _ in range(len(level)):
+                stream = level.popleft()
+                frame = stream.next_frame(max_data)
+
+                if frame is None:
+                    self._scheduled.discard(stream.stream_id)
+                    continue
+
+                # Go to the back of the queue, so others at this priority get
+                # a turn.
+                level.append(stream)
+                return (stream, frame)
+
+        return (None, None)
+
+    def __len__(self):
+        """
+        The number of streams currently scheduled.
+        """
+        return len(self._scheduled)
@@ -6,8 +6,88 @@ spdypy.stream
 Abstractions for SPDY streams.
 """
 import collections
-from .frame import (SYNStreamFrame, SYNReplyFrame, RSTStreamFrame,
-                    DataFrame, HeadersFrame, WindowUpdateFrame, FLAG_FIN)
+from .frame import (HeaderMap, SYNStreamFrame, SYNReplyFrame, RSTStreamFrame,
+                    DataFrame, HeadersFrame, WindowUpdateFrame,
+                    FIN_BIT, FLOW_CONTROL_ERROR, STREAM_ALREADY_CLOSED)
+from .flow import ReceiveWindow, DEFAULT_WINDOW_SIZE, MAX_WINDOW_SIZE
+
+
+# The default size of the DATA frames we split request bodies into.
+DEFAULT_CHUNK_SIZE = 16384
+
+
+class StreamResetError(ConnectionResetError):
+    """
+    Raised when a stream is reset before its response could be read.
+
+    :param stream_id: The ID of the reset stream.
+    :param status_code: The RST_STREAM status code.
+    """
+    def __init__(self, stream_id, status_code):
+        super(StreamResetError, self).__init__(
+            "Stream %d was reset with status code %d." %
+            (stream_id, status_code)
+        )
+        self.stream_id = stream_id
+        self.status_code = status_code
+
+
+def iter_body_chunks(body, chunk_size):
+    """
+    Lazily splits a request body into chunks of at most ``chunk_size`` bytes.
+    The body may be a file-like object or an iterable of bytes (or strings,
+    which are encoded as ISO-8859-1).
+
+    Objects with ``readinto`` are read into a single reusable buffer, and
+    iterables are coalesced into that buffer, so memory use is constant no
+    matter how big the body is. This means each chunk yielded is only valid
+    until the next one is requested.
+
+    :param body: The request body.
+    :param chunk_size: The largest chunk to yield.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    if hasattr(body, 'readinto'):
+        while True:
+            read = body.readinto(buffer)
+            if not read:
+                return
+
+            yield view[:read]
+    elif hasattr(body, 'read'):
+        # Text files, mostly.
+        while True:
+            data = body.read(chunk_size)
+            if not data:
+                return
+
+            if isinstance(data, str):
+                data = data.encode('iso-8859-1')
+
+            yield data
+    else:
+        filled = 0
+
+        for piece in body:
+            if isinstance(piece, str):
+                piece = piece.encode('iso-8859-1')
+
+            piece = memoryview(piece)
+
+            while piece:
+                taken = min(len(piece), chunk_size - filled)
+                buffer[filled:filled + taken] = piece[:taken]
+                filled += taken
+                piece = piece[taken:]
+
+                if filled == chunk_size:
+                    yield view
+                    filled = 0
+
+        if filled:
+            yield view[:filled]
 
 
 class Stream(object):
@@ -26,15 +106,66 @@ class Stream(object):
                        connection.
     :param decompressor: A reference to the zlib decompression object for this
                          connection.
+    :param chunk_size: (optional) The largest DATA frame body to send.
+    :param send_window: (optional) The initial size of the window the remote
+                        peer has given us to send DATA in.
+    :param receive_window: (optional) A ``ReceiveWindow`` tracking the data
+                           the remote peer may send us on this stream.
+    :param high_water: (optional) The most received data to buffer before
+                       WINDOW_UPDATEs are withheld, so that the remote peer
+                       stops sending. By default, only the receive window
+                       limits the buffer.
     """
-    def __init__(self, stream_id, version, compressor, decompressor):
+    def __init__(self, stream_id, version, compressor, decompressor,
+                 chunk_size=DEFAULT_CHUNK_SIZE,
+                 send_window=DEFAULT_WINDOW_SIZE, receive_window=None,
+                 high_water=None):
         self.stream_id = stream_id
         self.version = version
+        self.chunk_size = chunk_size
         self._queued_frames = collections.deque()
         self._compressor = compressor
         self._decompressor = decompressor
 
-    def open_stream(self, priority, associated_stream=None):
+        # Frames that must go out ahead of anything else queued, and
+        # regardless of flow control.
+        self._control_frames = collections.deque()
+
+        # A lazy source of body chunks, for bodies we don't hold in memory.
+        # Its buffer is reused, so only one chunk may be in flight at a time.
+        self._body = None
+        self._chunk_in_flight = False
+
+        # Flow control state.
+        self.send_window = send_window
+        self.receive_window = (receive_window if receive_window is not None
+                               else ReceiveWindow())
+
+        # The state of the response: its headers, the data received and not
+        # yet read, and whether either side has finished with the stream.
+        self.response_headers = HeaderMap()
+        self._received = collections.deque()
+        self.buffered = 0
+        self.high_water = high_water
+        self.local_closed = False
+        self.remote_closed = False
+        self.reset_code = None
+
+        # Whether the remote peer ended the stream with FLAG_FIN, rather than
+        # either side resetting it.
+        self.fin_received = False
+
+        # Whether the headers for this stream are complete, and so whether its
+        # queued frames may be sent.
+        self.ready = False
+
+        # The priority of this stream, from 0 (highest) to 7 (lowest).
+        self.priority = 7
+
+        # For streams the server pushed, the stream they were pushed on.
+        self.associated_stream_id = None
+
+    def open_stream(self, priority, associated_stream=None, template=None):
         """
         Builds the frames necessary to open a SPDY stream. Stores them in the
         queued frames object.
@@ -43,17 +174,24 @@ class Stream(object):
                          highest priority, 7 the lowest.
         :param associated_stream: (optional) The stream this stream is
                                   associated to.
+        :param template: (optional) A ``RequestTemplate`` providing the fixed
+                         headers for this stream.
         """
+        if not 0 <= priority <= 7:
+            raise ValueError("Priority must be between 0 and 7.")
+
         assoc_id = associated_stream.stream_id if associated_stream else None
+        self.priority = priority
 
         syn = SYNStreamFrame()
         syn.version = self.version
         syn.stream_id = self.stream_id
         syn.assoc_stream_id = assoc_id
         syn.priority = priority
+        syn.template = template
 
         # Assume this will be the last frame unless we find out otherwise.
-        syn.flags.add(FLAG_FIN)
+        syn.flag_byte |= FIN_BIT
 
         self._queued_frames.append(syn)
 
@@ -71,38 +209,148 @@ class Stream(object):
 
     def prepare_data(self, data, last=False):
         """
-        Prepares some data in a data frame.
+        Prepares some data in data frames. Data longer than the chunk size is
+        split across several frames, without being copied.
 
         :param data: The data to send.
         :param last: (Optional) Whether this is the last data frame.
         """
-        frame = DataFrame()
-        frame.stream_id = self.stream_id
-
         # Remove any FLAG_FIN earlier in the queue.
         for queued_frame in self._queued_frames:
-            queued_frame.flags.discard(FLAG_FIN)
+            queued_frame.flag_byte &= ~FIN_BIT
+
+        if len(data) > self.chunk_size:
+            view = memoryview(data)
+            chunks = [view[i:i + self.chunk_size]
+                      for i in range(0, len(view), self.chunk_size)]
+        else:
+            chunks = [data]
+
+        for chunk in chunks:
+            frame = DataFrame()
+            frame.stream_id = self.stream_id
+            frame.data = chunk
+            self._queued_frames.append(frame)
 
         if last:
-            frame.flags.add(FLAG_FIN)
+            frame.flag_byte |= FIN_BIT
+
+    def prepare_body(self, body):
+        """
+        Prepares a request body that is sent lazily, one DATA frame at a time,
+        rather than being held in memory. This is the last data on the
+        stream.
 
-        frame.data = data
+        :param body: A file-like object, or an iterable of bytes.
+        """
+        for queued_frame in self._queued_frames:
+            queued_frame.flag_byte &= ~FIN_BIT
 
-        self._queued_frames.append(frame)
+        self._body = iter_body_chunks(body, self.chunk_size)
 
-    def send_outstanding(self, connection):
+    def next_frame(self, max_data=None):
         """
-        Sends any outstanding frames on a given connection.
+        Returns the next frame that may be sent right now, or ``None`` if
+        there isn't one. Control frames may always be sent. Everything else
+        waits until the stream's headers are complete, and DATA frames are
+        limited by the stream's send window and by ``max_data``, splitting
+        them if needed.
 
-        :param connection: The connection to send the frames on.
+        At most one frame from a lazy body is returned until
+        ``batch_written`` is called, because its buffer is reused for the
+        next chunk.
+
+        :param max_data: (optional) The most DATA the connection will allow us
+                         to send.
         """
-        frame = self._next_frame()
+        frame = self._next_sendable_frame(max_data)
+
+        if frame is not None and frame.flag_byte & FIN_BIT:
+            self.local_closed = True
+
+        return frame
 
-        while frame is not None:
-            data = frame.to_bytes(self._compressor)
-            connection.send(data)
+    def batch_written(self):
+        """
+        Called once the frames returned from ``next_frame`` have been written,
+        so that the lazy body buffer may be refilled.
+        """
+        self._chunk_in_flight = False
 
-            frame = self._next_frame()
+    def reset(self, status_code):
+        """
+        Abandons the stream, discarding anything waiting to be sent, and
+        queues a RST_STREAM frame with the given status code.
+
+        :param status_code: The RST_STREAM status code.
+        """
+        self.reset_code = status_code
+        self._queued_frames.clear()
+        self._body = None
+        self.local_closed = True
+        self.remote_closed = True
+
+        frame = RSTStreamFrame()
+        frame.version = self.version
+        frame.stream_id = self.stream_id
+        frame.status_code = status_code
+        self._control_frames.append(frame)
+
+    def read_into(self, buffer):
+        """
+        Copies as much buffered response data as fits into ``buffer``,
+        returning the number of bytes copied.
+
+        :param buffer: A writable buffer, such as a ``bytearray``.
+        """
+        view = memoryview(buffer).cast('B')
+        copied = 0
+
+        while self._received and copied < len(view):
+            chunk = self._received[0]
+            taken = min(len(chunk), len(view) - copied)
+            view[copied:copied + taken] = chunk[:taken]
+            copied += taken
+
+            if taken == len(chunk):
+                self._received.popleft()
+            else:
+                self._received[0] = memoryview(chunk)[taken:]
+
+        self._data_consumed(copied)
+        return copied
+
+    def next_chunk(self):
+        """
+        Returns the next chunk of buffered response data, as it arrived in a
+        DATA frame, or ``None`` if nothing is buffered.
+        """
+        if not self._received:
+            return None
+
+        chunk = self._received.popleft()
+        self._data_consumed(len(chunk))
+        return chunk
+
+    @property
+    def has_control_frames(self):
+        """
+        Whether this stream has frames that should be sent straight away.
+        """
+        return bool(self._control_frames)
+
+    def abandon(self, status_code):
+        """
+        Ends the stream without sending anything, as though the server had
+        reset it with the given status code.
+
+        :param status_code: The RST_STREAM status code.
+        """
+        self.reset_code = status_code
+        self._queued_frames.clear()
+        self._body = None
+        self.local_closed = True
+        self.remote_closed = True
 
     def process_frame(self, frame):
         """
@@ -113,19 +361,143 @@ class Stream(object):
 
         :param frame: The Frame subclass to handle.
         """
-        if isinstance(frame, SYNReplyFrame):
-            self._process_reply_frame(frame)
-        elif isinstance(frame, RSTStreamFrame):
-            self._process_rst_frame(frame)
-        elif isinstance(frame, HeadersFrame):
-            self._process_headers_frame(frame)
-        elif isinstance(frame, WindowUpdateFrame):
-            self._process_window_update(frame)
-        elif isinstance(frame, DataFrame):
-            self._handle_data(frame)
-        else:
+        try:
+            handler = self._frame_handlers[type(frame)]
+        except KeyError:
             raise ValueError("Unexpected frame kind.")
 
+        handler(self, frame)
+
+    @property
+    def closed(self):
+        """
+        Whether both sides have finished with this stream.
+        """
+        return self.local_closed and self.remote_closed
+
+    def _process_reply_frame(self, frame):
+        """
+        Handles a SYN_REPLY frame, which carries the response headers.
+
+        :param frame: The SYNReplyFrame.
+        """
+        # Take the frame's headers as they are, rather than copying them, so
+        # that they're only decoded as they're used.
+        if self.response_headers:
+            self.response_headers.update(frame.headers)
+        else:
+            self.response_headers = frame.headers
+
+        if frame.flag_byte & FIN_BIT:
+            self.remote_closed = True
+            self.fin_received = True
+
+    def _process_rst_frame(self, frame):
+        """
+        Handles a RST_STREAM frame. The stream is over: nothing more will be
+        sent or received on it.
+
+        :param frame: The RSTStreamFrame.
+        """
+        self.abandon(frame.status_code)
+
+    def _process_headers_frame(self, frame):
+        """
+        Handles a HEADERS frame, which adds to the response headers.
+
+        :param frame: The HeadersFrame.
+        """
+        self.response_headers.update(frame.headers)
+
+        if frame.flag_byte & FIN_BIT:
+            self.remote_closed = True
+            self.fin_received = True
+
+    def _process_window_update(self, frame):
+        """
+        Handles a WINDOW_UPDATE frame, growing our send window.
+
+        :param frame: The WindowUpdateFrame.
+        """
+        self.send_window += frame.delta_window_size
+
+        if self.send_window > MAX_WINDOW_SIZE:
+            self.reset(FLOW_CONTROL_ERROR)
+
+    def _handle_data(self, frame):
+        """
+        Handles a DATA frame, accounting for it in our receive window and
+        buffering it until it's read.
+
+        DATA after the remote peer's FLAG_FIN resets the stream. DATA on a
+        stream that was reset, by either side, may have been in flight when
+        it was, so it's dropped.
+
+        :param frame: The DataFrame.
+        """
+        length = len(frame.data)
+
+        if self.remote_closed:
+            if self.fin_received and self.reset_code is None:
+                self.reset(STREAM_ALREADY_CLOSED)
+                return
+
+            try:
+                self.receive_window.consume(length)
+            except ValueError:
+                return
+
+            self.receive_window.release(length)
+            return
+
+        try:
+            self.receive_window.consume(length)
+        except ValueError:
+            self.reset(FLOW_CONTROL_ERROR)
+            return
+
+        if length:
+            self._received.append(frame.data)
+            self.buffered += length
+
+        if frame.flag_byte & FIN_BIT:
+            self.remote_closed = True
+            self.fin_received = True
+
+    def _data_consumed(self, length):
+        """
+        Releases data that has been read back into the receive window,
+        queuing a WINDOW_UPDATE when one is due. While more than the
+        high-water mark is still buffered, updates are withheld.
+
+        :param length: The number of bytes read.
+        """
+        self.buffered -= length
+        self.receive_window.release(length)
+
+        if self.remote_closed:
+            return
+
+        if self.high_water is not None and self.buffered > self.high_water:
+            return
+
+        delta = self.receive_window.update()
+        if delta:
+            update = WindowUpdateFrame()
+            update.version = self.version
+            update.stream_id = self.stream_id
+            update.delta_window_size = delta
+            self._control_frames.append(update)
+
+    # Map the frames we handle to the methods that handle them.
+    _frame_handlers = {
+        SYNReplyFrame: _process_reply_frame,
+        RSTStreamFrame: _process_rst_frame,
+        HeadersFrame: _process_headers_frame,
+        WindowUpdateFrame: _process_window_update,
+        DataFrame: _handle_data,
+    }
+
     def _next_frame(self):
         """
         Utility method for returning the next frame from the frame queue.
@@ -134,3 +506,73 @@ class Stream(object):
             return self._queued_frames.popleft()
         except IndexError:
             return None
+
+    def _next_sendable_frame(self, max_data):
+        """
+        Utility method that does the work of ``next_frame``.
+        """
+        if self._control_frames:
+            return self._control_frames.popleft()
+
+        if not self.ready:
+            return None
+
+        if not self._queued_frames:
+            if self._body is None or self._chunk_in_flight:
+                return None
+
+            self._queued_frames.append(self._next_body_frame())
+            self._chunk_in_flight = True
+
+        frame = self._queued_frames[0]
+
+        if not isinstance(frame, DataFrame):
+            return self._queued_frames.popleft()
+
+        allowed = self.send_window
+        if max_data is not None:
+            allowed = min(allowed, max_data)
+
+        length = len(frame.data)
+
+        # Empty frames use no window, so they can go even if it's negative.
+        if length <= max(allowed, 0):
+            self.send_window -= length
+            return self._queued_frames.popleft()
+
+        if allowed <= 0:
+            return None
+
+        # Send as much of the frame as we may, leaving the rest (and any
+        # FLAG_FIN) queued.
+        view = memoryview(frame.data)
+        head = DataFrame()
+        head.stream_id = self.stream_id
+        head.data = view[:allowed]
+        frame.data = view[allowed:]
+        self.send_window -= allowed
+
+        return head
+
+    def _next_body_frame(self):
+        """
+        Utility method for building the next DATA frame from the lazy body, if
+        there is one. When the body runs out, an empty frame carrying
+        FLAG_FIN ends the stream.
+        """
+        if self._body is None:
+            return None
+
+        frame = DataFrame()
+        frame.stream_id = self.stream_id
+
+        chunk = next(self._body, None)
+
+        if chunk is None:
+            self._body = None
+            frame.data = b''
+            frame.flag_byte |= FIN_BIT
+        else:
+            frame.data = chunk
+
+        return frame
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.template
+~~~~~~~~~~~~~~~
+
+Request templates, for cheaply sending many requests that share most of their
+headers.
+"""
+import struct
+import time
+from .frame import HeaderMap, serialize_nv_block, compress_nv_block
+
+
+class RequestTemplate(object):
+    """
+    A fixed set of request headers that are sent, unchanged, on many requests.
+    The fixed headers are serialized into their NV block form once, when the
+    template is created. Each request using the template only serializes its
+    varying headers (for example, ``:path``) and patches them onto the end of
+    the cached block.
+
+    The template also keeps statistics about the header blocks it has built,
+    so that the cost of header encoding can be monitored.
+
+    :param headers: A mapping of the fixed header names to their values.
+    """
+    def __init__(self, headers):
+        self.headers = HeaderMap(headers)
+
+        # Cache the serialized name/value pairs, without the leading count.
+        self._fixed = bytes(serialize_nv_block(self.headers)[4:])
+
+        #: The number of header blocks built from this template.
+        self.requests = 0
+
+        #: The total number of compressed header block bytes produced.
+        self.header_bytes = 0
+
+        #: The total time spent compressing header blocks, in seconds.
+        self.compression_time = 0.0
+
+    def serialize(self, headers):
+        """
+        Serialize the uncompressed NV block for a request that uses this
+        template.
+
+        :param headers: The varying headers for this request. If any of these
+                        are also fixed headers, the varying value wins.
+        """
+        if any(name in self.headers for name in headers):
+            # The cached block can't be patched, so fall back to building the
+            # whole thing.
+            merged = HeaderMap(self.headers)
+            merged.update(headers)
+            return serialize_nv_block(merged)
+
+        varying = serialize_nv_block(headers)
+        count = len(self.headers) + len(headers)
+
+        return b''.join((struct.pack("!L", count),
+                         self._fixed,
+                         memoryview(varying)[4:]))
+
+    def build_nv_block(self, compressor, headers):
+        """
+        Build the compressed NV block for a request that uses this template,
+        recording statistics as we go.
+
+        :param compressor: The zlib compressor object for the connection.
+        :param headers: The varying headers for this request.
+        """
+        data = self.serialize(headers)
+
+        start = time.perf_counter()
+        block = compress_nv_block(compressor, data)
+        self.compression_time += time.perf_counter() - start
+
+        self.requests += 1
+        self.header_bytes += len(block)
+
+        return block
+
+    @property
+    def bytes_per_request(self):
+        """
+        The mean size of the compressed header blocks built from this
+        template.
+        """
+        if not self.requests:
+            return 0.0
+
+        return self.header_bytes / self.requests
+
+    @property
+    def compression_time_per_request(self):
+        """
+        The mean time spent compressing each header block, in seconds.
+        """
+        if not self.requests:
+            return 0.0
+
+        return self.compression_time / self.requests
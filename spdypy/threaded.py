@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.threaded
+~~~~~~~~~~~~~~~
+
+A SPDY connection that many threads can share.
+"""
+import select
+import socket
+import ssl
+import threading
+import time
+from .connection import SPDYConnection
+from .protocol import DEFAULT_PRIORITY
+from .events import ConnectionTerminated
+from .frame import CANCEL
+
+
+# The exceptions a non-blocking socket raises when it can't go on right now.
+_WOULD_BLOCK = (ssl.SSLWantReadError, ssl.SSLWantWriteError,
+                BlockingIOError)
+
+
+class ThreadedSPDYConnection(SPDYConnection):
+    """
+    A SPDY connection that any number of threads may make requests on at
+    once. A background thread reads from the socket and hands each stream's
+    frames to it, so each caller only waits on its own stream.
+
+    Three locks keep this safe. The protocol state, including the zlib
+    contexts, is only touched with ``_lock`` held. Only the thread holding
+    ``_write_lock`` serializes and writes frames, so headers are compressed
+    in the order they go on the wire. And the socket itself is non-blocking,
+    used with ``_socket_lock`` held, so that reads and writes never use the
+    TLS connection at the same time.
+
+    If ``ping_interval`` is set, the reader thread pings the server whenever
+    the connection has been quiet that long, and fails the connection if the
+    server doesn't answer within ``ping_timeout``. Dead connections are
+    found while they sit idle, rather than by the next request on them.
+
+    The interface matches ``SPDYConnection``. Threads should always pass the
+    stream ID they got from ``putrequest()`` or ``request()`` to the other
+    methods, as the default of the last-created stream is whichever thread's
+    request was made last.
+
+    Takes the same arguments as ``SPDYConnection``.
+    """
+    def __init__(self, host, **kwargs):
+        super(ThreadedSPDYConnection, self).__init__(host, **kwargs)
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._socket_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._reader = None
+        self._connection_error = None
+
+        # Set whenever there may be something to send, so that the thread
+        # holding the write lock knows to check again before it lets go.
+        self._send_pending = False
+
+        # Conditions that threads waiting on a stream wait for, by stream ID.
+        self._waiters = {}
+
+    def putrequest(self, request, selector, template=None,
+                   priority=DEFAULT_PRIORITY, **kwargs):
+        """
+        Begins a request, as ``SPDYConnection.putrequest()`` does, returning
+        its stream ID.
+
+        :param request: The request string, e.g. GET.
+        :param selector: The path selector, beginning with a '/'.
+        :param template: (Optional) A ``RequestTemplate`` providing the fixed
+                         headers.
+        :param priority: (Optional) The priority of the request, from 0 (the
+                         highest) to 7 (the lowest, and the default).
+        """
+        self._connect()
+
+        if self._fallback is not None:
+            return self._fallback.putrequest(request, selector,
+                                             template=template)
+
+        with self._lock:
+            return self._core.putrequest(request, selector,
+                                         template=template,
+                                         priority=priority)
+
+    def putheader(self, header, argument, stream_id=None):
+        """
+        Adds a header to a request that hasn't been sent yet.
+
+        :param header: The header key.
+        :param argument: The header value. May be a list of values.
+        :param stream_id: (Optional) The stream to add headers to.
+        """
+        if self._fallback is not None:
+            return self._fallback.putheader(header, argument,
+                                            stream_id=stream_id)
+
+        with self._lock:
+            self._core.putheader(header, argument, stream_id=stream_id)
+
+    def endheaders(self, message_body=None, stream_id=None):
+        """
+        Finishes the headers of a request and sends it, along with its body
+        if there is one.
+
+        :param message_body: (Optional) Body data to send.
+        :param stream_id: (Optional) The stream to end the headers of.
+        """
+        if self._fallback is not None:
+            return self._fallback.endheaders(message_body=message_body,
+                                             stream_id=stream_id)
+
+        with self._lock:
+            self._core.endheaders(message_body=message_body,
+                                  stream_id=stream_id)
+
+        self._send_outstanding()
+
+    def close(self):
+        """
+        Closes the connection, and waits for the reader thread to finish.
+        """
+        sck = self._sck
+
+        if self._fallback is not None:
+            self._fallback.close()
+            return
+
+        if sck is None:
+            return
+
+        with self._socket_lock:
+            self._save_session()
+
+        try:
+            sck.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        if self._reader is not None:
+            self._reader.join()
+
+        sck.close()
+
+    def _send_outstanding(self):
+        """
+        Writes everything the protocol has to send. If another thread is
+        already writing, this returns straight away and leaves it to that
+        thread, which checks for more to send before it stops.
+        """
+        self._close_abandoned()
+        self._send_pending = True
+
+        while self._send_pending:
+            if not self._write_lock.acquire(blocking=False):
+                return
+
+            try:
+                self._send_pending = False
+
+                while True:
+                    with self._lock:
+                        buffers = self._core.data_to_send()
+
+                    if not buffers:
+                        break
+
+                    self._write(buffers)
+            finally:
+                self._write_lock.release()
+
+    def _write(self, buffers):
+        """
+        Writes a list of buffers to the non-blocking socket, waiting for it
+        to be writable when it's full.
+
+        :param buffers: The list of buffers to write, in order.
+        """
+        data = memoryview(b''.join(buffers))
+
+        while data:
+            with self._socket_lock:
+                try:
+                    sent = self._sck.send(data)
+                except _WOULD_BLOCK:
+                    sent = 0
+
+            if not sent:
+                _, writable, _ = select.select([], [self._sck], [],
+                                               self.timeout)
+                if not writable:
+                    raise socket.timeout("Timed out writing to the server.")
+                continue
+
+            self.write_calls += 1
+            data = data[sent:]
+
+    def _receive_until(self, condition, stream_id=None, timeout=None):
+        """
+        Waits until ``condition`` returns true, checking it each time the
+        reader thread handles a frame for the given stream. Raises
+        ``socket.timeout`` if nothing arrives for the stream for longer than
+        the timeout.
+
+        :param condition: A callable taking no arguments.
+        :param stream_id: (optional) The stream whose frames might satisfy
+                          ``condition``.
+        :param timeout: (optional) The timeout, if not the connection's.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+
+        with self._lock:
+            waiter = self._waiters.get(stream_id)
+            if waiter is None:
+                waiter = threading.Condition(self._lock)
+                self._waiters[stream_id] = waiter
+
+            while not condition():
+                if self._connection_error is not None:
+                    raise self._connection_error
+
+                if not waiter.wait(timeout):
+                    raise socket.timeout("Timed out waiting for the server.")
+
+    def _read_into(self, stream, buffer):
+        """
+        Reads buffered response data from a stream into ``buffer``, returning
+        the number of bytes read.
+
+        :param stream: The stream to read from.
+        :param buffer: A writable buffer.
+        """
+        with self._lock:
+            read = stream.read_into(buffer)
+            self._core.stream_consumed(stream.stream_id)
+
+        self._send_outstanding()
+        return read
+
+    def _next_chunk(self, stream):
+        """
+        Returns the next chunk of buffered response data from a stream, or
+        ``None``.
+
+        :param stream: The stream to read from.
+        """
+        with self._lock:
+            chunk = stream.next_chunk()
+            self._core.stream_consumed(stream.stream_id)
+
+        self._send_outstanding()
+        return chunk
+
+    def _close_stream(self, stream, status_code=CANCEL):
+        """
+        Forgets about a stream whose response is finished with, resetting it
+        (by default, cancelling it) if the server hasn't finished sending.
+
+        :param stream: The stream to close.
+        :param status_code: (optional) The RST_STREAM status code.
+        """
+        with self._lock:
+            self._core.close_stream(stream.stream_id, status_code)
+            self._waiters.pop(stream.stream_id, None)
+
+        self._send_outstanding()
+
+    def _close_abandoned(self):
+        """
+        Closes the streams whose responses were garbage collected, and forgets
+        their waiters.
+        """
+        if not self._abandoned:
+            return []
+
+        with self._lock:
+            closed = super(ThreadedSPDYConnection, self)._close_abandoned()
+
+            for stream_id in closed:
+                self._waiters.pop(stream_id, None)
+
+        return closed
+
+    def _check_alive(self):
+        """
+        The reader thread keeps an eye on the connection instead, so that a
+        request never waits on a ping.
+        """
+
+    def _connect(self):
+        """
+        Opens the connection if it isn't open already, and starts the reader
+        thread.
+        """
+        with self._connect_lock:
+            if self._connection_error is not None:
+                raise self._connection_error
+
+            if self._reader is not None or self._fallback is not None:
+                return
+
+            super(ThreadedSPDYConnection, self)._connect()
+
+            # HTTP/1.1 needs no reader thread.
+            if self._fallback is not None:
+                return
+
+            self._sck.setblocking(False)
+
+            self._reader = threading.Thread(target=self._read_forever,
+                                            name='spdypy-reader-%s' % self.host)
+            self._reader.daemon = True
+            self._reader.start()
+
+    def _read_forever(self):
+        """
+        The reader thread. Reads from the socket until the connection closes,
+        handing the data to the protocol and waking the threads waiting on
+        the streams it was for.
+        """
+        try:
+            while True:
+                with self._socket_lock:
+                    try:
+                        data = self._sck.recv(65535)
+                    except _WOULD_BLOCK:
+                        data = None
+
+                if data is None:
+                    select.select([self._sck], [], [], self._keepalive())
+                    continue
+
+                if not data:
+                    raise ConnectionResetError(
+                        "The server closed the connection."
+                    )
+
+                self._data_received(data)
+        except Exception as e:
+            # Whatever went wrong, including a frame we couldn't parse, the
+            # connection is no use now, and its waiters must hear of it.
+            with self._lock:
+                self._connection_error = e
+
+                for waiter in self._waiters.values():
+                    waiter.notify_all()
+
+    def _keepalive(self):
+        """
+        Called by the reader thread whenever it has nothing to read. Pings
+        the server if it has been quiet for ``ping_interval``, and raises
+        ``ConnectionError`` if a ping has gone unanswered for
+        ``ping_timeout``. Returns how long the reader may wait for data
+        before it must call this again, or ``None`` to wait forever.
+        """
+        if self.ping_interval is None:
+            return None
+
+        now = time.monotonic()
+
+        with self._lock:
+            pings = self._core.outstanding_pings
+
+            if pings:
+                waited = now - min(pings.values())
+
+                if waited >= self.ping_timeout:
+                    raise ConnectionError(
+                        "The server stopped answering pings."
+                    )
+
+                return self.ping_timeout - waited
+
+            last = self._core.last_received
+            quiet = now - last if last is not None else self.ping_interval
+            if quiet < self.ping_interval:
+                return self.ping_interval - quiet
+
+            self._core.ping()
+
+        self._send_outstanding()
+        return self.ping_timeout
+
+    def _data_received(self, data):
+        """
+        Hands data from the server to the protocol, and wakes the threads
+        waiting on the streams it was for.
+
+        :param data: The bytes received.
+        """
+        with self._lock:
+            for event in self._core.receive_data(data):
+                # A GOAWAY can end any number of streams.
+                if isinstance(event, ConnectionTerminated):
+                    waiters = list(self._waiters.values())
+                else:
+                    waiters = [self._waiters.get(event.stream_id)]
+
+                for waiter in waiters:
+                    if waiter is not None:
+                        waiter.notify_all()
+
+        self._send_outstanding()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+spdypy.tls
+~~~~~~~~~~
+
+Sharing TLS contexts and sessions between connections.
+"""
+import collections
+import ssl
+import threading
+
+
+# The protocols we offer the server, in order of preference.
+DEFAULT_PROTOCOLS = ('spdy/3.1', 'spdy/3', 'http/1.1')
+
+# The protocols a SPDYProtocol can speak.
+SPDY_PROTOCOLS = ('spdy/3.1', 'spdy/3')
+
+# The most sessions a SessionCache keeps before dropping the oldest.
+DEFAULT_MAX_SESSIONS = 1000
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+def get_context(ca_certs=None, protocols=DEFAULT_PROTOCOLS):
+    """
+    Returns an ``SSLContext`` for the given TLS configuration. Contexts are
+    built once and shared by every connection with the same configuration,
+    as loading the CA certificates is expensive, and as sessions can only be
+    resumed with the context that created them.
+
+    Shared contexts must not be changed.
+
+    :param ca_certs: (optional) The path to a file of CA certificates to
+                     trust. By default, the system's are used.
+    :param protocols: (optional) The protocols to offer the server.
+    """
+    key = (ca_certs, tuple(protocols))
+
+    with _contexts_lock:
+        context = _contexts.get(key)
+
+        if context is None:
+            context = _create_context(ca_certs, protocols)
+            _contexts[key] = context
+
+    return context
+
+
+def _create_context(ca_certs, protocols):
+    """
+    Builds a new ``SSLContext``.
+
+    :param ca_certs: The path to a file of CA certificates, or ``None``.
+    :param protocols: The protocols to offer the server.
+    """
+    # The default context verifies the server's certificate and host name,
+    # against the system's CA certificates unless we're given our own.
+    context = ssl.create_default_context(cafile=ca_certs)
+
+    # ALPN is what servers use now. NPN is only offered where OpenSSL still
+    # has it, for servers old enough to speak SPDY but not ALPN.
+    context.set_alpn_protocols(list(protocols))
+    if ssl.HAS_NPN:
+        context.set_npn_protocols(list(protocols))
+
+    return context
+
+
+def negotiated_protocol(ssl_object):
+    """
+    Returns the protocol the server chose during the handshake, by ALPN or
+    failing that NPN, or ``None`` if it didn't choose one.
+
+    :param ssl_object: The ``SSLSocket`` or ``SSLObject``.
+    """
+    protocol = ssl_object.selected_alpn_protocol()
+
+    if protocol is None and ssl.HAS_NPN:
+        protocol = ssl_object.selected_npn_protocol()
+
+    return protocol
+
+
+class SessionCache(object):
+    """
+    Keeps the last TLS session made with each origin, so that new connections
+    to it can resume the session with an abbreviated handshake. Sessions are
+    stored by context as well as by origin, since a session can only be
+    resumed by the context that created it. Once ``max_size`` sessions are
+    stored, the least recently used is dropped.
+
+    :param max_size: (optional) The most sessions to keep.
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SESSIONS):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._sessions = collections.OrderedDict()
+
+    def get(self, context, host, port):
+        """
+        Returns the stored session for an origin, or ``None``.
+
+        :param context: The ``SSLContext`` the connection will use.
+        :param host: The host name.
+        :param port: The port.
+        """
+        key = (context, host, port)
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+
+        return session
+
+    def store(self, context, host, port, session):
+        """
+        Stores the session for an origin, replacing any there was. Sessions
+        that can't be resumed are ignored.
+
+        :param context: The ``SSLContext`` the session was made with.
+        :param host: The host name.
+        :param port: The port.
+        :param session: The ``SSLSession``, or ``None``.
+        """
+        if session is None or not session.has_ticket and not session.id:
+            return
+
+        key = (context, host, port)
+
+        with self._lock:
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def invalidate(self, context, host, port):
+        """
+        Forgets the session for an origin.
+
+        :param context: The ``SSLContext`` the session was made with.
+        :param host: The host name.
+        :param port: The port.
+        """
+        with self._lock:
+            self._sessions.pop((context, host, port), None)
+
+
+# The cache connections share unless they're given their own.
+default_session_cache = SessionCache()
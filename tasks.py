@@ -4,3 +4,26 @@ from invoke import task, run
 @task
 def test():
     run('py.test --cov-report term-missing --cov spdypy test/', pty=True)
+
+@task
+def bench(name='codec', output=None):
+    # Runs one of the benchmarks, by default the frame codec's. Its results
+    # are JSON, so that runs on different commits can be compared.
+    command = 'python -m benchmarks.%s' % name
+    if output:
+        command += ' --output %s' % output
+
+    run(command, pty=True)
+
+@task
+def build():
+    # Builds the optional compiled frame codec in place. spdypy works without
+    # it, falling back to the pure-Python codec.
+    from setuptools import Distribution, Extension
+
+    extension = Extension('spdypy._speedups', ['spdypy/_speedups.c'])
+    dist = Distribution({'name': 'spdypy', 'ext_modules': [extension]})
+
+    command = dist.get_command_obj('build_ext')
+    command.inplace = True
+    dist.run_command('build_ext')
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_aio
+~~~~~~~~~~~~~
+
+Tests for the AsyncSPDYConnection object.
+"""
+import asyncio
+import zlib
+from spdypy.aio import AsyncSPDYConnection, AsyncSPDYResponse
+from spdypy.frame import *
+from spdypy.stream import StreamResetError
+from spdypy.data import SPDY_3_ZLIB_DICT
+from pytest import raises
+
+
+class MockTransport(object):
+    """
+    Stands in for an asyncio transport, keeping everything written to it.
+    """
+    def __init__(self):
+        self.buffer = b''
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+    def close(self):
+        self.closed = True
+
+
+class TestAsyncSPDYConnection(object):
+    def setup_method(self, method):
+        self.conn = AsyncSPDYConnection('www.google.com')
+        self.transport = MockTransport()
+        self.conn.connection_made(self.transport)
+        self.compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+
+    def run(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def frames_for(self, stream_id, body=None, status=b'200 OK'):
+        reply = SYNReplyFrame()
+        reply.version = 3
+        reply.stream_id = stream_id
+        reply.headers = {b':status': status}
+
+        data = DataFrame()
+        data.stream_id = stream_id
+        data.data = body or b''
+        data.flags.add(FLAG_FIN)
+
+        return reply.to_bytes(self.compressor) + data.to_bytes()
+
+    def sent_frames(self):
+        decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        return FrameParser(decompressor).receive(self.transport.buffer)
+
+    def test_request_writes_to_the_transport(self):
+        async def go():
+            return await self.conn.request(b'GET', b'/')
+
+        stream_id = self.run(go())
+        frames = self.sent_frames()
+
+        assert len(frames) == 1
+        assert isinstance(frames[0], SYNStreamFrame)
+        assert frames[0].stream_id == stream_id
+        assert frames[0].headers[b':path'] == b'/'
+
+    def test_getresponse_waits_for_the_reply(self):
+        async def go():
+            stream_id = await self.conn.request(b'GET', b'/')
+            loop = asyncio.get_event_loop()
+            loop.call_soon(self.conn.data_received,
+                           self.frames_for(stream_id, b'hello'))
+
+            resp = await self.conn.getresponse()
+            return resp, await resp.read()
+
+        resp, body = self.run(go())
+
+        assert isinstance(resp, AsyncSPDYResponse)
+        assert resp.status == 200
+        assert resp.reason == 'OK'
+        assert body == b'hello'
+        assert resp.isclosed()
+
+    def test_many_concurrent_streams(self):
+        async def fetch(path):
+            stream_id = await self.conn.request(b'GET', path)
+            resp = await self.conn.getresponse(stream_id)
+            return await resp.read()
+
+        async def go():
+            tasks = [asyncio.ensure_future(fetch(('/%d' % i).encode('ascii')))
+                     for i in range(100)]
+            await asyncio.sleep(0)
+
+            # Reply in the opposite order, all in one read.
+            stream_ids = sorted(self.conn._streams, reverse=True)
+            self.conn.data_received(b''.join(
+                self.frames_for(s, str(s).encode('ascii')) for s in stream_ids
+            ))
+
+            return await asyncio.gather(*tasks)
+
+        bodies = self.run(go())
+
+        assert bodies == [str(2 * i + 1).encode('ascii') for i in range(100)]
+
+    def test_iterating_yields_data_frames(self):
+        async def go():
+            stream_id = await self.conn.request(b'GET', b'/')
+            reply = SYNReplyFrame()
+            reply.version = 3
+            reply.stream_id = stream_id
+            reply.headers = {b':status': b'200 OK'}
+            self.conn.data_received(reply.to_bytes(self.compressor))
+
+            resp = await self.conn.getresponse()
+            loop = asyncio.get_event_loop()
+
+            for chunk, fin in ((b'one', False), (b'two', True)):
+                data = DataFrame()
+                data.stream_id = stream_id
+                data.data = chunk
+                if fin:
+                    data.flags.add(FLAG_FIN)
+                loop.call_soon(self.conn.data_received, data.to_bytes())
+
+            return [bytes(chunk) async for chunk in resp]
+
+        assert self.run(go()) == [b'one', b'two']
+
+    def test_read_waits_for_all_it_asked_for(self):
+        async def go():
+            stream_id = await self.conn.request(b'GET', b'/')
+            reply = SYNReplyFrame()
+            reply.version = 3
+            reply.stream_id = stream_id
+            reply.headers = {b':status': b'200 OK'}
+            self.conn.data_received(reply.to_bytes(self.compressor))
+
+            resp = await self.conn.getresponse()
+
+            async def send_body():
+                # One DATA frame at a time, each after the reader has woken.
+                for chunk, fin in ((b'hel', False), (b'lo w', False),
+                                   (b'orld', True)):
+                    await asyncio.sleep(0)
+                    data = DataFrame()
+                    data.stream_id = stream_id
+                    data.data = chunk
+                    if fin:
+                        data.flags.add(FLAG_FIN)
+                    self.conn.data_received(data.to_bytes())
+
+            sender = asyncio.ensure_future(send_body())
+            body = await resp.read(8), await resp.read(8)
+            await sender
+
+            return body
+
+        assert self.run(go()) == (b'hello wo', b'rld')
+
+    def test_resets_raise(self):
+        async def go():
+            stream_id = await self.conn.request(b'GET', b'/')
+            rst = RSTStreamFrame()
+            rst.version = 3
+            rst.stream_id = stream_id
+            rst.status_code = REFUSED_STREAM
+            asyncio.get_event_loop().call_soon(self.conn.data_received,
+                                               rst.to_bytes())
+
+            await self.conn.getresponse()
+
+        with raises(StreamResetError):
+            self.run(go())
+
+    def test_losing_the_connection_wakes_waiters(self):
+        async def go():
+            await self.conn.request(b'GET', b'/')
+            asyncio.get_event_loop().call_soon(self.conn.connection_lost, None)
+
+            await self.conn.getresponse()
+
+        with raises(ConnectionResetError):
+            self.run(go())
+
+        with raises(ConnectionResetError):
+            self.conn.putrequest(b'GET', b'/')
+
+    def test_timeout_raises(self):
+        self.conn.timeout = 0.01
+
+        async def go():
+            await self.conn.request(b'GET', b'/')
+            await self.conn.getresponse()
+
+        with raises(asyncio.TimeoutError):
+            self.run(go())
+
+    def test_paused_transports_get_nothing(self):
+        self.conn.pause_writing()
+        stream_id = self.conn.putrequest(b'GET', b'/')
+        self.conn.endheaders(message_body=b'x' * 100, stream_id=stream_id)
+
+        assert self.transport.buffer == b''
+
+        self.conn.resume_writing()
+        frames = self.sent_frames()
+
+        assert isinstance(frames[0], SYNStreamFrame)
+        assert frames[1].data == b'x' * 100
+
+    def test_putrequest_needs_a_connection(self):
+        conn = AsyncSPDYConnection('www.google.com')
+
+        with raises(RuntimeError):
+            conn.putrequest(b'GET', b'/')
+
+    def test_servers_that_refuse_spdy_fail(self):
+        class SSLObject(object):
+            def selected_alpn_protocol(self):
+                return 'http/1.1'
+
+        transport = MockTransport()
+        transport.get_extra_info = lambda name, default=None: SSLObject()
+
+        conn = AsyncSPDYConnection('www.google.com')
+        conn.connection_made(transport)
+
+        assert transport.closed
+        with raises(ConnectionError):
+            conn.putrequest(b'GET', b'/')
+
+    def test_ping_measures_the_round_trip(self):
+        pong = PingFrame()
+        pong.version = 3
+        pong.ping_id = 1
+
+        async def go():
+            loop = asyncio.get_event_loop()
+            loop.call_soon(self.conn.data_received, pong.to_bytes())
+            return await self.conn.ping()
+
+        rtt = self.run(go())
+
+        assert isinstance(self.sent_frames()[0], PingFrame)
+        assert rtt == self.conn.rtt.latest
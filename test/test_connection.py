@@ -5,10 +5,24 @@ test/test_connection
 
 Tests for the SPDYConnection object.
 """
+import collections
+import io
+import socket
+import ssl
+import struct
+import tempfile
+import zlib
 import spdypy
 import spdypy.connection
+from spdypy.frame import *
+from spdypy.flow import ReceiveWindow
+from spdypy.data import SPDY_3_ZLIB_DICT
+from pytest import raises
 from .test_stream import MockConnection
-from unittest.mock import MagicMock
+from spdypy.net import DNSCache
+from spdypy.tls import SessionCache
+from spdypy.http11 import HTTP11Connection
+from unittest.mock import MagicMock, patch
 
 
 class TestSPDYConnection(object):
@@ -89,7 +103,7 @@ class TestSPDYConnectionState(object):
             b':version': b'HTTP/1.1',
             b':host': b'www.google.com',
             b':scheme': b'https',
-            b'Key': b'Value',
+            b'key': b'Value',
         }
 
         stream = conn._streams[stream_id]
@@ -110,7 +124,7 @@ class TestSPDYConnectionState(object):
             b':version': b'HTTP/1.1',
             b':host': b'www.google.com',
             b':scheme': b'https',
-            b'Key': b'Value',
+            b'key': b'Value',
         }
 
         first_stream = conn._streams[stream_id]
@@ -133,7 +147,7 @@ class TestSPDYConnectionState(object):
             b':version': b'HTTP/1.1',
             b':host': b'www.google.com',
             b':scheme': b'https',
-            b'Key': b'Value',
+            b'key': b'Value',
         }
 
         first_stream = conn._streams[stream_id]
@@ -154,7 +168,7 @@ class TestSPDYConnectionState(object):
             b':version': b'HTTP/1.1',
             b':host': b'www.google.com',
             b':scheme': b'https',
-            b'Key': b'Value',
+            b'key': b'Value',
         }
 
         stream = conn._streams[stream_id]
@@ -177,9 +191,156 @@ class TestSPDYConnectionState(object):
         conn.putrequest(b'GET', b'/')
         conn.endheaders(message_body=b'TestTestTest')
 
-        assert mock.called == 2
+        # The SYN_STREAM and DATA frames go out in a single write.
+        assert mock.called == 1
         assert mock.buffer.endswith(b'TestTestTest')
 
+    def test_endheaders_can_stream_file_bodies(self):
+        conn = spdypy.SPDYConnection('www.google.com', chunk_size=4)
+        mock = MockConnection()
+        conn._sck = mock
+        conn.putrequest(b'POST', b'/')
+        conn.endheaders(message_body=io.BytesIO(b'TestTestTe'))
+
+        # The SYN_STREAM and first chunk, two more chunks, then the FIN.
+        assert mock.called == 4
+        assert mock.buffer.endswith(
+            b'Te\x00\x00\x00\x01\x01\x00\x00\x00'
+        )
+
+    def test_real_files_get_a_content_length(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        conn._sck = MockConnection()
+        stream_id = conn.putrequest(b'POST', b'/')
+        stream = conn._streams[stream_id]
+
+        with tempfile.TemporaryFile() as body:
+            body.write(b'TestTestTest')
+            body.seek(4)
+            conn._send_outstanding = lambda: None
+            conn.endheaders(message_body=body)
+
+        assert stream._queued_frames[0].headers[b'content-length'] == b'8'
+
+    def test_request_sends_everything(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        mock = MockConnection()
+        conn._sck = mock
+        stream_id = conn.request('POST', '/', body='TestTestTest',
+                                 headers={'Key': 'Value'})
+
+        assert stream_id == 1
+        assert mock.called == 1
+        assert mock.buffer.endswith(b'TestTestTest')
+
+    def test_endheaders_only_sends_streams_with_complete_headers(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        mock = MockConnection()
+        conn._sck = mock
+        stream_id = conn.putrequest(b'GET', b'/')
+        stream_id2 = conn.putrequest(b'POST', b'/post')
+
+        conn.endheaders(stream_id=stream_id2)
+        assert len(conn._streams[stream_id]._queued_frames) == 1
+
+        conn.endheaders(stream_id=stream_id)
+        assert len(conn._streams[stream_id]._queued_frames) == 0
+        assert mock.called == 2
+
+    def test_high_priority_requests_overtake_blocked_uploads(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        mock = MockConnection()
+        conn._sck = mock
+
+        settings = SettingsFrame()
+        settings.settings.append(Settings(SETTINGS_INITIAL_WINDOW_SIZE,
+                                          4, set()))
+        conn._core._handle_frame(settings)
+
+        bulk = conn.request(b'POST', b'/bulk', body=b'TestTestTest')
+        urgent = conn.request(b'GET', b'/api', priority=0)
+        mock.buffer = b''
+
+        # Once the bulk upload can carry on, the urgent request's frames
+        # have already gone.
+        assert conn._streams[urgent]._queued_frames == collections.deque()
+
+        update = WindowUpdateFrame()
+        update.stream_id = bulk
+        update.delta_window_size = 100
+        conn._core._handle_frame(update)
+        conn._send_outstanding()
+
+        assert mock.buffer == (b'\x00\x00\x00\x01\x01\x00\x00\x08'
+                               b'TestTest')
+
+    def test_priority_orders_frames_in_a_batch(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        mock = MockConnection()
+        conn._sck = mock
+        low = conn.putrequest(b'POST', b'/bulk')
+        conn.putrequest(b'GET', b'/api', priority=0)
+
+        # Hold the low priority stream back until both are ready.
+        conn._streams[low].prepare_data(b'TestTestTest', last=True)
+        conn._streams[low].ready = True
+        conn._core._scheduler.schedule(conn._streams[low])
+        conn.endheaders()
+
+        # Walk the frames on the wire, pulling out their stream IDs.
+        stream_ids = []
+        data = mock.buffer
+        while data:
+            length = struct.unpack('!L', data[4:8])[0] & 0xFFFFFF
+            offset = 8 if data[0] & 0x80 else 0
+            stream_id = struct.unpack('!L', data[offset:offset + 4])[0]
+            stream_ids.append(stream_id)
+            data = data[8 + length:]
+
+        assert stream_ids == [3, 1, 1]
+
+    def test_putrequest_rejects_bad_priorities(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        conn._sck = MockConnection()
+
+        with raises(ValueError):
+            conn.putrequest(b'GET', b'/', priority=8)
+
+    def test_syscalls_per_request(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        conn._sck = MockConnection()
+
+        assert conn.syscalls_per_request == 0.0
+
+        conn.putrequest(b'GET', b'/')
+        conn.endheaders()
+        conn.putrequest(b'GET', b'/')
+        conn.endheaders()
+
+        assert conn.requests_sent == 2
+        assert conn.write_calls == 2
+        assert conn.syscalls_per_request == 1.0
+
+    def test_plain_sockets_handle_partial_vectored_writes(self):
+        class TrickleSocket(socket.socket):
+            def sendmsg(self, buffers):
+                data = b''.join(bytes(b) for b in buffers)[:3]
+                self.written += data
+                return len(data)
+
+        sck = TrickleSocket()
+        sck.written = b''
+
+        try:
+            conn = spdypy.SPDYConnection('www.google.com')
+            conn._sck = sck
+            conn._write([b'abcd', b'', b'ef', b'ghijklm'])
+
+            assert sck.written == b'abcdefghijklm'
+            assert conn.write_calls == 5
+        finally:
+            sck.close()
+
     def test_endheaders_can_specify_a_stream(self):
         conn = spdypy.SPDYConnection('www.google.com')
         mock = MockConnection()
@@ -192,47 +353,421 @@ class TestSPDYConnectionState(object):
         assert mock.called == 1
         assert len(conn._streams[stream_id]._queued_frames) == 0
 
-    def test_connect(self):
-        # We need to stub out a ton of stuff.
-        import socket
+    def test_settings_change_stream_send_windows(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        conn._sck = MockConnection()
+        stream_id = conn.putrequest(b'GET', b'/')
+
+        settings = SettingsFrame()
+        settings.settings.append(Settings(SETTINGS_INITIAL_WINDOW_SIZE,
+                                          1000, set()))
+        conn._core._handle_frame(settings)
+
+        assert conn._streams[stream_id].send_window == 1000
+        assert conn.remote_settings[SETTINGS_INITIAL_WINDOW_SIZE] == 1000
+
+        stream_id = conn.putrequest(b'GET', b'/')
+        assert conn._streams[stream_id].send_window == 1000
 
-        # We need a mock socket to give the procedure.
-        mock_sock = MagicMock()
+    def test_custom_window_sizes_are_advertised(self):
+        conn = spdypy.SPDYConnection('www.google.com',
+                                     initial_window_size=1 << 20)
+        mock = MockConnection()
+        conn._sck = mock
+        stream_id = conn.putrequest(b'GET', b'/')
+        conn.endheaders()
 
-        # getaddrinfo needs to return some controlled data.
-        old_addrinfo = socket.getaddrinfo
-        socket.getaddrinfo = MagicMock(
-            return_value=(('', '', '', '', ('127.0.0.1', 443)),)
+        assert mock.called == 1
+        assert mock.buffer.startswith(
+            b'\x80\x03\x00\x04\x00\x00\x00\x0c\x00\x00\x00\x01'
+            b'\x00\x00\x00\x07\x00\x10\x00\x00'
         )
+        assert conn._streams[stream_id].receive_window.size == 1 << 20
 
-        # The socket constructor should always return our mock.
-        old_socket = socket.socket
-        socket.socket = MagicMock(return_value=mock_sock)
+    def test_connection_window_limits_data(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        mock = MockConnection()
+        conn._sck = mock
+        conn._core._send_window = 4
+        conn.putrequest(b'POST', b'/')
+        conn.endheaders(message_body=b'TestTestTest')
 
+        assert mock.buffer.endswith(b'\x00\x00\x00\x04Test')
+        assert conn._core._send_window == 0
+
+        update = WindowUpdateFrame()
+        update.stream_id = 0
+        update.delta_window_size = 100
+        conn._core._handle_frame(update)
+        conn._send_outstanding()
+
+        assert mock.buffer.endswith(b'\x01\x00\x00\x08TestTest')
+        assert conn._core._send_window == 92
+
+    def test_connection_window_updates_are_sent(self):
         conn = spdypy.SPDYConnection('www.google.com')
+        mock = MockConnection()
+        conn._sck = mock
+        conn._core._receive_window = ReceiveWindow()
+
+        data = DataFrame()
+        data.stream_id = 1
+        data.data = b'x' * 32768
+        conn._core._handle_frame(data)
+        conn._send_outstanding()
+
+        # The connection window update, then a reset for the unknown stream.
+        assert mock.buffer == (b'\x80\x03\x00\x09\x00\x00\x00\x08'
+                               b'\x00\x00\x00\x00\x00\x00\x80\x00'
+                               b'\x80\x03\x00\x03\x00\x00\x00\x08'
+                               b'\x00\x00\x00\x01\x00\x00\x00\x02')
+
+    def test_connect(self):
+        addrs = [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                  ('127.0.0.1', 443))]
+        raw_sock = MagicMock()
+        wrapped_sock = MagicMock()
+
+        conn = spdypy.SPDYConnection('www.google.com', connect_timeout=5,
+                                     dns_cache=DNSCache(),
+                                     session_cache=SessionCache())
 
         # The SSLContext should be fake too.
         conn._context = MagicMock()
-        conn._context.wrap_socket = MagicMock(return_value=mock_sock)
-
-        # Ok, call the method.
-        conn._connect()
+        conn._context.wrap_socket = MagicMock(return_value=wrapped_sock)
 
-        # We should have called getaddrinfo.
-        socket.getaddrinfo.assert_called_once_with('www.google.com', 443)
+        with patch('socket.getaddrinfo', return_value=addrs) as getaddrinfo, \
+                patch('spdypy.connection.create_connection',
+                      return_value=raw_sock) as create:
+            conn._connect()
 
-        # We should have gotten one socket.
-        socket.socket.assert_called_once_with()
+        # We should have looked up the host, and raced its addresses.
+        getaddrinfo.assert_called_once_with('www.google.com', 443,
+                                            type=socket.SOCK_STREAM)
+        create.assert_called_once_with(addrs, timeout=5)
 
-        # We should have wrapped the socket.
+        # The handshake should be bounded by the connect timeout too.
+        raw_sock.settimeout.assert_any_call(5)
         conn._context.wrap_socket.assert_called_once_with(
-            mock_sock,
-            server_hostname='www.google.com'
+            raw_sock,
+            server_hostname='www.google.com',
+            session=None
         )
+        assert conn._sck is wrapped_sock
+
+    def test_connections_resume_tls_sessions(self):
+        cache = SessionCache()
+        context = MagicMock()
+
+        with patch('socket.getaddrinfo'), \
+                patch('spdypy.connection.create_connection'):
+            first = spdypy.SPDYConnection('www.google.com',
+                                          session_cache=cache)
+            first._context = context
+            first._connect()
+
+            second = spdypy.SPDYConnection('www.google.com',
+                                           session_cache=cache)
+            second._context = context
+            second._connect()
+
+        session = context.wrap_socket.call_args_list[0][1]['session']
+        resumed = context.wrap_socket.call_args_list[1][1]['session']
+
+        assert session is None
+        assert resumed is first._sck.session
+
+    def test_failed_handshakes_drop_the_session(self):
+        cache = SessionCache()
+        context = MagicMock()
+        session = MagicMock()
+        cache.store(context, 'www.google.com', 443, session)
+        context.wrap_socket.side_effect = ssl.SSLError()
+
+        conn = spdypy.SPDYConnection('www.google.com', session_cache=cache)
+        conn._context = context
+
+        with patch('socket.getaddrinfo'), \
+                patch('spdypy.connection.create_connection'):
+            with raises(ssl.SSLError):
+                conn._connect()
+
+        assert cache.get(context, 'www.google.com', 443) is None
+
+    def connect_speaking(self, protocol):
+        conn = spdypy.SPDYConnection('www.google.com',
+                                     session_cache=SessionCache())
+        conn._context = MagicMock()
+        wrapped = conn._context.wrap_socket.return_value
+        wrapped.selected_alpn_protocol.return_value = protocol
+
+        with patch('socket.getaddrinfo'), \
+                patch('spdypy.connection.create_connection'):
+            conn._connect()
+
+        return conn
+
+    def test_spdy_is_negotiated_with_alpn(self):
+        conn = self.connect_speaking('spdy/3.1')
+
+        assert conn.protocol == 'spdy/3.1'
+        assert conn._fallback is None
+
+    def test_falls_back_to_http11(self):
+        for protocol in ('http/1.1', None):
+            conn = self.connect_speaking(protocol)
+
+            assert isinstance(conn._fallback, HTTP11Connection)
+            assert conn._fallback._idle[0].sock is conn._sck
+
+    def test_http11_connections_are_not_pinged(self):
+        conn = self.connect_speaking('http/1.1')
+        conn._sck.reset_mock()
+
+        assert conn.ping() is None
+        assert not conn._sck.sendall.called
+        assert not conn._sck.recv.called
+
+    def test_quiet_connections_are_checked_before_use(self):
+        conn = spdypy.SPDYConnection('www.google.com', ping_interval=0)
+        dead = conn._sck = MagicMock()
+        old_core = conn._core
+        conn.ping = MagicMock(side_effect=socket.timeout())
+
+        conn._check_alive()
+
+        conn.ping.assert_called_once_with()
+        dead.close.assert_called_once_with()
+        assert conn._sck is None
+        assert conn._core is not old_core
+
+    def test_busy_connections_are_not_checked(self):
+        conn = spdypy.SPDYConnection('www.google.com', ping_interval=0)
+        conn._sck = MagicMock()
+        conn.ping = MagicMock()
+        conn._core.putrequest(b'GET', b'/')
+
+        conn._check_alive()
+
+        assert not conn.ping.called
+
+    def test_connections_share_a_context(self):
+        first = spdypy.SPDYConnection('www.google.com')
+        second = spdypy.SPDYConnection('www.example.com')
+
+        assert first._context is second._context
+
+    def test_connections_share_dns_results(self):
+        addrs = [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                  ('127.0.0.1', 443))]
+        cache = DNSCache()
+
+        with patch('socket.getaddrinfo', return_value=addrs) as getaddrinfo, \
+                patch('spdypy.connection.create_connection'):
+            for _ in range(3):
+                conn = spdypy.SPDYConnection('www.google.com',
+                                             dns_cache=cache)
+                conn._context = MagicMock()
+                conn._connect()
+
+        assert getaddrinfo.call_count == 1
+
+    def test_failed_connections_drop_cached_addresses(self):
+        addrs = [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                  ('127.0.0.1', 443))]
+        cache = DNSCache()
+        conn = spdypy.SPDYConnection('www.google.com', dns_cache=cache)
+
+        with patch('socket.getaddrinfo', return_value=addrs), \
+                patch('spdypy.connection.create_connection',
+                      side_effect=ConnectionRefusedError):
+            with raises(ConnectionRefusedError):
+                conn._connect()
+
+        assert cache._entries == {}
+
+
+class TestReceivePipeline(object):
+    def setup_method(self, method):
+        self.conn = spdypy.SPDYConnection('www.google.com')
+        self.mock = MockConnection()
+        self.conn._sck = self.mock
+        self.stream_id = self.conn.request(b'GET', b'/')
+        self.mock.buffer = b''
+        self.server_compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+
+    def receive(self, *frames):
+        data = b''.join(f.to_bytes(self.server_compressor) for f in frames)
+
+        self.events = self.conn._core.receive_data(data)
+        self.conn._send_outstanding()
+
+    def sent_frames(self):
+        decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        return FrameParser(decompressor).receive(self.mock.buffer)
+
+    def test_replies_and_data_reach_their_stream(self):
+        reply = SYNReplyFrame()
+        reply.version = 3
+        reply.stream_id = self.stream_id
+        reply.headers = {b':status': b'200 OK'}
+
+        data = DataFrame()
+        data.stream_id = self.stream_id
+        data.data = b'hello'
+        data.flags.add(FLAG_FIN)
+
+        self.receive(reply, data)
+        stream = self.conn._streams[self.stream_id]
+
+        assert stream.response_headers == {b':status': b'200 OK'}
+        assert list(stream._received) == [b'hello']
+        assert stream.remote_closed
+        assert stream.closed
+
+    def test_resets_reach_their_stream(self):
+        rst = RSTStreamFrame()
+        rst.version = 3
+        rst.stream_id = self.stream_id
+        rst.status_code = CANCEL
+
+        self.receive(rst)
+
+        assert self.conn._streams[self.stream_id].reset_code == CANCEL
+        assert self.mock.buffer == b''
+
+    def test_server_pings_are_echoed(self):
+        ping = PingFrame()
+        ping.version = 3
+        ping.ping_id = 2
+
+        self.receive(ping)
+        frames = self.sent_frames()
+
+        assert len(frames) == 1
+        assert isinstance(frames[0], PingFrame)
+        assert frames[0].ping_id == 2
+
+    def test_ping_replies_are_not_echoed(self):
+        ping = PingFrame()
+        ping.version = 3
+        ping.ping_id = 1
+
+        self.receive(ping)
+        assert self.mock.buffer == b''
+
+    def test_goaway_ends_unprocessed_streams(self):
+        second = self.conn.request(b'GET', b'/other')
+
+        goaway = GoAwayFrame()
+        goaway.version = 3
+        goaway.last_good_stream_id = self.stream_id
+        goaway.status_code = 0
+
+        self.receive(goaway)
+
+        assert self.conn.last_good_stream_id == self.stream_id
+        assert self.conn._streams[self.stream_id].reset_code is None
+        assert self.conn._streams[second].reset_code == REFUSED_STREAM
+
+    def test_goaway_streams_finish_before_reconnecting(self):
+        goaway = GoAwayFrame()
+        goaway.version = 3
+        goaway.last_good_stream_id = self.stream_id
+        goaway.status_code = 0
+
+        self.receive(goaway)
+        self.conn._reset = MagicMock()
+
+        # The last good stream is still going.
+        self.conn._connect()
+        assert not self.conn._reset.called
+
+        self.conn._close_stream(self.conn._streams[self.stream_id])
+        self.conn._connect()
+        self.conn._reset.assert_called_once_with()
+
+    def push(self, path, stream_id=2, host=b'www.google.com', body=None):
+        push = SYNStreamFrame()
+        push.version = 3
+        push.stream_id = stream_id
+        push.assoc_stream_id = self.stream_id
+        push.priority = 0
+        push.flags.add(FLAG_UNIDIRECTIONAL)
+        push.headers = {b':scheme': b'https', b':host': host, b':path': path,
+                        b':status': b'200 OK', b':version': b'HTTP/1.1'}
+
+        data = DataFrame()
+        data.stream_id = stream_id
+        data.data = body or path
+        data.flags.add(FLAG_FIN)
+
+        self.receive(push, data)
+
+    def test_pushed_responses_answer_later_requests(self):
+        self.push(b'/style.css')
+
+        stream_id = self.conn.request(b'GET', b'/style.css')
+        resp = self.conn.getresponse(stream_id)
+
+        assert stream_id == 2
+        assert resp.status == 200
+        assert resp.read() == b'/style.css'
+
+        # Nothing was sent for the request.
+        assert self.sent_frames() == []
+
+    def test_pushes_are_only_used_once(self):
+        self.push(b'/style.css')
+
+        self.conn.request(b'GET', b'/style.css')
+        stream_id = self.conn.request(b'GET', b'/style.css')
+
+        assert stream_id != 2
+
+    def test_malformed_pushes_are_refused(self):
+        push = SYNStreamFrame()
+        push.version = 3
+        push.stream_id = 2
+        push.assoc_stream_id = self.stream_id
+        push.priority = 0
+        push.flags.add(FLAG_UNIDIRECTIONAL)
+        push.headers = {b':path': b'/style.css'}
+
+        self.receive(push)
+        frames = self.sent_frames()
+
+        assert isinstance(frames[0], RSTStreamFrame)
+        assert frames[0].stream_id == 2
+        assert frames[0].status_code == PROTOCOL_ERROR
+
+    def test_pushes_for_other_hosts_are_refused(self):
+        self.push(b'/style.css', host=b'evil.example.com')
+        frames = self.sent_frames()
+
+        assert frames[0].stream_id == 2
+        assert frames[0].status_code == REFUSED_STREAM
+        assert 2 not in self.conn._streams
+
+    def test_old_pushes_are_evicted(self):
+        self.conn._core.push_cache.max_size = 2
+
+        self.push(b'/a', stream_id=2)
+        self.push(b'/b', stream_id=4)
+        self.push(b'/c', stream_id=6)
 
-        # We should then have called connect.
-        mock_sock.connect.assert_called_once_with(('127.0.0.1', 443))
+        assert 2 not in self.conn._streams
+        assert self.conn.request(b'GET', b'/a') % 2
+        assert self.conn.request(b'GET', b'/c') == 6
+
+    def test_frames_for_unknown_streams_are_reset(self):
+        data = DataFrame()
+        data.stream_id = 99
+        data.data = b'hello'
 
-        # Put the old stuff back.
-        socket.getaddrinfo = old_addrinfo
-        socket.socket = old_socket
+        self.receive(data)
+        frames = self.sent_frames()
+
+        assert isinstance(frames[0], RSTStreamFrame)
+        assert frames[0].stream_id == 99
+        assert frames[0].status_code == INVALID_STREAM
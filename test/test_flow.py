@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_flow
+~~~~~~~~~~~~~~
+
+Tests for flow control bookkeeping.
+"""
+from spdypy.flow import *
+from pytest import raises
+
+
+class TestReceiveWindow(object):
+    def test_consuming_shrinks_the_window(self):
+        window = ReceiveWindow(100)
+        window.consume(60)
+
+        assert window.available == 40
+
+        with raises(ValueError):
+            window.consume(41)
+
+    def test_updates_are_batched_to_half_the_window(self):
+        window = ReceiveWindow(100, interval=0)
+
+        window.release(49)
+        assert window.update() == 0
+
+        window.release(1)
+        assert window.update() == 50
+
+    def test_updates_restore_the_window(self):
+        window = ReceiveWindow(100, interval=0)
+        window.consume(60)
+        window.release(60)
+
+        assert window.update() == 60
+        assert window.available == 100
+
+    def test_fast_updates_grow_the_window(self):
+        window = ReceiveWindow(100, max_size=150, interval=60)
+        window.consume(50)
+        window.release(50)
+
+        assert window.update() == 100
+        assert window.size == 150
+        assert window.available == 150
+
+        # Never beyond the maximum.
+        window.release(75)
+        assert window.update() == 75
+        assert window.size == 150
+
+    def test_windows_do_not_grow_without_a_maximum(self):
+        window = ReceiveWindow(100, interval=60)
+        window.release(50)
+
+        assert window.update() == 50
+        assert window.size == 100
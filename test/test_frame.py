@@ -54,6 +54,41 @@ class TestFrame(object):
             fr.to_bytes()
 
 
+class TestFlagSet(object):
+    def test_flags_are_stored_in_the_flag_byte(self):
+        fr = SYNStreamFrame()
+        fr.flags.add(FLAG_FIN)
+        fr.flags.add(FLAG_UNIDIRECTIONAL)
+
+        assert fr.flag_byte == 0x03
+        assert FLAG_FIN in fr.flags
+        assert len(fr.flags) == 2
+
+        fr.flags.discard(FLAG_FIN)
+        assert fr.flag_byte == 0x02
+
+    def test_assigning_flags_replaces_them(self):
+        fr = DataFrame()
+        fr.flag_byte = 0x01
+
+        fr.flags = set()
+        assert fr.flag_byte == 0
+
+    def test_undefined_flags_cannot_be_added(self):
+        fr = DataFrame()
+
+        with raises(ValueError):
+            fr.flags.add(FLAG_UNIDIRECTIONAL)
+
+        assert FLAG_UNIDIRECTIONAL not in fr.flags
+
+    def test_frames_have_no_dict(self):
+        for frametype in frame_from_type.values():
+            assert not hasattr(frametype(), '__dict__')
+
+        assert not hasattr(DataFrame(), '__dict__')
+
+
 class TestFromBytes(object):
     def __test_syn_xxx_frame_good(self, frame_bytes, frametype):
         # Prepare for the NV block.
@@ -66,7 +101,7 @@ class TestFromBytes(object):
 
         data = b'\xff\xff' + frame_bytes + b'\xff\xff\xff\xff\xff\xff\xff\xff'
         if frametype is SYNStreamFrame:
-            data += b'\xff\xff\xff\xff\xff\xff\xff\xff'
+            data += b'\xff\xff\xff\xff\xff\xff'
 
         data += compressed
 
@@ -183,6 +218,133 @@ class TestFromBytes(object):
         assert fr.data == b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f'
 
 
+class TestFrameParser(object):
+    ping = b'\x80\x03\x00\x06\x00\x00\x00\x04\x00\x00\x00\x01'
+    data = b'\x00\x00\x00\x01\x01\x00\x00\x05hello'
+
+    def test_parser_returns_complete_frames(self):
+        parser = FrameParser()
+        frames = parser.receive(self.ping + self.data)
+
+        assert len(frames) == 2
+        assert isinstance(frames[0], PingFrame)
+        assert frames[0].ping_id == 1
+        assert isinstance(frames[1], DataFrame)
+        assert frames[1].data == b'hello'
+        assert len(parser) == 0
+
+    def test_unknown_control_frames_are_parsed(self):
+        parser = FrameParser()
+        unknown = b'\x80\x03\x00\x63\x01\x00\x00\x03abc'
+        frames = parser.receive(unknown + self.ping)
+
+        assert isinstance(frames[0], UnknownFrame)
+        assert frames[0].frame_type == 0x63
+        assert isinstance(frames[1], PingFrame)
+
+    def test_undecodable_frames_are_dropped(self):
+        parser = FrameParser()
+
+        # A SETTINGS frame claiming one entry, but carrying none.
+        bad = b'\x80\x03\x00\x04\x00\x00\x00\x04\x00\x00\x00\x01'
+
+        with raises(Exception):
+            parser.receive(self.ping + bad + self.data)
+
+        # The frames either side of it aren't lost.
+        frames = parser.receive(b'')
+
+        assert [type(f) for f in frames] == [PingFrame, DataFrame]
+        assert len(parser) == 0
+
+    def test_parser_keeps_partial_frames(self):
+        parser = FrameParser()
+        frames = parser.receive(self.ping + self.data[:10])
+
+        assert len(frames) == 1
+        assert len(parser) == 10
+
+        frames = parser.receive(self.data[10:])
+
+        assert len(frames) == 1
+        assert frames[0].data == b'hello'
+        assert len(parser) == 0
+
+    def test_parser_handles_byte_at_a_time_input(self):
+        parser = FrameParser()
+        frames = []
+
+        for byte in self.data + self.ping:
+            frames.extend(parser.receive(bytes([byte])))
+
+        assert len(frames) == 2
+        assert frames[0].data == b'hello'
+        assert frames[1].ping_id == 1
+
+    def test_parser_data_frames_do_not_reference_buffer(self):
+        parser = FrameParser()
+        frame = parser.receive(self.data)[0]
+        parser.receive(self.ping)
+
+        assert isinstance(frame.data, bytes)
+        assert frame.data == b'hello'
+
+    def test_parser_decompresses_header_blocks_in_order(self):
+        compobj = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+        decobj = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        parser = FrameParser(decobj)
+
+        wire = b''
+        for value in (b'b', b'c'):
+            fr = HeadersFrame()
+            fr.version = 3
+            fr.stream_id = 1
+            fr.headers = {b'a': value}
+            wire += fr.to_bytes(compobj)
+
+        frames = parser.receive(wire)
+
+        assert [f.headers for f in frames] == [{b'a': b'b'}, {b'a': b'c'}]
+
+
+class TestHeaderMap(object):
+    def test_names_are_case_insensitive(self):
+        headers = HeaderMap()
+        headers[b'Content-Type'] = b'text/html'
+
+        assert headers[b'content-type'] == b'text/html'
+        assert b'CONTENT-TYPE' in headers
+        assert list(headers) == [b'content-type']
+
+    def test_headers_keep_their_order(self):
+        headers = HeaderMap()
+        for name in (b'z', b'a', b'm'):
+            headers[name] = b'v'
+
+        assert list(headers) == [b'z', b'a', b'm']
+
+    def test_multiple_values(self):
+        headers = HeaderMap()
+        headers.add(b'Set-Cookie', b'a=b')
+        headers.add(b'set-cookie', b'c=d')
+
+        assert headers[b'set-cookie'] == [b'a=b', b'c=d']
+        assert headers.get_all(b'set-cookie') == [b'a=b', b'c=d']
+        assert headers.get_all(b'missing') == []
+
+    def test_nv_block_is_cached_until_headers_change(self):
+        headers = HeaderMap({b'a': b'b'})
+        block = serialize_nv_block(headers)
+
+        assert serialize_nv_block(headers) is block
+
+        headers[b'c'] = [b'd', b'e']
+        assert serialize_nv_block(headers) == (
+            b'\x00\x00\x00\x02\x00\x00\x00\x01a\x00\x00\x00\x01b'
+            b'\x00\x00\x00\x01c\x00\x00\x00\x03d\x00e'
+        )
+
+
 class TestNVBlock(object):
     def test_basic_nv_block_parsing(self):
         indata = b'\x00\x00\x00\x02\x00\x00\x00\x01a\x00\x00\x00\x01b\x00\x00\x00\x01c\x00\x00\x00\x03d\x00e'
@@ -195,6 +357,43 @@ class TestNVBlock(object):
         headers = parse_nv_block(decobj, compressed)
         assert headers == expected
 
+    def test_nv_block_parsing_many_headers(self):
+        indata = {('x-%d' % i).encode('ascii'): b'v' * i for i in range(500)}
+        indata[b'set-cookie'] = [b'a=b', b'c=d', b'e=f']
+        compobj = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+        decobj = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+
+        block = build_nv_block(compobj, indata)
+        assert parse_nv_block(decobj, block) == indata
+
+    def test_header_blocks_decode_values_on_access(self):
+        indata = b'\x00\x00\x00\x02\x00\x00\x00\x01a\x00\x00\x00\x01b\x00\x00\x00\x01c\x00\x00\x00\x03d\x00e'
+        headers = HeaderBlock(indata)
+
+        assert b'c' in headers
+        assert headers._values == {b'a': None, b'c': None}
+
+        assert headers[b'c'] == [b'd', b'e']
+        assert headers._values == {b'a': None, b'c': [b'd', b'e']}
+
+    def test_unchanged_header_blocks_are_not_reserialized(self):
+        indata = b'\x00\x00\x00\x01\x00\x00\x00\x01a\x00\x00\x00\x01b'
+        headers = HeaderBlock(indata)
+        headers[b'a']
+
+        assert serialize_nv_block(headers) is indata
+
+    def test_changed_header_blocks_are_reserialized(self):
+        indata = b'\x00\x00\x00\x01\x00\x00\x00\x01a\x00\x00\x00\x01b'
+        headers = HeaderBlock(indata)
+        headers[b'c'] = b'd'
+        del headers[b'a']
+
+        assert headers == {b'c': b'd'}
+        assert serialize_nv_block(headers) == (
+            b'\x00\x00\x00\x01\x00\x00\x00\x01c\x00\x00\x00\x01d'
+        )
+
     def test_can_build_nv_block(self):
         indata = {b'a': b'b', b'c': [b'd', b'e']}
         compobj = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
@@ -208,6 +407,19 @@ class TestNVBlock(object):
         dec = decobj.decompress(block)
         assert dec in (expected1, expected2)
 
+    def test_serialize_nv_block(self):
+        indata = {b'a': b'b', b'c': [b'd', b'e']}
+        expected = b'\x00\x00\x00\x02\x00\x00\x00\x01a\x00\x00\x00\x01b\x00\x00\x00\x01c\x00\x00\x00\x03d\x00e'
+
+        assert serialize_nv_block(indata) == expected
+
+    def test_control_frames_serialize_to_one_buffer(self):
+        fr = PingFrame()
+        fr.version = 3
+        fr.ping_id = 1
+
+        assert fr.to_buffers() == [fr.to_bytes()]
+
 
 class SYNStreamFrameCommon(object):
     def test_build_flags_all_flags(self):
@@ -232,7 +444,7 @@ class TestSYNStreamFrame(SYNStreamFrameCommon):
         self.frametype = SYNStreamFrame
 
     def test_non_nv_block_data_good(self):
-        data = b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff'
+        data = b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff'
 
         fr = self.frametype()
         fr.build_data(data, NullDecompressor())
@@ -255,6 +467,38 @@ class TestSYNStreamFrame(SYNStreamFrameCommon):
         dumped = fr.to_bytes(compressor)
         assert dumped == expected
 
+    def test_to_buffers_splits_header_and_nv_block(self):
+        fr = SYNStreamFrame()
+        fr.version = 3
+        fr.stream_id = 1
+        fr.priority = 0
+        fr.headers = {b'a': b'b'}
+
+        buffers = fr.to_buffers(NullCompressor())
+
+        assert len(buffers) == 2
+        assert len(buffers[0]) == 18
+        assert buffers[1] == serialize_nv_block({b'a': b'b'})
+        assert b''.join(buffers) == fr.to_bytes(NullCompressor())
+
+    def test_round_trip(self):
+        fr = SYNStreamFrame()
+        fr.version = 3
+        fr.stream_id = 2
+        fr.assoc_stream_id = 1
+        fr.priority = 5
+        fr.headers = {b'a': b'b'}
+
+        data = fr.to_bytes(zlib.compressobj(zdict=SPDY_3_ZLIB_DICT))
+        decobj = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        parsed, consumed = from_bytes(data, decobj)
+
+        assert consumed == len(data)
+        assert parsed.stream_id == 2
+        assert parsed.assoc_stream_id == 1
+        assert parsed.priority == 5
+        assert parsed.headers == {b'a': b'b'}
+
 
 class TestSYNReplyFrame(SYNStreamFrameCommon):
     def setup(self):
@@ -365,7 +609,7 @@ class TestSettingsFrame(object):
         assert fr.settings[1].flags == set([FLAG_SETTINGS_PERSISTED])
 
     def test_can_serialize(self):
-        data = b'\x80\x03\x00\x04\x01\x00\x00\x18\x00\x00\x00\x02\x01\x00\x00\x01\x00\x00\x00\x64\x02\x00\x00\x02\x00\x00\x00\x32'
+        data = b'\x80\x03\x00\x04\x01\x00\x00\x14\x00\x00\x00\x02\x01\x00\x00\x01\x00\x00\x00\x64\x02\x00\x00\x02\x00\x00\x00\x32'
 
         fr = SettingsFrame()
         fr.version = 3
@@ -562,4 +806,15 @@ class TestDataFrame(object):
 
         assert fr.to_bytes() == expected
 
+    def test_to_buffers_does_not_copy_body(self):
+        data = b'\x01\x02\x03\x04\x05'
+
+        fr = DataFrame()
+        fr.stream_id = 1
+        fr.data = data
+
+        buffers = fr.to_buffers()
+        assert buffers[0] == b'\x00\x00\x00\x01\x00\x00\x00\x05'
+        assert buffers[1] is data
+
 
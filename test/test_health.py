@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_health
+~~~~~~~~~~~~~~~~
+
+Tests for round trip time estimation.
+"""
+from spdypy.health import RTTEstimator
+
+
+class TestRTTEstimator(object):
+    def test_first_sample(self):
+        rtt = RTTEstimator()
+        rtt.sample(0.2)
+
+        assert rtt.smoothed == 0.2
+        assert rtt.variance == 0.1
+        assert rtt.latest == 0.2
+        assert rtt.samples == 1
+
+    def test_later_samples_are_smoothed(self):
+        rtt = RTTEstimator()
+        rtt.sample(0.2)
+        rtt.sample(0.6)
+
+        assert abs(rtt.smoothed - 0.25) < 1e-9
+        assert abs(rtt.variance - 0.175) < 1e-9
+        assert rtt.latest == 0.6
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_http11
+~~~~~~~~~~~~~~~~
+
+Tests for the HTTP/1.1 fallback.
+"""
+import socket
+import threading
+import spdypy.http11
+from spdypy.http11 import HTTP11Connection
+from pytest import raises
+
+
+class HTTP11Server(object):
+    """
+    Reads requests from the other end of a socket pair, recording them, and
+    answers each with its own request line.
+    """
+    def __init__(self, sck):
+        self.sck = sck
+        self.requests = []
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        rfile = self.sck.makefile('rb')
+
+        while True:
+            request_line = rfile.readline()
+            if not request_line:
+                return
+
+            headers = {}
+            for line in iter(rfile.readline, b'\r\n'):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.lower()] = value.strip()
+
+            if headers.get('transfer-encoding') == 'chunked':
+                body = b''
+                while True:
+                    size = int(rfile.readline(), 16)
+                    chunk = rfile.read(size + 2)[:size]
+                    if not size:
+                        break
+                    body += chunk
+            else:
+                body = rfile.read(int(headers.get('content-length', 0)))
+
+            self.requests.append((request_line, headers, body))
+
+            reply = request_line.strip()
+            self.sck.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: ' +
+                             str(len(reply)).encode('ascii') +
+                             b'\r\n\r\n' + reply)
+
+
+class TestHTTP11Connection(object):
+    def setup_method(self, method):
+        self.client, self.server = socket.socketpair()
+        self.server_thread = HTTP11Server(self.server)
+        self.conn = HTTP11Connection('www.google.com', 443, self.client,
+                                     context=None, timeout=5)
+
+    def teardown_method(self, method):
+        self.conn.close()
+        self.server.close()
+
+    def test_request_and_response(self):
+        stream_id = self.conn.request(b'GET', b'/hello',
+                                      headers={b'X-Test': b'yes'})
+        resp = self.conn.getresponse(stream_id)
+
+        assert resp.status == 200
+        assert resp.read() == b'GET /hello HTTP/1.1'
+
+        _, headers, _ = self.server_thread.requests[0]
+        assert headers['x-test'] == 'yes'
+        assert headers['host'] == 'www.google.com'
+
+    def test_finished_connections_are_reused(self):
+        for path in (b'/one', b'/two'):
+            self.conn.request(b'GET', path)
+            self.conn.getresponse().read()
+
+        # Both went over the socket the handshake was made on.
+        assert len(self.server_thread.requests) == 2
+        assert self.conn.requests_sent == 2
+
+    def test_bodies_of_unknown_length_are_chunked(self):
+        self.conn.request(b'POST', b'/', body=iter([b'abc', b'def']))
+        self.conn.getresponse().read()
+
+        _, headers, body = self.server_thread.requests[0]
+        assert headers['transfer-encoding'] == 'chunked'
+        assert body == b'abcdef'
+
+    def test_bodies_of_known_length_have_a_content_length(self):
+        self.conn.request(b'POST', b'/', body=b'abcdef')
+        self.conn.getresponse().read()
+
+        _, headers, body = self.server_thread.requests[0]
+        assert headers['content-length'] == '6'
+        assert body == b'abcdef'
+
+    def test_failed_requests_close_their_connection(self):
+        stream_id = self.conn.putrequest(b'GET', b'/')
+        conn = self.conn._connection_for(stream_id)
+        self.server.shutdown(socket.SHUT_RDWR)
+
+        # The server may go before or after the request is written.
+        with raises(ConnectionError):
+            self.conn.endheaders(stream_id=stream_id)
+            self.conn.getresponse(stream_id)
+
+        assert stream_id not in self.conn._in_flight
+        assert conn.sock is None
+
+    def test_the_oldest_request_is_dropped_past_the_limit(self):
+        old_limit = spdypy.http11.MAX_IN_FLIGHT
+        spdypy.http11.MAX_IN_FLIGHT = 2
+
+        try:
+            first = self.conn.putrequest(b'GET', b'/')
+            conn = self.conn._connection_for(first)
+            self.conn.putrequest(b'GET', b'/')
+            self.conn.putrequest(b'GET', b'/')
+        finally:
+            spdypy.http11.MAX_IN_FLIGHT = old_limit
+
+        assert len(self.conn._in_flight) == 2
+        assert first not in self.conn._in_flight
+        assert conn.sock is None
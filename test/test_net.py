@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_net
+~~~~~~~~~~~~~
+
+Tests for resolving hosts and opening connections.
+"""
+import socket
+import time
+from spdypy.net import DNSCache, interleave_families, create_connection
+from unittest.mock import patch
+from pytest import raises
+
+
+def addrinfo(family, host, port):
+    return (family, socket.SOCK_STREAM, 6, '', (host, port))
+
+
+class TestInterleaveFamilies(object):
+    def test_families_alternate(self):
+        addrs = [addrinfo(socket.AF_INET6, '::1', 1),
+                 addrinfo(socket.AF_INET6, '::2', 1),
+                 addrinfo(socket.AF_INET6, '::3', 1),
+                 addrinfo(socket.AF_INET, '1.1.1.1', 1),
+                 addrinfo(socket.AF_INET, '2.2.2.2', 1)]
+
+        ordered = [a[4][0] for a in interleave_families(addrs)]
+
+        assert ordered == ['::1', '1.1.1.1', '::2', '2.2.2.2', '::3']
+
+    def test_first_family_goes_first(self):
+        addrs = [addrinfo(socket.AF_INET, '1.1.1.1', 1),
+                 addrinfo(socket.AF_INET6, '::1', 1)]
+
+        assert interleave_families(addrs) == addrs
+
+
+class TestCreateConnection(object):
+    def setup_method(self, method):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.good = addrinfo(socket.AF_INET, '127.0.0.1',
+                             self.listener.getsockname()[1])
+
+        # Nothing listens on a port we've just closed.
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.refused = addrinfo(socket.AF_INET, '127.0.0.1',
+                                closed.getsockname()[1])
+        closed.close()
+
+    def teardown_method(self, method):
+        self.listener.close()
+
+    def test_connects(self):
+        sck = create_connection([self.good])
+
+        try:
+            assert sck.getpeername() == self.good[4]
+            assert sck.gettimeout() is None
+        finally:
+            sck.close()
+
+    def test_refused_addresses_are_skipped_straight_away(self):
+        start = time.monotonic()
+        sck = create_connection([self.refused, self.good], delay=10)
+        sck.close()
+
+        assert time.monotonic() - start < 5
+
+    def test_slow_addresses_are_raced(self):
+        # A non-routable address never answers.
+        blackhole = addrinfo(socket.AF_INET, '10.255.255.1', 443)
+
+        start = time.monotonic()
+        sck = create_connection([blackhole, self.good], delay=0.05)
+        sck.close()
+
+        assert time.monotonic() - start < 5
+
+    def test_addresses_without_sockets_are_skipped(self):
+        ipv6 = addrinfo(socket.AF_INET6, '::1', self.good[4][1])
+        real_socket = socket.socket
+
+        def no_ipv6(family=socket.AF_INET, *args):
+            if family == socket.AF_INET6:
+                raise OSError(97, "Address family not supported by protocol")
+            return real_socket(family, *args)
+
+        with patch('socket.socket', no_ipv6):
+            sck = create_connection([ipv6, self.good])
+
+        try:
+            assert sck.getpeername() == self.good[4]
+        finally:
+            sck.close()
+
+    def test_last_error_raised_if_all_fail(self):
+        with raises(ConnectionRefusedError):
+            create_connection([self.refused])
+
+    def test_no_addresses(self):
+        with raises(OSError):
+            create_connection([])
+
+
+class TestDNSCache(object):
+    def test_results_are_cached(self):
+        cache = DNSCache()
+        addrs = [addrinfo(socket.AF_INET, '127.0.0.1', 443)]
+
+        with patch('socket.getaddrinfo', return_value=addrs) as getaddrinfo:
+            assert cache.resolve('example.com', 443) == addrs
+            assert cache.resolve('example.com', 443) == addrs
+
+        assert getaddrinfo.call_count == 1
+
+    def test_results_expire(self):
+        cache = DNSCache(ttl=0)
+
+        with patch('socket.getaddrinfo', return_value=[]) as getaddrinfo:
+            cache.resolve('example.com', 443)
+            cache.resolve('example.com', 443)
+
+        assert getaddrinfo.call_count == 2
+
+    def test_invalidate(self):
+        cache = DNSCache()
+
+        with patch('socket.getaddrinfo', return_value=[]) as getaddrinfo:
+            cache.resolve('example.com', 443)
+            cache.invalidate('example.com', 443)
+            cache.resolve('example.com', 443)
+
+        assert getaddrinfo.call_count == 2
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_pool
+~~~~~~~~~~~~~~
+
+Tests for connection pooling.
+"""
+from spdypy.pool import SPDYConnectionPool, PoolManager
+from spdypy.protocol import ConnectionTerminatedError
+from spdypy.stream import StreamResetError
+from spdypy.frame import SETTINGS_MAX_CONCURRENT_STREAMS, REFUSED_STREAM
+from pytest import raises
+
+
+class FakeConnection(object):
+    """
+    Stands in for a SPDYConnection, keeping every stream open until it's told
+    otherwise. Setting ``goaway`` makes it behave as though the server sent
+    a GOAWAY before processing the requests made on it.
+    """
+    def __init__(self, host, port=443, **kwargs):
+        self.host = host
+        self.port = port
+        self.kwargs = kwargs
+        self.remote_settings = {}
+        self.last_good_stream_id = None
+        self.streams = {}
+        self.closed = False
+        self.goaway = False
+        self._next_stream_id = 1
+
+    @property
+    def open_streams(self):
+        return len(self.streams)
+
+    def request(self, method, path, body=None, headers={}, priority=7):
+        if self.last_good_stream_id is not None:
+            raise ConnectionTerminatedError(self.last_good_stream_id)
+
+        stream_id = self._next_stream_id
+        self._next_stream_id += 2
+        self.streams[stream_id] = path
+        return stream_id
+
+    def getresponse(self, stream_id):
+        if self.goaway:
+            self.last_good_stream_id = 0
+            del self.streams[stream_id]
+            raise StreamResetError(stream_id, REFUSED_STREAM)
+
+        return (self, stream_id)
+
+    def close(self):
+        self.closed = True
+
+
+class TestSPDYConnectionPool(object):
+    def pool(self, connection_class=FakeConnection, **kwargs):
+        return SPDYConnectionPool('www.google.com',
+                                  connection_class=connection_class, **kwargs)
+
+    def test_requests_share_a_connection(self):
+        pool = self.pool()
+
+        first, _ = pool.request('GET', '/')
+        second, _ = pool.request('GET', '/')
+
+        assert first is second
+        assert pool.num_connections == 1
+
+    def test_connections_get_the_pool_arguments(self):
+        pool = SPDYConnectionPool('www.google.com', port=8443,
+                                  connection_class=FakeConnection,
+                                  timeout=5)
+
+        conn, _ = pool.request('GET', '/')
+
+        assert conn.port == 8443
+        assert conn.kwargs == {'timeout': 5}
+
+    def test_new_connection_when_max_streams_reached(self):
+        pool = self.pool(max_streams=2)
+
+        conns = [pool.request('GET', '/')[0] for _ in range(5)]
+
+        assert conns[0] is conns[1]
+        assert conns[2] is conns[3]
+        assert conns[0] is not conns[2]
+        assert pool.num_connections == 3
+
+    def test_server_concurrency_limit_is_respected(self):
+        pool = self.pool()
+
+        conn, _ = pool.request('GET', '/')
+        conn.remote_settings[SETTINGS_MAX_CONCURRENT_STREAMS] = 1
+
+        other, _ = pool.request('GET', '/')
+        assert other is not conn
+
+        # Once the stream is done, the connection has room again.
+        conn.streams.clear()
+        again, _ = pool.request('GET', '/')
+        assert again is conn
+
+    def test_goaway_connections_are_retired(self):
+        pool = self.pool()
+
+        conn, stream_id = pool.request('GET', '/')
+        conn.last_good_stream_id = stream_id
+
+        other, _ = pool.request('GET', '/')
+        assert other is not conn
+        assert not conn.closed
+
+        # It's closed once its streams are done.
+        conn.streams.clear()
+        pool.request('GET', '/')
+
+        assert conn.closed
+        assert pool.num_connections == 1
+
+    def test_idle_connections_are_evicted(self):
+        pool = self.pool(idle_timeout=-1)
+
+        conn, _ = pool.request('GET', '/')
+        conn.streams.clear()
+
+        other, _ = pool.request('GET', '/')
+
+        assert conn.closed
+        assert other is not conn
+
+    def test_busy_connections_are_not_evicted(self):
+        pool = self.pool(idle_timeout=-1)
+
+        conn, _ = pool.request('GET', '/')
+        other, _ = pool.request('GET', '/')
+
+        assert not conn.closed
+        assert other is conn
+
+    def test_close_closes_everything(self):
+        pool = self.pool(max_streams=1)
+        conns = [pool.request('GET', '/')[0] for _ in range(3)]
+
+        pool.close()
+
+        assert all(conn.closed for conn in conns)
+        assert pool.num_connections == 0
+
+
+    def test_unprocessed_idempotent_requests_are_replayed(self):
+        pool = self.pool()
+        first = pool._get_connection()
+        pool._reserved[first] -= 1
+        first.goaway = True
+
+        conn, stream_id = pool.request('GET', '/')
+
+        assert conn is not first
+        assert conn.streams[stream_id] == '/'
+
+    def test_unprocessed_posts_are_not_replayed(self):
+        pool = self.pool()
+        first = pool._get_connection()
+        pool._reserved[first] -= 1
+        first.goaway = True
+
+        with raises(StreamResetError):
+            pool.request('POST', '/', body=b'data')
+
+    def test_requests_are_not_replayed_forever(self):
+        pool = self.pool(connection_class=RefusingConnection)
+
+        with raises(StreamResetError):
+            pool.request('GET', '/')
+
+        assert pool.num_connections == 1
+
+    def test_requests_on_terminated_connections_go_elsewhere(self):
+        pool = self.pool()
+        first = pool._get_connection()
+        pool._reserved[first] -= 1
+
+        # The GOAWAY arrives after the pool has picked the connection.
+        def request(*args, **kwargs):
+            first.last_good_stream_id = 0
+            raise ConnectionTerminatedError(0)
+
+        first.request = request
+        conn, _ = pool.request('POST', '/')
+
+        assert conn is not first
+
+
+class RefusingConnection(FakeConnection):
+    """
+    A connection whose server refuses every stream.
+    """
+    def getresponse(self, stream_id):
+        del self.streams[stream_id]
+        raise StreamResetError(stream_id, REFUSED_STREAM)
+
+
+class TestPoolManager(object):
+    def manager(self):
+        return PoolManager(connection_class=FakeConnection)
+
+    def test_pools_are_per_origin(self):
+        manager = self.manager()
+
+        a = manager.connection_from_host('www.google.com')
+        b = manager.connection_from_host('WWW.GOOGLE.COM')
+        c = manager.connection_from_host('www.google.com', 8443)
+
+        assert a is b
+        assert a is not c
+
+    def test_request_by_url(self):
+        manager = self.manager()
+
+        conn, stream_id = manager.request('GET',
+                                          'https://example.com:8443/a?b=c')
+
+        assert conn.host == 'example.com'
+        assert conn.port == 8443
+        assert conn.streams[stream_id] == '/a?b=c'
+
+    def test_only_https_is_allowed(self):
+        with raises(ValueError):
+            self.manager().request('GET', 'http://example.com/')
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_protocol
+~~~~~~~~~~~~~~~~~~
+
+Tests for the SPDYProtocol state machine.
+"""
+import zlib
+from spdypy.protocol import (SPDYProtocol, ConnectionTerminatedError,
+                             MAX_BATCH_SIZE)
+from spdypy.events import *
+from spdypy.frame import *
+from spdypy.data import SPDY_3_ZLIB_DICT
+from pytest import raises
+
+
+class TestSPDYProtocol(object):
+    def setup_method(self, method):
+        self.proto = SPDYProtocol('www.google.com')
+        self.compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+        self.decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+
+    def serialize(self, *frames):
+        return b''.join(f.to_bytes(self.compressor) for f in frames)
+
+    def sent_frames(self):
+        data = b''
+        while True:
+            buffers = self.proto.data_to_send()
+            if not buffers:
+                break
+            data += b''.join(bytes(b) for b in buffers)
+
+        return FrameParser(self.decompressor).receive(data)
+
+    def test_nothing_to_send_at_first(self):
+        assert self.proto.data_to_send() == []
+
+    def test_requests_come_out_of_data_to_send(self):
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.putheader(b'accept', b'*/*')
+        self.proto.endheaders()
+
+        frames = self.sent_frames()
+
+        assert len(frames) == 1
+        assert frames[0].stream_id == stream_id
+        assert frames[0].headers[b':host'] == b'www.google.com'
+        assert frames[0].headers[b'accept'] == b'*/*'
+        assert self.proto.requests_sent == 1
+
+    def test_unfinished_requests_are_not_sent(self):
+        self.proto.putrequest(b'GET', b'/')
+        assert self.proto.data_to_send() == []
+
+    def test_batches_are_bounded(self):
+        self.proto.putrequest(b'POST', b'/')
+        self.proto.endheaders(message_body=iter([b'x' * 1024] * 200))
+
+        sizes = []
+        while True:
+            buffers = self.proto.data_to_send()
+            if not buffers:
+                break
+            sizes.append(sum(len(b) for b in buffers))
+
+        assert len(sizes) > 1
+        assert all(size < MAX_BATCH_SIZE + 20000 for size in sizes)
+
+    def test_response_events(self):
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+
+        reply = SYNReplyFrame()
+        reply.version = 3
+        reply.stream_id = stream_id
+        reply.headers = {b':status': b'200 OK'}
+
+        data = DataFrame()
+        data.stream_id = stream_id
+        data.data = b'hello'
+        data.flags.add(FLAG_FIN)
+
+        events = self.proto.receive_data(self.serialize(reply, data))
+
+        assert [type(e) for e in events] == [ResponseReceived, DataReceived,
+                                             StreamEnded]
+        assert events[0].headers == {b':status': b'200 OK'}
+        assert events[1].data == b'hello'
+        assert all(e.stream_id == stream_id for e in events)
+
+    def test_events_wait_for_complete_frames(self):
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+
+        rst = RSTStreamFrame()
+        rst.version = 3
+        rst.stream_id = stream_id
+        rst.status_code = CANCEL
+        data = self.serialize(rst)
+
+        assert self.proto.receive_data(data[:5]) == []
+
+        events = self.proto.receive_data(data[5:])
+        assert len(events) == 1
+        assert isinstance(events[0], StreamReset)
+        assert events[0].status_code == CANCEL
+
+    def test_ping_events(self):
+        ours = PingFrame()
+        ours.version = 3
+        ours.ping_id = 1
+
+        theirs = PingFrame()
+        theirs.version = 3
+        theirs.ping_id = 2
+
+        events = self.proto.receive_data(self.serialize(ours, theirs))
+
+        assert isinstance(events[0], PingAcknowledged)
+        assert isinstance(events[1], PingReceived)
+        assert self.sent_frames()[0].ping_id == 2
+
+    def test_pings_measure_the_round_trip(self):
+        ping_id = self.proto.ping()
+        sent = self.sent_frames()
+
+        assert sent[0].ping_id == ping_id
+        assert ping_id % 2
+        assert ping_id in self.proto.outstanding_pings
+
+        events = self.proto.receive_data(self.serialize(sent[0]))
+
+        assert events[0].ping_id == ping_id
+        assert events[0].rtt >= 0
+        assert self.proto.rtt.latest == events[0].rtt
+        assert not self.proto.outstanding_pings
+
+    def test_settings_events(self):
+        settings = SettingsFrame()
+        settings.version = 3
+        settings.settings.append(Settings(SETTINGS_INITIAL_WINDOW_SIZE,
+                                          1000, set()))
+
+        events = self.proto.receive_data(self.serialize(settings))
+
+        assert isinstance(events[0], SettingsReceived)
+        assert events[0].settings == {SETTINGS_INITIAL_WINDOW_SIZE: 1000}
+
+    def test_goaway_events(self):
+        first = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+        second = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+
+        goaway = GoAwayFrame()
+        goaway.version = 3
+        goaway.last_good_stream_id = first
+        goaway.status_code = 0
+
+        events = self.proto.receive_data(self.serialize(goaway))
+
+        assert isinstance(events[0], ConnectionTerminated)
+        assert events[0].last_good_stream_id == first
+        assert isinstance(events[1], StreamReset)
+        assert events[1].stream_id == second
+        assert events[1].status_code == REFUSED_STREAM
+
+        # No new streams may be opened.
+        with raises(ConnectionTerminatedError):
+            self.proto.putrequest(b'GET', b'/')
+
+    def test_closing_an_open_stream_cancels_it(self):
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+        self.sent_frames()
+
+        self.proto.close_stream(stream_id)
+        frames = self.sent_frames()
+
+        assert isinstance(frames[0], RSTStreamFrame)
+        assert frames[0].status_code == CANCEL
+        assert stream_id not in self.proto.streams
+
+    def test_frames_for_closed_streams_are_ignored(self):
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+        self.sent_frames()
+
+        self.proto.close_stream(stream_id)
+        self.sent_frames()
+
+        data = DataFrame()
+        data.stream_id = stream_id
+        data.data = b'hello'
+
+        assert self.proto.receive_data(self.serialize(data)) == []
+        assert self.sent_frames() == []
+
+    def test_frames_for_streams_never_opened_are_reset(self):
+        data = DataFrame()
+        data.stream_id = 3
+        data.data = b'hello'
+
+        self.proto.receive_data(self.serialize(data))
+        frames = self.sent_frames()
+
+        assert isinstance(frames[0], RSTStreamFrame)
+        assert frames[0].status_code == INVALID_STREAM
+
+    def test_push_events(self):
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+
+        push = SYNStreamFrame()
+        push.version = 3
+        push.stream_id = 2
+        push.assoc_stream_id = stream_id
+        push.priority = 0
+        push.flags.add(FLAG_UNIDIRECTIONAL)
+        push.headers = {b':scheme': b'https', b':host': b'www.google.com',
+                        b':path': b'/style.css'}
+
+        headers = HeadersFrame()
+        headers.version = 3
+        headers.stream_id = 2
+        headers.headers = {b':status': b'200 OK'}
+
+        events = self.proto.receive_data(self.serialize(push, headers))
+
+        assert isinstance(events[0], PushReceived)
+        assert events[0].stream_id == 2
+        assert events[0].associated_stream_id == stream_id
+        assert events[0].headers[b':path'] == b'/style.css'
+
+        # The response headers arrived in the HEADERS frame.
+        assert isinstance(events[1], ResponseReceived)
+        assert events[1].headers == {b':status': b'200 OK'}
+
+    def test_small_stream_windows_leave_the_connection_window_alone(self):
+        self.proto = SPDYProtocol('www.google.com', initial_window_size=16384)
+        self.proto.connection_established('spdy/3.1')
+
+        frames = self.sent_frames()
+
+        assert [type(f) for f in frames] == [SettingsFrame]
+        assert self.proto._receive_window.size == 65536
+
+    def test_connection_window_updates_ignored_before_spdy_3_1(self):
+        self.proto.connection_established('spdy/3')
+
+        update = WindowUpdateFrame()
+        update.version = 3
+        update.stream_id = 0
+        update.delta_window_size = 1024
+
+        assert self.proto.receive_data(self.serialize(update)) == []
+
+    def test_unknown_control_frames_are_ignored(self):
+        unknown = b'\x80\x03\x00\x63\x00\x00\x00\x03abc'
+
+        assert self.proto.receive_data(unknown) == []
+        assert self.proto.receive_data(b'') == []
+
+    def test_connection_flow_control_errors_end_the_connection(self):
+        self.proto.connection_established('spdy/3.1')
+        stream_id = self.proto.putrequest(b'GET', b'/')
+        self.proto.endheaders()
+        self.sent_frames()
+
+        data = DataFrame()
+        data.stream_id = stream_id
+        data.data = b'x' * 65537
+
+        events = self.proto.receive_data(self.serialize(data))
+
+        assert isinstance(events[0], StreamReset)
+        assert events[0].status_code == FLOW_CONTROL_ERROR
+
+        goaway = self.sent_frames()[0]
+        assert isinstance(goaway, GoAwayFrame)
+        assert goaway.status_code == PROTOCOL_ERROR
+
+        with raises(ConnectionTerminatedError):
+            self.proto.putrequest(b'GET', b'/')
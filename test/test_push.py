@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_push
+~~~~~~~~~~~~~~
+
+Tests for the push cache.
+"""
+from spdypy.push import PushCache
+
+
+class TestPushCache(object):
+    def test_pop_claims_a_push(self):
+        cache = PushCache()
+        cache.add(('https', 'a', '/'), 'stream')
+
+        assert cache.pop(('https', 'a', '/')) == 'stream'
+        assert cache.pop(('https', 'a', '/')) is None
+        assert len(cache) == 0
+
+    def test_oldest_pushes_are_evicted(self):
+        cache = PushCache(max_size=2)
+
+        assert cache.add('a', 1) == []
+        assert cache.add('b', 2) == []
+        assert cache.add('c', 3) == [1]
+        assert len(cache) == 2
+
+    def test_repushing_evicts_the_old_push(self):
+        cache = PushCache()
+        cache.add('a', 1)
+
+        assert cache.add('a', 2) == [1]
+        assert cache.pop('a') == 2
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_response
+~~~~~~~~~~~~~~~~~~
+
+Tests for the SPDYResponse object.
+"""
+import gc
+import socket
+import zlib
+import spdypy
+from spdypy.frame import *
+from spdypy.stream import StreamResetError
+from spdypy.data import SPDY_3_ZLIB_DICT
+from pytest import raises
+from .test_stream import MockConnection
+
+
+class MockServer(MockConnection):
+    """
+    A MockConnection that also replays data from the server, as though it had
+    always already arrived.
+    """
+    def __init__(self):
+        super(MockServer, self).__init__()
+        self.incoming = b''
+
+    def pending(self):
+        return True
+
+    def recv(self, size):
+        data, self.incoming = self.incoming[:size], self.incoming[size:]
+        return data
+
+
+class TestSPDYResponse(object):
+    def setup_method(self, method):
+        self.conn = spdypy.SPDYConnection('www.google.com')
+        self.server = MockServer()
+        self.conn._sck = self.server
+        self.stream_id = self.conn.request(b'GET', b'/')
+        self.server.buffer = b''
+        self.compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+
+    def reply(self, headers=None, fin=False):
+        frame = SYNReplyFrame()
+        frame.version = 3
+        frame.stream_id = self.stream_id
+        frame.headers = headers or {b':status': b'200 OK',
+                                    b':version': b'HTTP/1.1'}
+        if fin:
+            frame.flags.add(FLAG_FIN)
+
+        self.send(frame)
+
+    def data(self, data, fin=False):
+        frame = DataFrame()
+        frame.stream_id = self.stream_id
+        frame.data = data
+        if fin:
+            frame.flags.add(FLAG_FIN)
+
+        self.send(frame)
+
+    def send(self, frame):
+        self.server.incoming += frame.to_bytes(self.compressor)
+
+    def sent_frames(self):
+        decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        return FrameParser(decompressor).receive(self.server.buffer)
+
+    def test_status_and_headers(self):
+        self.reply({b':status': b'404 Not Found', b':version': b'HTTP/1.0',
+                    b'content-type': b'text/plain',
+                    b'set-cookie': [b'a=1', b'b=2']}, fin=True)
+
+        resp = self.conn.getresponse()
+
+        assert resp.status == 404
+        assert resp.reason == 'Not Found'
+        assert resp.version == 10
+        assert resp.getheader('Content-Type') == 'text/plain'
+        assert resp.getheader('set-cookie') == 'a=1, b=2'
+        assert resp.getheader('missing', 'default') == 'default'
+
+    def test_bad_statuses_reset_the_stream(self):
+        self.reply({b':status': b'OK', b':version': b'HTTP/1.1'})
+
+        with raises(StreamResetError) as e:
+            self.conn.getresponse()
+
+        assert e.value.status_code == PROTOCOL_ERROR
+
+        frames = self.sent_frames()
+        assert isinstance(frames[-1], RSTStreamFrame)
+        assert frames[-1].status_code == PROTOCOL_ERROR
+        assert self.stream_id not in self.conn._streams
+
+    def test_dropped_responses_are_cancelled_when_next_sending(self):
+        self.reply()
+        self.data(b'hello ')
+
+        resp = self.conn.getresponse()
+        sent = self.server.buffer
+        del resp
+        gc.collect()
+
+        # Nothing is written from the finalizer.
+        assert self.server.buffer == sent
+        assert self.stream_id in self.conn._streams
+
+        self.conn._send_outstanding()
+
+        frames = self.sent_frames()
+        assert isinstance(frames[0], RSTStreamFrame)
+        assert frames[0].stream_id == self.stream_id
+        assert frames[0].status_code == CANCEL
+        assert self.stream_id not in self.conn._streams
+
+    def test_read_all(self):
+        self.reply()
+        self.data(b'hello ')
+        self.data(b'world', fin=True)
+
+        resp = self.conn.getresponse()
+
+        assert resp.read() == b'hello world'
+        assert resp.isclosed()
+        assert resp.read() == b''
+
+    def test_read_in_pieces(self):
+        self.reply()
+        self.data(b'hello world', fin=True)
+
+        resp = self.conn.getresponse()
+
+        assert resp.read(3) == b'hel'
+        assert resp.read(100) == b'lo world'
+        assert resp.read(3) == b''
+
+    def test_read_waits_for_all_it_asked_for(self):
+        self.reply()
+        self.data(b'hello ')
+        self.data(b'world', fin=True)
+
+        # Each frame arrives on its own. The DATA frames are 14 and 13
+        # bytes long.
+        data, self.server.incoming = self.server.incoming, b''
+        arrivals = [data[:-27], data[-27:-13], data[-13:]]
+        self.server.recv = lambda size: arrivals.pop(0)
+
+        resp = self.conn.getresponse()
+
+        assert resp.read(8) == b'hello wo'
+        assert resp.read(8) == b'rld'
+
+    def test_read1_reads_once(self):
+        self.reply()
+        self.data(b'hello ')
+
+        resp = self.conn.getresponse()
+
+        assert resp.read1(100) == b'hello '
+
+    def test_readinto(self):
+        self.reply()
+        self.data(b'hello', fin=True)
+
+        resp = self.conn.getresponse()
+        buffer = bytearray(10)
+
+        assert resp.readinto(buffer) == 5
+        assert buffer[:5] == b'hello'
+
+    def test_iterating_yields_data_frames(self):
+        self.reply()
+        self.data(b'one')
+        self.data(b'two')
+        self.data(b'', fin=True)
+
+        resp = self.conn.getresponse()
+
+        assert [bytes(c) for c in resp] == [b'one', b'two']
+
+    def test_getresponse_picks_the_stream(self):
+        first = self.stream_id
+        self.conn.request(b'GET', b'/other')
+
+        self.reply(fin=True)
+
+        resp = self.conn.getresponse(first)
+        assert resp.stream_id == first
+
+    def test_reset_before_reply_raises(self):
+        rst = RSTStreamFrame()
+        rst.version = 3
+        rst.stream_id = self.stream_id
+        rst.status_code = REFUSED_STREAM
+        self.send(rst)
+
+        with raises(StreamResetError) as e:
+            self.conn.getresponse()
+
+        assert e.value.stream_id == self.stream_id
+        assert e.value.status_code == REFUSED_STREAM
+
+    def test_reset_during_body_raises(self):
+        self.reply()
+        self.data(b'partial')
+
+        rst = RSTStreamFrame()
+        rst.version = 3
+        rst.stream_id = self.stream_id
+        rst.status_code = INTERNAL_ERROR
+        self.send(rst)
+
+        resp = self.conn.getresponse()
+
+        assert resp.read(7) == b'partial'
+        with raises(StreamResetError):
+            resp.read(1)
+
+    def test_server_disconnecting_raises(self):
+        with raises(ConnectionResetError):
+            self.conn.getresponse()
+
+    def test_timeout_raises(self):
+        quiet, other = socket.socketpair()
+        self.conn.timeout = 0
+        self.server.pending = lambda: False
+        self.server.fileno = quiet.fileno
+
+        try:
+            with raises(socket.timeout):
+                self.conn.getresponse()
+        finally:
+            quiet.close()
+            other.close()
+
+    def test_closing_early_cancels_the_stream(self):
+        self.reply()
+        self.data(b'more to come')
+
+        resp = self.conn.getresponse()
+        resp.close()
+
+        frames = self.sent_frames()
+        assert isinstance(frames[-1], RSTStreamFrame)
+        assert frames[-1].status_code == CANCEL
+        assert self.stream_id not in self.conn._streams
+
+    def test_reading_reopens_the_window(self):
+        self.reply()
+        self.data(b'x' * 40000, fin=False)
+
+        resp = self.conn.getresponse()
+        assert self.sent_frames() == []
+
+        resp.read(40000)
+        frames = self.sent_frames()
+
+        assert isinstance(frames[0], WindowUpdateFrame)
+        assert frames[0].stream_id == self.stream_id
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_scheduler
+~~~~~~~~~~~~~~~~~~~
+
+Tests for the stream priority scheduler.
+"""
+from spdypy.scheduler import PriorityScheduler
+
+
+class MockStream(object):
+    """
+    A stream with a fixed number of frames to send. Its frames are just
+    (stream_id, index) tuples.
+    """
+    def __init__(self, stream_id, priority, frames):
+        self.stream_id = stream_id
+        self.priority = priority
+        self.frames = [(stream_id, i) for i in range(frames)]
+
+    def next_frame(self, max_data=None):
+        return self.frames.pop(0) if self.frames else None
+
+
+def drain(scheduler):
+    frames = []
+    stream, frame = scheduler.next_frame()
+
+    while frame is not None:
+        frames.append(frame)
+        stream, frame = scheduler.next_frame()
+
+    return frames
+
+
+class TestPriorityScheduler(object):
+    def test_empty_scheduler_has_nothing_to_send(self):
+        scheduler = PriorityScheduler()
+        assert scheduler.next_frame() == (None, None)
+
+    def test_higher_priorities_go_first(self):
+        scheduler = PriorityScheduler()
+        scheduler.schedule(MockStream(1, 7, 2))
+        scheduler.schedule(MockStream(3, 0, 2))
+
+        assert drain(scheduler) == [(3, 0), (3, 1), (1, 0), (1, 1)]
+
+    def test_equal_priorities_take_turns(self):
+        scheduler = PriorityScheduler()
+        scheduler.schedule(MockStream(1, 3, 2))
+        scheduler.schedule(MockStream(3, 3, 3))
+
+        assert drain(scheduler) == [(1, 0), (3, 0), (1, 1), (3, 1), (3, 2)]
+
+    def test_streams_are_only_scheduled_once(self):
+        scheduler = PriorityScheduler()
+        stream = MockStream(1, 3, 2)
+        scheduler.schedule(stream)
+        scheduler.schedule(stream)
+
+        assert len(scheduler) == 1
+        assert drain(scheduler) == [(1, 0), (1, 1)]
+
+    def test_empty_streams_are_dropped(self):
+        scheduler = PriorityScheduler()
+        stream = MockStream(1, 3, 1)
+        scheduler.schedule(stream)
+        drain(scheduler)
+
+        assert len(scheduler) == 0
+
+        stream.frames.append((1, 1))
+        scheduler.schedule(stream)
+        assert drain(scheduler) == [(1, 1)]
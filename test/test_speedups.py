@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_speedups
+~~~~~~~~~~~~~~~~~~
+
+Checks that the compiled frame codec behaves exactly as the pure-Python one
+does. Skipped unless the extension has been built with ``invoke build``.
+"""
+import struct
+import zlib
+from pytest import importorskip, raises
+from spdypy.data import SPDY_3_ZLIB_DICT
+from spdypy.frame import (_py_read_frame_header, _py_read_nv_offsets,
+                          _py_serialize_pairs, serialize_nv_block,
+                          SYNStreamFrame, DataFrame, SettingsFrame,
+                          GoAwayFrame, Settings, FLAG_FIN,
+                          SETTINGS_MAX_CONCURRENT_STREAMS)
+
+speedups = importorskip('spdypy._speedups')
+
+
+def header_corpus():
+    """
+    Header sets of many shapes and sizes.
+    """
+    yield {}
+    yield {b'a': b'b'}
+    yield {b'': b''}
+    yield {b'Content-Type': b'text/html', b'X-MiXeD': b'\x00\xff'}
+    yield {b'set-cookie': [b'a=b', b'c=d', b'']}
+    yield {('x-%d' % i).encode('ascii'): b'v' * i for i in range(300)}
+    yield {b'x' * 70000: b'y' * 70000}
+
+
+def block_corpus():
+    blocks = [bytes(serialize_nv_block(headers))
+              for headers in header_corpus()]
+    blocks.append(b'')
+
+    # Every truncation of a small block, and blocks claiming too many
+    # headers or overlong names and values.
+    small = blocks[3]
+    blocks.extend(small[:i] for i in range(1, len(small)))
+    blocks.append(b'\x00\x00\x00\x05' + small[4:])
+    blocks.append(b'\x00\x00\x00\x01\xff\xff\xff\xffab')
+    blocks.append(b'\x00\x00\x00\x01\x00\x00\x00\x01a\x00\x00\x01\x00b')
+
+    return blocks
+
+
+def frame_corpus():
+    compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+
+    syn = SYNStreamFrame()
+    syn.version = 3
+    syn.stream_id = 0x7FFFFFFF
+    syn.priority = 7
+    syn.headers[b':path'] = b'/'
+
+    data = DataFrame()
+    data.stream_id = 5
+    data.data = b'x' * 1000
+    data.flags.add(FLAG_FIN)
+
+    settings = SettingsFrame()
+    settings.version = 3
+    settings.settings = [Settings(SETTINGS_MAX_CONCURRENT_STREAMS, 100, set())]
+
+    goaway = GoAwayFrame()
+    goaway.version = 3
+    goaway.last_good_stream_id = 1
+    goaway.status_code = 0
+
+    return [syn.to_bytes(compressor), data.to_bytes(), settings.to_bytes(),
+            goaway.to_bytes(), b'\xff' * 8]
+
+
+def outcome(function, *args):
+    try:
+        return function(*args)
+    except struct.error:
+        return struct.error
+
+
+class TestSpeedups(object):
+    def test_read_frame_header(self):
+        for frame in frame_corpus():
+            buffer = b'junk' + frame
+            for offset in (0, 4, len(buffer) - 7):
+                assert (outcome(speedups.read_frame_header, buffer, offset) ==
+                        outcome(_py_read_frame_header, buffer, offset))
+
+    def test_read_frame_header_accepts_memoryviews(self):
+        frame = frame_corpus()[1]
+
+        assert (speedups.read_frame_header(memoryview(frame), 0) ==
+                _py_read_frame_header(memoryview(frame), 0))
+
+    def test_read_nv_offsets(self):
+        for block in block_corpus():
+            assert (outcome(speedups.read_nv_offsets, block) ==
+                    outcome(_py_read_nv_offsets, block))
+
+    def test_serialize_pairs(self):
+        for headers in header_corpus():
+            pairs = [(name, b'\0'.join(value) if isinstance(value, list)
+                      else value) for name, value in headers.items()]
+
+            assert (speedups.serialize_pairs(pairs) ==
+                    _py_serialize_pairs(pairs))
+
+    def test_serialize_pairs_rejects_strings(self):
+        with raises(TypeError):
+            speedups.serialize_pairs([('a', b'b')])
+
+        with raises(TypeError):
+            _py_serialize_pairs([('a', b'b')])
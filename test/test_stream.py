@@ -5,7 +5,11 @@ test/test_stream
 
 Tests for the SPDY Stream abstraction.
 """
+import io
 from spdypy.stream import *
+from spdypy.frame import (FLAG_FIN, CANCEL, FLOW_CONTROL_ERROR,
+                          STREAM_ALREADY_CLOSED)
+from pytest import raises
 from .test_frame import NullCompressor
 
 class MockConnection(object):
@@ -21,6 +25,9 @@ class MockConnection(object):
         self.buffer += data
         self.called += 1
 
+    def sendall(self, data):
+        self.send(data)
+
 
 class TestStream(object):
     def test_streams_require_stream_ids(self):
@@ -67,7 +74,7 @@ class TestStream(object):
         s.add_header(b'Key2', b'Value2')
 
         frame = s._next_frame()
-        expected = {b'Key': b'Value', b'Key2': b'Value2'}
+        expected = {b'key': b'Value', b'key2': b'Value2'}
         assert frame.headers == expected
 
     def test_we_can_add_data(self):
@@ -97,24 +104,279 @@ class TestStream(object):
         frame = s._next_frame()
         assert FLAG_FIN in frame.flags
 
-    def test_streams_serialize_frame_by_frame(self):
+    def test_streams_only_send_once_ready(self):
         s = Stream(5, 3, NullCompressor(), None)
-        conn = MockConnection()
 
         s.open_stream(priority=1)
         s.prepare_data(b'TestTestTest', last=True)
 
-        # 'send' the data.
-        s.send_outstanding(conn)
+        assert s.next_frame() is None
 
-        assert conn.called == 2
+        s.ready = True
+        assert isinstance(s.next_frame(), SYNStreamFrame)
+        assert s.next_frame().data == b'TestTestTest'
 
     def test_streams_empty_frame_buffer_after_sending(self):
         s = Stream(5, 3, NullCompressor(), None)
-        conn = MockConnection()
 
         s.open_stream(priority=1)
         s.prepare_data(b'TestTestTest', last=True)
-        s.send_outstanding(conn)
+        s.ready = True
+
+        while s.next_frame() is not None:
+            pass
 
         assert len(s._queued_frames) == 0
+
+
+class TestStreamReceiving(object):
+    def test_unexpected_frames_are_rejected(self):
+        s = Stream(5, 3, None, None)
+
+        with raises(ValueError):
+            s.process_frame(SYNStreamFrame())
+
+    def test_headers_frames_add_response_headers(self):
+        s = Stream(5, 3, None, None)
+
+        reply = SYNReplyFrame()
+        reply.headers = {b':status': b'200 OK'}
+        s.process_frame(reply)
+
+        headers = HeadersFrame()
+        headers.headers = {b'x-extra': b'yes'}
+        headers.flags.add(FLAG_FIN)
+        s.process_frame(headers)
+
+        assert s.response_headers == {b':status': b'200 OK',
+                                      b'x-extra': b'yes'}
+        assert s.remote_closed
+        assert not s.closed
+
+    def test_data_after_fin_resets_the_stream(self):
+        s = Stream(5, 3, None, None)
+
+        data = DataFrame()
+        data.stream_id = 5
+        data.data = b'hello'
+        data.flags.add(FLAG_FIN)
+        s.process_frame(data)
+        s.process_frame(data)
+
+        frame = s.next_frame()
+        assert isinstance(frame, RSTStreamFrame)
+        assert frame.status_code == STREAM_ALREADY_CLOSED
+        assert list(s._received) == [b'hello']
+
+    def test_data_after_a_reset_is_dropped(self):
+        s = Stream(5, 3, None, None)
+        s.reset(CANCEL)
+        s.next_frame()
+
+        data = DataFrame()
+        data.stream_id = 5
+        data.data = b'hello'
+        s.process_frame(data)
+
+        assert s.next_frame() is None
+        assert not s._received
+        assert s.receive_window.available == 65536 - 5
+
+    def test_data_after_a_remote_reset_is_dropped(self):
+        s = Stream(5, 3, None, None)
+
+        rst = RSTStreamFrame()
+        rst.stream_id = 5
+        rst.status_code = FLOW_CONTROL_ERROR
+        s.process_frame(rst)
+
+        data = DataFrame()
+        data.stream_id = 5
+        data.data = b'hello'
+        s.process_frame(data)
+
+        assert s.next_frame() is None
+        assert not s._received
+
+
+class TestStreamBodies(object):
+    def drain_body(self, s):
+        frames = []
+        frame = s._next_body_frame()
+
+        while frame is not None:
+            frames.append((bytes(frame.data), FLAG_FIN in frame.flags))
+            frame = s._next_body_frame()
+
+        return frames
+
+    def test_large_data_is_split_into_chunks(self):
+        s = Stream(5, 3, None, None, chunk_size=4)
+        s.open_stream(priority=1)
+        s.prepare_data(b'TestTestTe', last=True)
+
+        _ = s._next_frame()
+        chunks = [s._next_frame() for _ in range(3)]
+
+        assert [bytes(f.data) for f in chunks] == [b'Test', b'Test', b'Te']
+        assert [FLAG_FIN in f.flags for f in chunks] == [False, False, True]
+        assert s._next_frame() is None
+
+    def test_file_bodies_are_read_lazily(self):
+        s = Stream(5, 3, None, None, chunk_size=4)
+        s.open_stream(priority=1)
+        s.prepare_body(io.BytesIO(b'TestTestTe'))
+
+        # The SYN_STREAM no longer ends the stream, and no body is queued.
+        assert FLAG_FIN not in s._queued_frames[0].flags
+        assert len(s._queued_frames) == 1
+
+        assert self.drain_body(s) == [
+            (b'Test', False), (b'Test', False), (b'Te', False), (b'', True)
+        ]
+
+    def test_iterable_bodies_are_coalesced(self):
+        s = Stream(5, 3, None, None, chunk_size=4)
+        s.open_stream(priority=1)
+        s.prepare_body(iter([b'T', b'estTes', 'tT', b'e']))
+
+        assert self.drain_body(s) == [
+            (b'Test', False), (b'Test', False), (b'Te', False), (b'', True)
+        ]
+
+    def test_body_frames_are_sent_one_per_batch(self):
+        s = Stream(5, 3, NullCompressor(), None, chunk_size=4)
+        s.open_stream(priority=1)
+        s.prepare_body(io.BytesIO(b'TestTest'))
+        s.ready = True
+
+        assert isinstance(s.next_frame(), SYNStreamFrame)
+        assert bytes(s.next_frame().data) == b'Test'
+        assert s.next_frame() is None
+
+        s.batch_written()
+        assert bytes(s.next_frame().data) == b'Test'
+
+
+class TestStreamFlowControl(object):
+    def ready_stream(self, data, send_window=DEFAULT_WINDOW_SIZE):
+        s = Stream(5, 3, NullCompressor(), None, send_window=send_window)
+        s.open_stream(priority=1)
+        s.prepare_data(data, last=True)
+        s.ready = True
+        s.next_frame()
+        return s
+
+    def test_data_frames_are_limited_by_send_window(self):
+        s = self.ready_stream(b'TestTestTest', send_window=4)
+
+        frame = s.next_frame()
+        assert bytes(frame.data) == b'Test'
+        assert FLAG_FIN not in frame.flags
+        assert s.send_window == 0
+        assert s.next_frame() is None
+
+        update = WindowUpdateFrame()
+        update.stream_id = 5
+        update.delta_window_size = 100
+        s.process_frame(update)
+
+        frame = s.next_frame()
+        assert bytes(frame.data) == b'TestTest'
+        assert FLAG_FIN in frame.flags
+        assert s.send_window == 92
+
+    def test_data_frames_are_limited_by_max_data(self):
+        s = self.ready_stream(b'TestTestTest')
+
+        assert s.next_frame(max_data=0) is None
+        assert bytes(s.next_frame(max_data=6).data) == b'TestTe'
+
+    def test_window_update_overflow_resets_stream(self):
+        s = self.ready_stream(b'Test')
+
+        update = WindowUpdateFrame()
+        update.stream_id = 5
+        update.delta_window_size = 0x7FFFFFFF
+        s.process_frame(update)
+
+        frame = s.next_frame()
+        assert isinstance(frame, RSTStreamFrame)
+        assert frame.status_code == FLOW_CONTROL_ERROR
+        assert s.next_frame() is None
+
+    def receiving_stream(self):
+        s = Stream(5, 3, NullCompressor(), None)
+        s.open_stream(priority=1)
+        s.ready = True
+        s.next_frame()
+        return s
+
+    def test_received_data_is_acknowledged_in_batches(self):
+        s = self.receiving_stream()
+        data = DataFrame()
+        data.stream_id = 5
+        data.data = b'x' * 16384
+
+        # Nothing is due until the data is read...
+        s.process_frame(data)
+        s.process_frame(data)
+        assert s.next_frame() is None
+
+        # ...and then only once half the window has been read.
+        assert len(s.next_chunk()) == 16384
+        assert s.next_frame() is None
+
+        assert len(s.next_chunk()) == 16384
+        update = s.next_frame()
+        assert isinstance(update, WindowUpdateFrame)
+        assert update.delta_window_size >= 32768
+        assert s.next_frame() is None
+
+    def test_read_into_spans_data_frames(self):
+        s = self.receiving_stream()
+
+        for chunk in (b'abc', b'defg'):
+            data = DataFrame()
+            data.stream_id = 5
+            data.data = chunk
+            s.process_frame(data)
+
+        buffer = bytearray(5)
+        assert s.read_into(buffer) == 5
+        assert buffer == b'abcde'
+        assert s.buffered == 2
+
+        assert s.read_into(buffer) == 2
+        assert buffer[:2] == b'fg'
+        assert s.buffered == 0
+
+    def test_no_window_update_above_high_water(self):
+        s = self.receiving_stream()
+        s.high_water = 16384
+
+        data = DataFrame()
+        data.stream_id = 5
+        data.data = b'x' * 16384
+        for _ in range(3):
+            s.process_frame(data)
+
+        # Reading down to the high water mark doesn't reopen the window...
+        s.next_chunk()
+        assert s.next_frame() is None
+
+        # ...but reading past it does.
+        s.next_chunk()
+        assert isinstance(s.next_frame(), WindowUpdateFrame)
+
+    def test_overrunning_the_receive_window_resets_stream(self):
+        s = self.receiving_stream()
+
+        data = DataFrame()
+        data.stream_id = 5
+        data.data = b'x' * (DEFAULT_WINDOW_SIZE + 1)
+        s.process_frame(data)
+
+        frame = s.next_frame()
+        assert isinstance(frame, RSTStreamFrame)
+        assert frame.status_code == FLOW_CONTROL_ERROR
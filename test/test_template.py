@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_template
+~~~~~~~~~~~~~~~~~~
+
+Tests for request templates.
+"""
+import zlib
+import spdypy
+from spdypy.template import RequestTemplate
+from spdypy.frame import parse_nv_block, serialize_nv_block
+from spdypy.data import SPDY_3_ZLIB_DICT
+from .test_frame import NullCompressor, NullDecompressor
+from .test_stream import MockConnection
+
+
+class TestRequestTemplate(object):
+    def test_template_serializes_fixed_and_varying_headers(self):
+        template = RequestTemplate({b':host': b'example.com', b'a': b'b'})
+        data = template.serialize({b':path': b'/'})
+
+        expected = {b':host': b'example.com', b'a': b'b', b':path': b'/'}
+        assert parse_nv_block(NullDecompressor(), data) == expected
+
+    def test_template_varying_headers_override_fixed(self):
+        template = RequestTemplate({b':host': b'example.com', b'a': b'b'})
+        data = template.serialize({b'a': b'c'})
+
+        expected = {b':host': b'example.com', b'a': b'c'}
+        assert parse_nv_block(NullDecompressor(), data) == expected
+
+    def test_template_output_matches_plain_block(self):
+        template = RequestTemplate({b':host': b'example.com'})
+        data = template.serialize({b':path': b'/'})
+
+        assert data == serialize_nv_block({b':host': b'example.com',
+                                           b':path': b'/'})
+
+    def test_template_records_statistics(self):
+        compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+        decompressor = zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT)
+        template = RequestTemplate({b':host': b'example.com'})
+
+        assert template.bytes_per_request == 0.0
+
+        total = 0
+        for i in range(3):
+            path = ('/%d' % i).encode('ascii')
+            block = template.build_nv_block(compressor, {b':path': path})
+            total += len(block)
+
+            headers = parse_nv_block(decompressor, block)
+            assert headers == {b':host': b'example.com', b':path': path}
+
+        assert template.requests == 3
+        assert template.header_bytes == total
+        assert template.bytes_per_request == total / 3
+        assert template.compression_time >= 0
+
+    def test_connection_templates_carry_mandatory_headers(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        template = conn.request_template({'user-agent': 'spdypy'})
+
+        assert template.headers == {
+            b':version': b'HTTP/1.1',
+            b':host': b'www.google.com',
+            b':scheme': b'https',
+            b'user-agent': b'spdypy',
+        }
+
+    def test_putrequest_with_template_only_sets_varying_headers(self):
+        conn = spdypy.SPDYConnection('www.google.com')
+        conn._sck = MockConnection()
+        template = conn.request_template()
+        stream_id = conn.putrequest(b'GET', b'/', template=template)
+
+        frame = conn._streams[stream_id]._queued_frames[0]
+
+        assert frame.template is template
+        assert frame.headers == {b':method': b'GET', b':path': b'/'}
+
+        data = frame.to_bytes(NullCompressor())
+        headers = parse_nv_block(NullDecompressor(), data[18:])
+        assert headers == {
+            b':method': b'GET',
+            b':path': b'/',
+            b':version': b'HTTP/1.1',
+            b':host': b'www.google.com',
+            b':scheme': b'https',
+        }
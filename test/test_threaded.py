@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_threaded
+~~~~~~~~~~~~~~~~~~
+
+Tests for the ThreadedSPDYConnection object.
+"""
+import socket
+import threading
+import time
+import zlib
+from spdypy.threaded import ThreadedSPDYConnection
+from spdypy.frame import *
+from spdypy.data import SPDY_3_ZLIB_DICT
+from pytest import raises
+
+
+class EchoServer(object):
+    """
+    Replies to every request on the other end of a socket pair with its own
+    path, in reverse order of arrival for each batch of requests read, and
+    answers pings.
+    """
+    def __init__(self, sck):
+        self.sck = sck
+        self.parser = FrameParser(zlib.decompressobj(zdict=SPDY_3_ZLIB_DICT))
+        self.compressor = zlib.compressobj(zdict=SPDY_3_ZLIB_DICT)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            data = self.sck.recv(65535)
+            if not data:
+                return
+
+            replies = []
+            for frame in reversed(self.parser.receive(data)):
+                if isinstance(frame, PingFrame):
+                    replies.append(frame.to_bytes())
+                    continue
+
+                if not isinstance(frame, SYNStreamFrame):
+                    continue
+
+                reply = SYNReplyFrame()
+                reply.version = 3
+                reply.stream_id = frame.stream_id
+                reply.headers = {b':status': b'200 OK'}
+
+                body = DataFrame()
+                body.stream_id = frame.stream_id
+                body.data = frame.headers[b':path']
+                body.flags.add(FLAG_FIN)
+
+                replies.append(reply.to_bytes(self.compressor))
+                replies.append(body.to_bytes())
+
+            self.sck.sendall(b''.join(replies))
+
+
+class TestThreadedSPDYConnection(object):
+    def setup_method(self, method):
+        self.client, self.server = socket.socketpair()
+        self.conn = ThreadedSPDYConnection('www.google.com', timeout=5)
+        self.conn._sck = self.client
+
+    def teardown_method(self, method):
+        self.conn.close()
+        self.server.close()
+
+    def fetch(self, path):
+        stream_id = self.conn.request(b'GET', path)
+        return self.conn.getresponse(stream_id).read()
+
+    def test_single_request(self):
+        EchoServer(self.server)
+
+        assert self.fetch(b'/hello') == b'/hello'
+
+    def test_many_threads_share_a_connection(self):
+        EchoServer(self.server)
+        results = {}
+
+        def worker(n):
+            for i in range(20):
+                path = ('/%d/%d' % (n, i)).encode('ascii')
+                results[path] = self.fetch(path)
+
+        threads = [threading.Thread(target=worker, args=(n,))
+                   for n in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 200
+        assert all(path == body for path, body in results.items())
+
+    def test_losing_the_connection_wakes_waiters(self):
+        stream_id = self.conn.request(b'GET', b'/')
+        self.server.close()
+
+        with raises(ConnectionResetError):
+            self.conn.getresponse(stream_id)
+
+        with raises(ConnectionResetError):
+            self.conn.putrequest(b'GET', b'/')
+
+    def test_timeout_raises(self):
+        self.conn.timeout = 0.01
+        stream_id = self.conn.request(b'GET', b'/')
+
+        with raises(socket.timeout):
+            self.conn.getresponse(stream_id)
+
+    def test_ping_measures_the_round_trip(self):
+        EchoServer(self.server)
+
+        rtt = self.conn.ping()
+
+        assert rtt >= 0
+        assert self.conn.rtt.samples == 1
+        assert self.conn.rtt.smoothed == rtt
+
+    def test_unanswered_keepalives_fail_the_connection(self):
+        self.conn.ping_interval = 0.01
+        self.conn.ping_timeout = 0.05
+        self.conn._connect()
+
+        deadline = time.monotonic() + 5
+        while (self.conn._connection_error is None and
+                time.monotonic() < deadline):
+            time.sleep(0.01)
+
+        assert isinstance(self.conn._connection_error, ConnectionError)
+
+    def test_malformed_frames_fail_the_connection(self):
+        self.conn.timeout = None
+        stream_id = self.conn.request(b'GET', b'/')
+
+        # A SETTINGS frame claiming one entry, but carrying none.
+        self.server.sendall(b'\x80\x03\x00\x04\x00\x00\x00\x04\x00\x00\x00\x01')
+
+        with raises(Exception):
+            self.conn.getresponse(stream_id)
+
+        assert self.conn._connection_error is not None
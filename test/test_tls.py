@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+test/test_tls
+~~~~~~~~~~~~~
+
+Tests for sharing TLS contexts and sessions.
+"""
+import ssl
+from spdypy.tls import get_context, SessionCache
+from unittest.mock import MagicMock
+
+
+class TestGetContext(object):
+    def test_contexts_are_shared_by_configuration(self):
+        assert get_context() is get_context()
+        assert get_context() is not get_context(protocols=['http/1.1'])
+
+    def test_contexts_verify_the_server(self):
+        context = get_context()
+
+        assert context.protocol == ssl.PROTOCOL_TLS_CLIENT
+        assert context.verify_mode == ssl.CERT_REQUIRED
+        assert context.check_hostname
+
+
+class TestSessionCache(object):
+    def test_sessions_are_per_origin_and_context(self):
+        cache = SessionCache()
+        context = MagicMock()
+        session = MagicMock()
+
+        cache.store(context, 'www.google.com', 443, session)
+
+        assert cache.get(context, 'www.google.com', 443) is session
+        assert cache.get(context, 'www.google.com', 8443) is None
+        assert cache.get(MagicMock(), 'www.google.com', 443) is None
+
+    def test_unresumable_sessions_are_ignored(self):
+        cache = SessionCache()
+        context = MagicMock()
+        session = MagicMock(has_ticket=False, id=b'')
+
+        cache.store(context, 'www.google.com', 443, session)
+        cache.store(context, 'www.example.com', 443, None)
+
+        assert cache.get(context, 'www.google.com', 443) is None
+        assert cache.get(context, 'www.example.com', 443) is None
+
+    def test_least_recently_used_sessions_are_dropped(self):
+        cache = SessionCache(max_size=2)
+        context = MagicMock()
+        sessions = [MagicMock() for _ in range(3)]
+
+        cache.store(context, 'a', 443, sessions[0])
+        cache.store(context, 'b', 443, sessions[1])
+        cache.get(context, 'a', 443)
+        cache.store(context, 'c', 443, sessions[2])
+
+        assert cache.get(context, 'a', 443) is sessions[0]
+        assert cache.get(context, 'b', 443) is None
+        assert cache.get(context, 'c', 443) is sessions[2]